@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compressor Benchmarks
+Micro-benchmarks for the Delta Compressor's diff engines, compressed
+formats, containers, entropy stage and seek index.
+
+They run on the Curator benchmarks' synthetic capture corpus (see
+curator/benchmark_curator.py): whole-window snapshots that overlap
+heavily from one capture to the next.
+
+Usage:
+    python benchmark_compressor.py diff [captures]
+    python benchmark_compressor.py format [captures]
+    python benchmark_compressor.py container [captures]
+    python benchmark_compressor.py entropy [captures] [workers]
+    python benchmark_compressor.py seek [captures] [keyframe_interval]
+"""
+
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from compressor.container import BLOCK_RECORDS, read_container, write_container
+from compressor.delta_compressor import DeltaCompressor
+from compressor.line_diff import DIFF_ENGINES
+from compressor.line_dictionary import FORMAT_DICTIONARY, FORMAT_LITERAL, DeltaReplay
+from compressor.seek_index import SeekIndex, get_at_time, get_capture
+from config import KEYFRAME_INTERVAL
+from curator.benchmark_curator import make_session, write_session
+from curator.claude_curator import CapturePipeline
+from curator.jsonl_reader import JsonlReader
+
+
+def add_scrollback(records: List[Dict], seed: int = 3) -> List[Dict]:
+    """
+    Interleave captures of an earlier window - the user scrolling up to
+    reread a few turns back - so lines leave the window and return.
+    """
+    rng = random.Random(seed)
+    scrolling = []
+    for number, record in enumerate(records):
+        if number > 50 and rng.random() < 0.1:
+            scrolling.append(dict(records[number - rng.randint(5, 50)]))
+        scrolling.append(dict(record))
+    for number, record in enumerate(scrolling):
+        record['message_number'] = number
+    return scrolling
+
+
+def bench_diff(captures: int = 2000):
+    """Line-diff engines on consecutive window snapshots: diffs/sec and delta size."""
+    short = [record['raw_text'] for record in make_session(captures)]
+    # Taller windows with blank lines between paragraphs - past difflib's 200-line autojunk threshold
+    tall = [record['raw_text'].replace('\n', '\n\n')
+            for record in make_session(captures, visible_turns=60)]
+    
+    print(f"\nDIFF - {captures:,} consecutive captures per corpus")
+    print("=" * 60)
+    
+    work_dir = Path(tempfile.mkdtemp(prefix="compressor_bench_"))
+    try:
+        for label, windows in [("window, 12 turns", short), ("tall window, 60 turns + blank lines", tall)]:
+            lines = sum(window.count('\n') + 1 for window in windows) // len(windows)
+            print(f"  {label} (~{lines} lines):")
+            for engine in DIFF_ENGINES:
+                compressor = DeltaCompressor(str(work_dir), str(work_dir), diff_engine=engine)
+                seconds = float('inf')
+                for _ in range(3):
+                    start = time.perf_counter()
+                    diffs = [compressor.compute_diff(old, new) for old, new in zip(windows, windows[1:])]
+                    seconds = min(seconds, time.perf_counter() - start)
+                
+                for old, new, diff in zip(windows, windows[1:], diffs):
+                    assert compressor.decompress_capture({'diff': diff}, old) == new, "diff does not rebuild"
+                changed = sum(diff['size'] for diff in diffs)
+                ops = sum(len(diff.get('changes', ())) for diff in diffs)
+                encoded = len(compressor.codec.dumps_lines(diffs))
+                print(f"    {engine:<8} {len(diffs) / seconds:>9,.0f} diffs/sec   {ops:>7,} ops   "
+                      f"{changed / 1024 / 1024:7.2f} MB changed text   {encoded / 1024 / 1024:7.2f} MB encoded")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_format(captures: int = 5000):
+    """Compressed format 1 (literal lines) vs 2 (line dictionary): file size and reconstruction rate."""
+    print(f"\nCOMPRESSED FORMAT - {captures:,} captures per session")
+    print("=" * 60)
+    
+    work_dir = Path(tempfile.mkdtemp(prefix="compressor_bench_"))
+    try:
+        for label, records in [("steady session", make_session(captures)),
+                               ("session with scroll-back", add_scrollback(make_session(captures)))]:
+            raw_file = work_dir / "claude_session_bench.jsonl"
+            write_session(raw_file, records)
+            print(f"  {label} ({len(records):,} captures, raw {raw_file.stat().st_size / 1024 / 1024:.1f} MB):")
+            
+            for fmt in (FORMAT_LITERAL, FORMAT_DICTIONARY):
+                compressor = DeltaCompressor(str(work_dir), str(work_dir / f"v{fmt}"), compressed_format=fmt)
+                with redirect_stdout(io.StringIO()):
+                    compressed_file = compressor.compress_log_file(raw_file)
+                
+                # Decompression: decode each record and rebuild its text
+                seconds = curator_seconds = float('inf')
+                for _ in range(5):
+                    start = time.perf_counter()
+                    replay = DeltaReplay()
+                    texts = [replay.apply(record['diff']) for record in JsonlReader(compressed_file).records()]
+                    seconds = min(seconds, time.perf_counter() - start)
+                    
+                    # The curator's delta-aware read (noise-filtered lines, no join)
+                    pipeline = CapturePipeline()
+                    start = time.perf_counter()
+                    read = sum(1 for _ in pipeline.iter_captures(compressed_file, pipeline.new_progress(), False))
+                    curator_seconds = min(curator_seconds, time.perf_counter() - start)
+                assert texts == [record['raw_text'] for record in records], "format does not rebuild"
+                
+                mb = compressed_file.stat().st_size / 1024 / 1024
+                print(f"    v{fmt} {mb:7.2f} MB   {len(texts) / seconds:>9,.0f} captures/sec rebuilt   "
+                      f"{read / curator_seconds:>9,.0f} captures/sec curator read")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_container(captures: int = 5000):
+    """Compressed JSONL vs the binary delta container: bytes on disk and decode MB/s."""
+    print(f"\nDELTA CONTAINER - {captures:,} captures per session")
+    print("=" * 60)
+    
+    accented = str.maketrans({'e': 'é', 'a': 'à', 'o': 'ö'})
+    work_dir = Path(tempfile.mkdtemp(prefix="compressor_bench_"))
+    try:
+        for label, records in [
+            ("session with scroll-back", add_scrollback(make_session(captures))),
+            ("accented text", [dict(record, raw_text=record['raw_text'].translate(accented))
+                               for record in make_session(captures)]),
+        ]:
+            raw_file = work_dir / "claude_session_bench.jsonl"
+            write_session(raw_file, records)
+            print(f"  {label} ({len(records):,} captures, raw {raw_file.stat().st_size / 1024 / 1024:.1f} MB):")
+            
+            for fmt in (FORMAT_LITERAL, FORMAT_DICTIONARY):
+                for container in ("jsonl", "binary"):
+                    compressor = DeltaCompressor(str(work_dir), str(work_dir / f"{container}_v{fmt}"),
+                                                 compressed_format=fmt, container=container)
+                    with redirect_stdout(io.StringIO()):
+                        compressed_file = compressor.compress_log_file(raw_file)
+                    
+                    # Decode: file -> records -> rebuilt capture text
+                    read = read_container if container == "binary" else lambda path: JsonlReader(path).records()
+                    decode_seconds = rebuild_seconds = float('inf')
+                    for _ in range(5):
+                        start = time.perf_counter()
+                        diffs = [record['diff'] for record in read(compressed_file)]
+                        decode_seconds = min(decode_seconds, time.perf_counter() - start)
+                        replay = DeltaReplay()
+                        texts = [replay.apply(diff) for diff in diffs]
+                        rebuild_seconds = min(rebuild_seconds, time.perf_counter() - start)
+                    assert texts == [record['raw_text'] for record in records], "container does not rebuild"
+                    
+                    mb = compressed_file.stat().st_size / 1024 / 1024
+                    text_mb = sum(len(text.encode('utf-8', 'surrogatepass')) for text in texts) / 1024 / 1024
+                    print(f"    v{fmt} {container:<6} {mb:7.2f} MB on disk   {mb / decode_seconds:7.1f} MB/s decoded   "
+                          f"{text_mb / rebuild_seconds:7.0f} MB/s of captures rebuilt")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_entropy(captures: int = 5000, workers: int = None):
+    """Entropy-coded container blocks per codec and level: size against encode / decode MB/s."""
+    workers = workers or os.cpu_count() or 1
+    print(f"\nENTROPY STAGE - {captures:,} captures, {BLOCK_RECORDS} records per block")
+    print("=" * 60)
+    
+    work_dir = Path(tempfile.mkdtemp(prefix="compressor_bench_"))
+    try:
+        raw_file = work_dir / "claude_session_bench.jsonl"
+        write_session(raw_file, add_scrollback(make_session(captures)))
+        compressor = DeltaCompressor(str(work_dir), str(work_dir / "stored"), container="binary")
+        with redirect_stdout(io.StringIO()):
+            records = list(read_container(compressor.compress_log_file(raw_file)))
+        
+        stored_mb = None
+        output_file = work_dir / "entropy.aldc"
+        for entropy, level in [("none", -1), ("zlib", 1), ("zlib", 6), ("zlib", 9), ("lzma", 0), ("lzma", 6),
+                               ("bz2", 1), ("bz2", 9)]:
+            encode_seconds = decode_seconds = float('inf')
+            for _ in range(3):
+                start = time.perf_counter()
+                mb = write_container(output_file, records, entropy=entropy, level=level) / 1024 / 1024
+                encode_seconds = min(encode_seconds, time.perf_counter() - start)
+                start = time.perf_counter()
+                decoded = list(read_container(output_file))
+                decode_seconds = min(decode_seconds, time.perf_counter() - start)
+            assert decoded == records, "entropy-coded blocks do not decode"
+            stored_mb = stored_mb or mb
+            
+            name = entropy if level == -1 else f"{entropy} {level}"
+            print(f"  {name:<8} {mb:6.2f} MB ({mb / stored_mb * 100:3.0f}%)   {stored_mb / encode_seconds:6.1f} MB/s written   "
+                  f"{stored_mb / decode_seconds:6.1f} MB/s read")
+        
+        # Blocks are independent, so a file's blocks compress on several threads
+        print(f"  blocks on {workers} threads:")
+        for entropy in ("zlib", "lzma", "bz2"):
+            seconds = {}
+            for threads in (1, workers):
+                seconds[threads] = float('inf')
+                for _ in range(3):
+                    start = time.perf_counter()
+                    write_container(output_file, records, entropy=entropy, workers=threads)
+                    seconds[threads] = min(seconds[threads], time.perf_counter() - start)
+            print(f"    {entropy:<5} {seconds[1] * 1000:7.1f} ms -> {seconds[workers] * 1000:7.1f} ms "
+                  f"({seconds[1] / seconds[workers]:.2f}x)")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_seek(captures: int = 5000, interval: int = KEYFRAME_INTERVAL):
+    """Latency of reading one capture at random: keyframes + seek index vs replaying from the start."""
+    print(f"\nSEEK INDEX - {captures:,} captures, a keyframe every {interval} deltas")
+    print("=" * 60)
+    
+    records = make_session(captures)
+    rng = random.Random(7)
+    targets = [rng.randrange(len(records)) for _ in range(50)]
+    work_dir = Path(tempfile.mkdtemp(prefix="compressor_bench_"))
+    try:
+        raw_file = work_dir / "claude_session_bench.jsonl"
+        write_session(raw_file, records)
+        
+        for container in ("jsonl", "binary"):
+            for keyframe_interval in (0, interval):
+                compressor = DeltaCompressor(str(work_dir), str(work_dir / f"{container}_{keyframe_interval}"),
+                                             container=container, keyframe_interval=keyframe_interval)
+                with redirect_stdout(io.StringIO()):
+                    compressed_file = compressor.compress_log_file(raw_file)
+                
+                start = time.perf_counter()
+                index = SeekIndex.load(compressed_file)
+                load_seconds = time.perf_counter() - start
+                
+                start = time.perf_counter()
+                for n in targets:
+                    capture = get_capture(compressed_file, n, index)
+                    assert capture['raw_text'] == records[n]['raw_text'], "seek does not rebuild"
+                capture_seconds = (time.perf_counter() - start) / len(targets)
+                
+                start = time.perf_counter()
+                for n in targets:
+                    get_at_time(compressed_file, records[n]['timestamp'], index)
+                time_seconds = (time.perf_counter() - start) / len(targets)
+                
+                label = f"every {keyframe_interval}" if keyframe_interval else "first only (full replay)"
+                print(f"  {container:<6} keyframes {label:<25} {compressed_file.stat().st_size / 1024 / 1024:6.2f} MB   "
+                      f"index {load_seconds * 1000:5.1f} ms   get_capture {capture_seconds * 1000:7.2f} ms   "
+                      f"get_at_time {time_seconds * 1000:7.2f} ms")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    
+    command = sys.argv[1]
+    args = [int(a) for a in sys.argv[2:]]
+    
+    if command == "diff":
+        bench_diff(*args)
+    elif command == "format":
+        bench_format(*args)
+    elif command == "container":
+        bench_container(*args)
+    elif command == "entropy":
+        bench_entropy(*args)
+    elif command == "seek":
+        bench_seek(*args)
+    else:
+        print(f"Unknown benchmark: {command}")
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Delta Container - binary file format for compressed logs
+
+A compressed JSONL file spells out every key ('session_id', 'op',
+'new_ids', ...) on every line, \\u-escapes all non-ASCII text and
+repeats the session id and capture method in each record. The container
+stores the same records without that overhead:
+
+    header   MAGIC, version, metadata table (distinct session_id /
+             capture_method pairs), record count
+    blocks   up to BLOCK_RECORDS records each, framed as
+             codec, body length, body
+
+A block body holds three streams, so it decodes in a few passes instead
+of one parse per record:
+
+- ints: every number of every record as a varint - metadata table index,
+  message_number delta, timestamp prefix length shared with the previous
+  record, diff kind, format and keyframe flag, and the op streams (op
+  code, start, length or position, line counts, line lengths or
+  zigzag-delta line ids);
+- hashes: 16 raw bytes per md5 text_hash (other hashes go as text);
+- text: the UTF-8 payload every string is sliced from - timestamp
+  suffixes, content, line-dictionary lines, new_lines.
+
+Blocks are self-contained (deltas and ids restart in each), so a reader
+can stream block by block. A block's body is stored as is or, with an
+entropy stage, compressed on its own with zlib, lzma or bz2 (the codec
+and level trade size for speed; see ENTROPY_CODECS). Blocks are encoded
+on a thread pool when workers > 1 - all three libraries release the GIL
+while they compress. Records come back as the dicts the JSONL
+format holds, minus the per-diff statistics ('size', 'original_size',
+'compression_ratio') that no reader needs.
+
+read_compressed() reads either format; convert_to_container() rewrites
+an existing compressed JSONL file.
+"""
+
+import bz2
+import lzma
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, List
+
+from compressor.line_dictionary import FORMAT_DICTIONARY
+from curator.json_codec import JsonCodec
+from curator.jsonl_reader import JsonlReader
+
+
+MAGIC = b'ALDC'
+CONTAINER_VERSION = 1
+CONTAINER_SUFFIX = '.aldc'
+BLOCK_RECORDS = 256     # records per block
+
+# Block codecs: id in the frame, compress(body, level), decompress, default level
+ENTROPY_CODECS = {
+    'none': (0, None, None, None),
+    'zlib': (1, lambda body, level: zlib.compress(body, level), zlib.decompress, 6),
+    'lzma': (2, lambda body, level: lzma.compress(body, preset=level), lzma.decompress, 6),
+    'bz2': (3, lambda body, level: bz2.compress(body, level), bz2.decompress, 9),
+}
+BLOCK_DECOMPRESS = {codec_id: decompress for codec_id, _, decompress, _ in ENTROPY_CODECS.values()}
+
+KINDS = ('identical', 'full', 'delta')
+OPS = ('replace', 'delete', 'insert')
+HASH_MD5 = 0            # text_hash in the hashes stream
+HASH_TEXT = 1           # text_hash in the text payload
+
+TEXT_ERRORS = 'surrogatepass'  # captures may hold lone surrogates; keep them
+
+
+def encode_varints(values: Iterable[int], out: bytearray):
+    """Append unsigned LEB128 varints to out."""
+    for value in values:
+        while value > 0x7f:
+            out.append(value & 0x7f | 0x80)
+            value >>= 7
+        out.append(value)
+
+
+def decode_varints(data: bytes) -> List[int]:
+    """Every varint in data, in order."""
+    if not data or max(data) < 0x80:
+        return list(data)  # all single-byte: the bytes are the values
+    
+    values = []
+    value = shift = 0
+    for byte in data:
+        if byte < 0x80:
+            values.append(value | byte << shift)
+            value = shift = 0
+        else:
+            value |= (byte & 0x7f) << shift
+            shift += 7
+    return values
+
+
+def _varint_at(data: bytes, pos: int) -> tuple:
+    """The varint at data[pos] and the position after it."""
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def zigzag(value: int) -> int:
+    """Map a signed int onto an unsigned one (0, -1, 1, -2 ... -> 0, 1, 2, 3 ...)."""
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+
+def _read_varint(f: BinaryIO) -> int:
+    value = shift = 0
+    while True:
+        byte = f.read(1)
+        if not byte:
+            raise ValueError("Truncated delta container")
+        value |= (byte[0] & 0x7f) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
+
+
+def _write_text(text: str, out: bytearray):
+    data = text.encode('utf-8', TEXT_ERRORS)
+    encode_varints((len(data),), out)
+    out += data
+
+
+def _read_text(f: BinaryIO) -> str:
+    return f.read(_read_varint(f)).decode('utf-8', TEXT_ERRORS)
+
+
+class _BlockEncoder:
+    """Collects the ints, hashes and text streams of one block."""
+    
+    def __init__(self, metadata: Dict[tuple, int]):
+        self.metadata = metadata
+        self.records = 0
+        self.ints: List[int] = []
+        self.hashes = bytearray()
+        self.text: List[str] = []
+        self.message_number = 0
+        self.timestamp = ''
+    
+    def string(self, value: str):
+        self.ints.append(len(value))
+        self.text.append(value)
+    
+    def lines(self, lines: List[str]):
+        self.ints.append(len(lines))
+        for line in lines:
+            self.string(line)
+    
+    def ids(self, ids: List[int]):
+        ints = self.ints
+        ints.append(len(ids))
+        previous = -1
+        for line_id in ids:
+            ints.append(zigzag(line_id - previous - 1))
+            previous = line_id
+    
+    def add(self, record: Dict):
+        ints = self.ints
+        self.records += 1
+        
+        key = (record['session_id'], record['capture_method'])
+        if key not in self.metadata:
+            self.metadata[key] = len(self.metadata)
+        ints.append(self.metadata[key])
+        
+        ints.append(zigzag(record['message_number'] - self.message_number))
+        self.message_number = record['message_number']
+        
+        # Consecutive timestamps share most of their characters
+        timestamp, shared = record['timestamp'], 0
+        limit = min(len(timestamp), len(self.timestamp))
+        while shared < limit and timestamp[shared] == self.timestamp[shared]:
+            shared += 1
+        ints.append(shared)
+        self.string(timestamp[shared:])
+        self.timestamp = timestamp
+        
+        text_hash = record['text_hash']
+        try:
+            digest = bytes.fromhex(text_hash) if len(text_hash) == 32 else None
+        except ValueError:
+            digest = None
+        if digest is not None and digest.hex() == text_hash:
+            ints.append(HASH_MD5)
+            self.hashes += digest
+        else:
+            ints.append(HASH_TEXT)
+            self.string(text_hash)
+        
+        diff = record['diff']
+        kind = KINDS.index(diff['type'])
+        interned = diff.get('format') == FORMAT_DICTIONARY
+        ints.append(kind | interned << 2 | bool(diff.get('keyframe')) << 3)
+        if interned:
+            self.lines(diff['lines'])
+        
+        if diff['type'] == 'full':
+            if interned:
+                self.ids(diff['ids'])
+            else:
+                self.string(diff['content'])
+        elif diff['type'] == 'delta':
+            ints.append(len(diff['changes']))
+            for change in diff['changes']:
+                op = change['op']
+                ints.append(OPS.index(op))
+                if op == 'insert':
+                    ints.append(change['position'])
+                else:
+                    ints.append(change['old_start'])
+                    ints.append(change['old_end'] - change['old_start'])
+                if op != 'delete':
+                    if interned:
+                        self.ids(change['new_ids'])
+                    else:
+                        self.lines(change['new_lines'])
+    
+    def body(self) -> bytes:
+        body = bytearray()
+        ints = bytearray()
+        encode_varints(self.ints, ints)
+        encode_varints((self.records, len(ints)), body)
+        body += ints
+        encode_varints((len(self.hashes),), body)
+        body += self.hashes
+        body += ''.join(self.text).encode('utf-8', TEXT_ERRORS)
+        return bytes(body)
+
+
+def _decode_block(body: bytes, metadata: List[tuple]) -> Iterator[Dict]:
+    """The records of one block body."""
+    records, pos = _varint_at(body, 0)
+    ints_length, pos = _varint_at(body, pos)
+    ints = decode_varints(body[pos:pos + ints_length])
+    hashes_length, pos = _varint_at(body, pos + ints_length)
+    hashes = body[pos:pos + hashes_length]
+    text = body[pos + hashes_length:].decode('utf-8', TEXT_ERRORS)
+    
+    i = 0       # next int
+    t = 0       # next text character
+    h = 0       # next hash byte
+    message_number = 0
+    timestamp = ''
+    
+    def lines(i: int, t: int) -> tuple:
+        """The count-prefixed strings at ints[i]; returns them and the next i, t."""
+        count = ints[i]
+        ends = list(accumulate(ints[i + 1:i + 1 + count], initial=t))
+        return [text[start:end] for start, end in zip(ends, ends[1:])], i + 1 + count, ends[-1]
+    
+    def ids(i: int) -> tuple:
+        """The count-prefixed zigzag-delta ids at ints[i]; returns them and the next i."""
+        count = ints[i]
+        steps = [(value >> 1 ^ -(value & 1)) + 1 for value in ints[i + 1:i + 1 + count]]
+        return list(accumulate(steps, initial=-1))[1:], i + 1 + count
+    
+    for _ in range(records):
+        session_id, capture_method = metadata[ints[i]]
+        message_number += unzigzag(ints[i + 1])
+        length = ints[i + 3]
+        timestamp = timestamp[:ints[i + 2]] + text[t:t + length]
+        t += length
+        
+        if ints[i + 4] == HASH_MD5:
+            text_hash = hashes[h:h + 16].hex()
+            h += 16
+            i += 5
+        else:
+            length = ints[i + 5]
+            text_hash = text[t:t + length]
+            t += length
+            i += 6
+        
+        flags = ints[i]
+        i += 1
+        kind = KINDS[flags & 3]
+        diff = {'type': kind}
+        if flags & 8:
+            diff['keyframe'] = True
+        interned = flags & 4
+        if interned:
+            diff['format'] = FORMAT_DICTIONARY
+            diff['lines'], i, t = lines(i, t)
+        
+        if kind == 'full':
+            if interned:
+                diff['ids'], i = ids(i)
+            else:
+                length = ints[i]
+                diff['content'] = text[t:t + length]
+                t += length
+                i += 1
+        elif kind == 'delta':
+            changes = []
+            count = ints[i]
+            i += 1
+            for _ in range(count):
+                op = OPS[ints[i]]
+                if op == 'insert':
+                    change = {'op': op, 'position': ints[i + 1]}
+                    i += 2
+                else:
+                    start = ints[i + 1]
+                    change = {'op': op, 'old_start': start, 'old_end': start + ints[i + 2]}
+                    i += 3
+                if op != 'delete':
+                    if interned:
+                        change['new_ids'], i = ids(i)
+                    else:
+                        change['new_lines'], i, t = lines(i, t)
+                changes.append(change)
+            diff['changes'] = changes
+        
+        yield {
+            'session_id': session_id,
+            'timestamp': timestamp,
+            'message_number': message_number,
+            'text_hash': text_hash,
+            'capture_method': capture_method,
+            'diff': diff
+        }
+
+
+def write_container(output_file: Path, records: Iterable[Dict], block_records: int = BLOCK_RECORDS,
+                    entropy: str = 'none', level: int = -1, workers: int = 1) -> int:
+    """
+    Write compressed records as a delta container, each block entropy
+    coded with entropy at level (-1: the codec's default) on up to
+    workers threads. Returns the bytes written.
+    """
+    codec_id, compress, _, default_level = get_entropy_codec(entropy)
+    if level == -1:
+        level = default_level
+    
+    metadata: Dict[tuple, int] = {}
+    blocks = []
+    block = _BlockEncoder(metadata)
+    count = 0
+    for record in records:
+        block.add(record)
+        count += 1
+        if block.records >= block_records:
+            blocks.append(block.body())
+            block = _BlockEncoder(metadata)
+    if block.records:
+        blocks.append(block.body())
+    
+    header = bytearray(MAGIC)
+    encode_varints((CONTAINER_VERSION, len(metadata)), header)
+    for session_id, capture_method in metadata:
+        _write_text(session_id, header)
+        _write_text(capture_method, header)
+    encode_varints((count,), header)
+    
+    if compress is not None:
+        if workers > 1 and len(blocks) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                blocks = list(executor.map(compress, blocks, [level] * len(blocks)))
+        else:
+            blocks = [compress(body, level) for body in blocks]
+    
+    with open(output_file, 'wb') as f:
+        f.write(header)
+        written = len(header)
+        for body in blocks:
+            frame = bytearray()
+            encode_varints((codec_id, len(body)), frame)
+            f.write(frame)
+            f.write(body)
+            written += len(frame) + len(body)
+    return written
+
+
+def read_header(f: BinaryIO) -> tuple:
+    """Read a container header: (metadata table, record count), leaving f at the first block."""
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"Not a delta container: {getattr(f, 'name', f)}")
+    version = _read_varint(f)
+    if version != CONTAINER_VERSION:
+        raise ValueError(f"Unsupported delta container version: {version}")
+    metadata = [(_read_text(f), _read_text(f)) for _ in range(_read_varint(f))]
+    return metadata, _read_varint(f)
+
+
+def read_block(f: BinaryIO, metadata: List[tuple]) -> List[Dict]:
+    """Read and decode the block at f's position; needs nothing from the blocks before it."""
+    codec_id = _read_varint(f)
+    if codec_id not in BLOCK_DECOMPRESS:
+        raise ValueError(f"Unknown block codec: {codec_id}")
+    body = f.read(_read_varint(f))
+    if BLOCK_DECOMPRESS[codec_id] is not None:
+        body = BLOCK_DECOMPRESS[codec_id](body)
+    return list(_decode_block(body, metadata))
+
+
+def iter_blocks(input_file: Path) -> Iterator[tuple]:
+    """Each block of a delta container as (file offset, records)."""
+    with open(input_file, 'rb') as f:
+        metadata, remaining = read_header(f)
+        while remaining > 0:
+            offset = f.tell()
+            records = read_block(f, metadata)
+            remaining -= len(records)
+            yield offset, records
+
+
+def read_container(input_file: Path) -> Iterator[Dict]:
+    """Stream the records of a delta container, one block at a time."""
+    for _, records in iter_blocks(input_file):
+        yield from records
+
+
+def get_entropy_codec(name: str) -> tuple:
+    """The ENTROPY_CODECS entry called name."""
+    if name not in ENTROPY_CODECS:
+        raise ValueError(f"Unknown entropy codec: {name} (expected one of {tuple(ENTROPY_CODECS)})")
+    return ENTROPY_CODECS[name]
+
+
+def is_container(path: Path) -> bool:
+    """True if path starts with the container magic."""
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def read_compressed(input_file: Path, codec: JsonCodec = None) -> Iterator[Dict]:
+    """Records of a compressed file, container or JSONL."""
+    if is_container(input_file):
+        return read_container(input_file)
+    return JsonlReader(input_file, codec=codec).records()
+
+
+def convert_to_container(input_file: Path, output_file: Path = None, block_records: int = BLOCK_RECORDS,
+                         entropy: str = 'none', level: int = -1) -> Path:
+    """Rewrite a compressed JSONL file as a delta container (next to it by default)."""
+    input_file = Path(input_file)
+    output_file = output_file or input_file.with_suffix(CONTAINER_SUFFIX)
+    write_container(output_file, JsonlReader(input_file).records(), block_records, entropy, level)
+    return output_file
@@ -1,694 +1,429 @@
-import json
-import sys
-import difflib
-    import codecs
-    import sys
 #!/usr/bin/env python3
-
 # -*- coding: utf-8 -*-
-
 """
-
 Delta Compressor - Smart compression for Claude Desktop logs
-
 Reduces file sizes by 90%+ using delta compression - only stores what changed.
 
 Performance Impact:
-
 - Raw logs: ~3MB per session
-
 - Compressed: ~300KB per session (10x smaller!)
-
 - Curator processing: 10-100x faster
-
 """
 
+import sys
+from pathlib import Path
+from typing import Dict, List
 
+# Shared with the curator
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from compressor.container import (CONTAINER_SUFFIX, convert_to_container, get_entropy_codec, read_compressed,
+                                  write_container)
+from compressor.line_diff import get_diff_engine
+from compressor.line_dictionary import (FORMAT_DICTIONARY, FORMAT_LITERAL, DeltaReplay, LineDictionary,
+                                        apply_changes)
+from compressor.seek_index import index_path, keyframe, needs_keyframe, write_index
+from config import (COMPRESSED_BLOCK_RECORDS, COMPRESSED_CONTAINER, COMPRESSED_ENTROPY, COMPRESSED_ENTROPY_LEVEL,
+                    COMPRESSED_FORMAT, DIFF_ENGINE, KEYFRAME_INTERVAL, KEYFRAME_RATIO)
+from curator.json_codec import get_codec
+from curator.jsonl_reader import JsonlReader
 
 
-
-
+CONTAINERS = ('jsonl', 'binary')
 
 
 # Fix Windows console encoding
-
 if sys.platform == 'win32':
-
-
+    import codecs
     sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
-
     sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
 
-class DeltaCompressor:
 
+class DeltaCompressor:
     """
-
     Smart compressor that only stores deltas (changes) between captures.
-
     
-
     Instead of storing the full screen capture every time, we:
-
     1. Compare with previous capture
-
     2. Calculate what changed (diff)
-
     3. Store only the changes + metadata
-
     4. Can reconstruct full captures when needed
-
     """
-
     
-
-    def __init__(self, input_dir: str, output_dir: str):
-
+    def __init__(self, input_dir: str, output_dir: str, diff_engine: str = DIFF_ENGINE,
+                 compressed_format: int = COMPRESSED_FORMAT, container: str = COMPRESSED_CONTAINER,
+                 entropy: str = COMPRESSED_ENTROPY, entropy_level: int = COMPRESSED_ENTROPY_LEVEL,
+                 block_records: int = COMPRESSED_BLOCK_RECORDS, block_workers: int = 1,
+                 keyframe_interval: int = KEYFRAME_INTERVAL, keyframe_ratio: float = KEYFRAME_RATIO):
         self.input_dir = Path(input_dir)
-
         self.output_dir = Path(output_dir)
-
         self.output_dir.mkdir(exist_ok=True)
-
         
-
         # Track last seen content for each session
-
         self.last_content = {}
-
-        
-
+        self.codec = get_codec()
+        
+        # Line diff: myers or difflib (see line_diff) - both emit the same ops
+        self.diff_lines = get_diff_engine(diff_engine)
+        
+        # Output format: 2 interns lines in a per-file dictionary (see line_dictionary)
+        if compressed_format not in (FORMAT_LITERAL, FORMAT_DICTIONARY):
+            raise ValueError(f"Unknown compressed format: {compressed_format} (expected 1 or 2)")
+        self.format = compressed_format
+        self.dictionaries = {}
+        
+        # Output file: compressed JSONL or a binary delta container (see container)
+        if container not in CONTAINERS:
+            raise ValueError(f"Unknown compressed container: {container} (expected one of {CONTAINERS})")
+        self.container = container
+        
+        # Container blocks: entropy coded with zlib / lzma / bz2 (on block_workers threads), or stored
+        get_entropy_codec(entropy)
+        if entropy != 'none' and container != 'binary':
+            raise ValueError(f"Entropy coding ({entropy}) needs the binary container")
+        self.entropy = entropy
+        self.entropy_level = entropy_level
+        self.block_records = block_records
+        self.block_workers = block_workers
+        
+        # Keyframes: whole captures that bound a random read's replay (see seek_index)
+        self.keyframe_interval = keyframe_interval
+        self.keyframe_ratio = keyframe_ratio
+        self.since_keyframe = {}  # deltas written per session since its last keyframe
+    
     def compute_diff(self, old_text: str, new_text: str) -> Dict:
-
         """
-
         Compute compact diff between two texts.
-
         Returns a structure that can reconstruct new_text from old_text.
-
         """
-
         if not old_text:
-
             # First capture - store full content
-
             return {
-
                 'type': 'full',
-
                 'content': new_text,
-
                 'size': len(new_text)
-
             }
-
         
-
         # Check if identical (common case!)
-
         if old_text == new_text:
-
             return {
-
                 'type': 'identical',
-
                 'size': 0
-
             }
-
         
-
         # Compute line-based diff (more efficient than char-based)
-
         old_lines = old_text.splitlines(keepends=True)
-
         new_lines = new_text.splitlines(keepends=True)
-
         
-
-        # Use SequenceMatcher for efficient diff
-
-        differ = difflib.SequenceMatcher(None, old_lines, new_lines)
-
-        opcodes = differ.get_opcodes()
-
+        # Changed regions as difflib-style opcodes, from the configured engine
+        opcodes = self.diff_lines(old_lines, new_lines)
         
-
         # Build compact delta structure
-
         changes = []
-
         for tag, i1, i2, j1, j2 in opcodes:
-
             if tag == 'equal':
-
                 continue  # No need to store unchanged parts
-
             elif tag == 'replace':
-
                 changes.append({
-
                     'op': 'replace',
-
                     'old_start': i1,
-
                     'old_end': i2,
-
                     'new_lines': new_lines[j1:j2]
-
                 })
-
             elif tag == 'delete':
-
                 changes.append({
-
                     'op': 'delete',
-
                     'old_start': i1,
-
                     'old_end': i2
-
                 })
-
             elif tag == 'insert':
-
                 changes.append({
-
                     'op': 'insert',
-
                     'position': i1,
-
                     'new_lines': new_lines[j1:j2]
-
                 })
-
         
-
         # Calculate compression ratio
-
         delta_size = sum(len(''.join(c.get('new_lines', []))) for c in changes)
-
         
-
         return {
-
             'type': 'delta',
-
             'changes': changes,
-
             'size': delta_size,
-
             'original_size': len(new_text),
-
             'compression_ratio': 1 - (delta_size / len(new_text)) if len(new_text) > 0 else 0
-
         }
-
     
-
     def compress_capture(self, session_id: str, capture: Dict) -> Dict:
-
         """
-
         Compress a single capture using delta encoding.
-
         Returns compressed capture with metadata.
-
         """
-
         raw_text = capture.get('raw_text', '')
-
         
-
         # Get last content for this session
-
         last_text = self.last_content.get(session_id, '')
-
         
-
         # Compute diff
-
         diff_data = self.compute_diff(last_text, raw_text)
-
+        if self.format == FORMAT_DICTIONARY:
+            diff_data = self.dictionaries.setdefault(session_id, LineDictionary()).encode(diff_data)
+        
+        # Keyframe: the whole capture, so random reads replay from here (see seek_index)
+        since_keyframe = self.since_keyframe.get(session_id, 0)
+        if needs_keyframe(diff_data, raw_text, since_keyframe, self.keyframe_interval, self.keyframe_ratio):
+            diff_data = keyframe(raw_text)
+            if self.format == FORMAT_DICTIONARY:
+                self.dictionaries[session_id] = LineDictionary()
+                diff_data = self.dictionaries[session_id].encode(diff_data)
+            self.since_keyframe[session_id] = 0
+        elif diff_data['type'] == 'delta':
+            self.since_keyframe[session_id] = since_keyframe + 1
         
-
         # Update last content
-
         self.last_content[session_id] = raw_text
-
         
-
         # Build compressed capture
-
         compressed = {
-
             'session_id': capture['session_id'],
-
             'timestamp': capture['timestamp'],
-
             'message_number': capture['message_number'],
-
             'text_hash': capture['text_hash'],
-
             'capture_method': capture['capture_method'],
-
             'diff': diff_data
-
         }
-
         
-
         return compressed
-
     
-
-    def decompress_capture(self, compressed: Dict, previous_text: str = '') -> str:
-
+    def decompress_capture(self, compressed: Dict, previous_text: str = '',
+                           dictionary: LineDictionary = None) -> str:
         """
-
         Reconstruct full text from compressed capture.
-
+        A format-2 capture also needs its file's LineDictionary, holding the
+        lines of the captures before it; its own lines are added to it.
         """
-
         diff_data = compressed['diff']
-
+        if diff_data.get('keyframe') and dictionary is not None:
+            dictionary.clear()
+        table = None
+        if diff_data.get('format') == FORMAT_DICTIONARY:
+            table = dictionary.lines
+            table.extend(diff_data['lines'])
         
-
         if diff_data['type'] == 'full':
-
-            return diff_data['content']
-
+            return diff_data['content'] if table is None else dictionary.text(diff_data['ids'])
         
-
         if diff_data['type'] == 'identical':
-
             return previous_text
-
         
-
         if diff_data['type'] == 'delta':
-
             # Reconstruct from changes
-
             lines = previous_text.splitlines(keepends=True)
-
-            
-
-            for change in diff_data['changes']:
-
-                op = change['op']
-
-                
-
-                if op == 'replace':
-
-                    start = change['old_start']
-
-                    end = change['old_end']
-
-                    lines[start:end] = change['new_lines']
-
-                elif op == 'delete':
-
-                    start = change['old_start']
-
-                    end = change['old_end']
-
-                    del lines[start:end]
-
-                elif op == 'insert':
-
-                    pos = change['position']
-
-                    lines[pos:pos] = change['new_lines']
-
-            
-
-            return ''.join(lines)
-
+            return ''.join(apply_changes(lines, diff_data['changes'], table))
         
-
         return ''
-
     
-
     def compress_log_file(self, input_file: Path) -> Path:
-
         """
-
         Compress an entire raw log file.
-
         Returns path to compressed output file.
-
         """
-
         print(f"\n Compressing: {input_file.name}")
-
         
-
         # Read raw captures
-
-        captures = []
-
         try:
-
-            with open(input_file, 'r', encoding='utf-8') as f:
-
-                for line in f:
-
-                    if line.strip():
-
-                        captures.append(json.loads(line))
-
+            captures = list(JsonlReader(input_file, codec=self.codec).records())
         except Exception as e:
-
             print(f" Error reading file: {e}")
-
             return None
-
         
-
         print(f" Found {len(captures)} captures")
-
         
-
         # Compress each capture
-
         session_id = captures[0]['session_id'] if captures else 'unknown'
-
         self.last_content[session_id] = ''  # Reset for this file
-
+        self.dictionaries[session_id] = LineDictionary()
+        self.since_keyframe[session_id] = 0
         
-
         compressed_captures = []
-
         total_original = 0
-
         total_compressed = 0
-
         identical_count = 0
-
+        keyframe_count = 0
         
-
         for capture in captures:
-
             compressed = self.compress_capture(session_id, capture)
-
             compressed_captures.append(compressed)
-
             
-
             # Track stats
-
             diff = compressed['diff']
-
             total_original += diff.get('original_size', diff.get('size', 0))
-
             total_compressed += diff['size']
-
             
-
             if diff['type'] == 'identical':
-
                 identical_count += 1
-
+            elif diff.get('keyframe'):
+                keyframe_count += 1
         
-
         # Write compressed file
-
-        output_file = self.output_dir / f"compressed_{input_file.name}"
-
-        with open(output_file, 'w', encoding='utf-8') as f:
-
-            for compressed in compressed_captures:
-
-                f.write(json.dumps(compressed, ensure_ascii=True) + '\n')
-
+        output_file = self.write_compressed(input_file, compressed_captures)
         
-
         # Calculate stats
-
         compression_ratio = 1 - (total_compressed / total_original) if total_original > 0 else 0
-
         
-
         print(f" Compressed {len(captures)} captures")
-
         print(f"   v Original: {total_original:,} bytes")
-
         print(f"   v Compressed: {total_compressed:,} bytes")
-
         print(f"   v Compression: {compression_ratio*100:.1f}%")
-
         print(f"   v Identical captures skipped: {identical_count}")
-
+        print(f"   v Keyframes: {keyframe_count} (index: {index_path(output_file).name})")
+        print(f"   v On disk: {output_file.stat().st_size:,} of {input_file.stat().st_size:,} bytes"
+              f"{f' ({self.entropy} blocks)' if self.entropy != 'none' else ''}")
         print(f" Saved to: {output_file}")
-
         
-
         return output_file
-
     
-
+    def write_compressed(self, input_file: Path, compressed_captures: List[Dict]) -> Path:
+        """
+        Write a raw log's compressed captures in the configured container,
+        with its seek index. Returns path to the compressed file.
+        """
+        if self.container == 'binary':
+            output_file = self.output_dir / f"compressed_{input_file.stem}{CONTAINER_SUFFIX}"
+            write_container(output_file, compressed_captures, self.block_records,
+                            self.entropy, self.entropy_level, self.block_workers)
+        else:
+            output_file = self.output_dir / f"compressed_{input_file.name}"
+            with open(output_file, 'wb') as f:
+                f.write(self.codec.dumps_lines(compressed_captures))
+        write_index(output_file, self.codec)
+        return output_file
+    
     def decompress_log_file(self, input_file: Path) -> Path:
-
         """
-
         Decompress a compressed log file back to full format.
-
         Useful for verification or if Curator needs full data.
-
         """
-
         print(f"\n Decompressing: {input_file.name}")
-
         
-
         # Read compressed captures
-
-        compressed_captures = []
-
         try:
-
-            with open(input_file, 'r', encoding='utf-8') as f:
-
-                for line in f:
-
-                    if line.strip():
-
-                        compressed_captures.append(json.loads(line))
-
+            compressed_captures = list(read_compressed(input_file, self.codec))
         except Exception as e:
-
             print(f" Error reading file: {e}")
-
             return None
-
         
-
         print(f" Found {len(compressed_captures)} compressed captures")
-
         
-
-        # Decompress each capture
-
+        # Decompress each capture (format 1 or 2, see line_dictionary)
         decompressed_captures = []
-
-        previous_text = ''
-
+        replay = DeltaReplay()
         
-
         for compressed in compressed_captures:
-
             # Reconstruct full text
-
-            full_text = self.decompress_capture(compressed, previous_text)
-
+            full_text = replay.apply(compressed['diff'])
             
-
             # Build decompressed capture
-
             decompressed = {
-
                 'session_id': compressed['session_id'],
-
                 'timestamp': compressed['timestamp'],
-
                 'message_number': compressed['message_number'],
-
                 'text_hash': compressed['text_hash'],
-
                 'capture_method': compressed['capture_method'],
-
                 'raw_text': full_text
-
             }
-
             
-
             decompressed_captures.append(decompressed)
-
-            previous_text = full_text
-
         
-
         # Write decompressed file
-
         output_file = self.output_dir / f"decompressed_{input_file.stem}.jsonl"
-
-        with open(output_file, 'w', encoding='utf-8') as f:
-
-            for capture in decompressed_captures:
-
-                f.write(json.dumps(capture, ensure_ascii=True) + '\n')
-
+        with open(output_file, 'wb') as f:
+            f.write(self.codec.dumps_lines(decompressed_captures))
         
-
         print(f" Decompressed {len(decompressed_captures)} captures")
-
         print(f" Saved to: {output_file}")
-
         
-
         return output_file
-
     
-
     def compress_all_logs(self):
-
         """Process all raw log files and compress them."""
-
         log_files = sorted(self.input_dir.glob("*.jsonl"))
-
         
-
         if not log_files:
-
             print(f"  No JSONL files found in {self.input_dir}")
-
             return
-
         
-
         print(f"\n Found {len(log_files)} log files to compress")
-
         print("=" * 60)
-
         
-
         total_original = 0
-
         total_compressed = 0
-
         
-
         for log_file in log_files:
-
             compressed_file = self.compress_log_file(log_file)
-
             
-
             if compressed_file:
-
                 # Track cumulative stats
-
                 original_size = log_file.stat().st_size
-
                 compressed_size = compressed_file.stat().st_size
-
                 total_original += original_size
-
                 total_compressed += compressed_size
-
         
-
         # Show overall summary
-
         if total_original > 0:
-
             overall_ratio = 1 - (total_compressed / total_original)
-
             print("\n" + "=" * 60)
-
             print(" COMPRESSION SUMMARY")
-
             print("=" * 60)
-
             print(f" Files processed: {len(log_files)}")
-
             print(f" Total original: {total_original:,} bytes ({total_original/1024/1024:.2f} MB)")
-
             print(f" Total compressed: {total_compressed:,} bytes ({total_compressed/1024/1024:.2f} MB)")
-
             print(f" Overall compression: {overall_ratio*100:.1f}%")
-
             print(f" Space saved: {(total_original-total_compressed):,} bytes ({(total_original-total_compressed)/1024/1024:.2f} MB)")
-
             print("=" * 60)
 
-def main():
 
+def main():
     """Main execution function."""
-
-
     
-
     # Default paths
-
     raw_logs_dir = Path(__file__).parent.parent / "logger" / "raw_logs"
-
     compressed_dir = Path(__file__).parent / "compressed"
-
     
-
     # Initialize compressor
-
     compressor = DeltaCompressor(str(raw_logs_dir), str(compressed_dir))
-
     
-
     # Check for command-line arguments
-
     if len(sys.argv) > 1:
-
         command = sys.argv[1]
-
         
-
         if command == "compress":
-
             # Compress all logs
-
             compressor.compress_all_logs()
-
         elif command == "decompress" and len(sys.argv) > 2:
-
             # Decompress specific file
-
             compressed_file = Path(sys.argv[2])
-
             if compressed_file.exists():
-
                 compressor.decompress_log_file(compressed_file)
-
             else:
-
                 print(f" File not found: {compressed_file}")
-
+        elif command == "convert" and len(sys.argv) > 2:
+            # Rewrite a compressed JSONL file as a binary delta container
+            compressed_file = Path(sys.argv[2])
+            if compressed_file.exists():
+                output_file = convert_to_container(compressed_file, block_records=compressor.block_records,
+                                                   entropy=compressor.entropy, level=compressor.entropy_level)
+                print(f" {compressed_file.stat().st_size:,} -> {output_file.stat().st_size:,} bytes: {output_file}")
+            else:
+                print(f" File not found: {compressed_file}")
         else:
-
             print("Usage:")
-
             print("  python delta_compressor.py compress              # Compress all raw logs")
-
             print("  python delta_compressor.py decompress <file>     # Decompress specific file")
-
+            print("  python delta_compressor.py convert <file>        # Compressed JSONL -> binary container")
     else:
-
         # Default action: compress all logs
-
         compressor.compress_all_logs()
 
-if __name__ == "__main__":
 
+if __name__ == "__main__":
     main()
-
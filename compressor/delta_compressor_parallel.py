@@ -1,9 +1,3 @@
-import json
-import sys
-import difflib
-import time
-    import codecs
-    import sys
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
@@ -22,91 +16,62 @@ Performance:
 - Parallel (20 cores): Process 20 files in 500ms = 20x speedup
 """
 
+import multiprocessing as mp
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Dict
+
+# Shared with the curator
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from compressor.container import CONTAINER_SUFFIX, read_compressed
+from compressor.delta_compressor import DeltaCompressor
+from compressor.line_dictionary import DeltaReplay
+from config import (COMPRESSED_BLOCK_RECORDS, COMPRESSED_CONTAINER, COMPRESSED_ENTROPY, COMPRESSED_ENTROPY_LEVEL,
+                    COMPRESSED_FORMAT, DIFF_ENGINE, KEYFRAME_INTERVAL, KEYFRAME_RATIO)
+from curator.json_codec import get_codec
+from curator.jsonl_reader import JsonlReader
+
 
 # Fix Windows console encoding
 if sys.platform == 'win32':
+    import codecs
     sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
     sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
 
 
 # ============================================================================
-# CORE COMPRESSION FUNCTIONS (same as original, for worker processes)
+# WORKER FUNCTIONS (one DeltaCompressor per file, in the worker process)
 # ============================================================================
 
-def compute_diff(old_text: str, new_text: str) -> Dict:
-    """
-    Compute compact diff between two texts.
-    Returns a structure that can reconstruct new_text from old_text.
-    """
-    if not old_text:
-        return {
-            'type': 'full',
-            'content': new_text,
-            'size': len(new_text)
-        }
-    
-    if old_text == new_text:
-        return {
-            'type': 'identical',
-            'size': 0
-        }
-    
-    old_lines = old_text.splitlines(keepends=True)
-    new_lines = new_text.splitlines(keepends=True)
-    
-    differ = difflib.SequenceMatcher(None, old_lines, new_lines)
-    opcodes = differ.get_opcodes()
-    
-    changes = []
-    for tag, i1, i2, j1, j2 in opcodes:
-        if tag == 'equal':
-            continue
-        elif tag == 'replace':
-            changes.append({
-                'op': 'replace',
-                'old_start': i1,
-                'old_end': i2,
-                'new_lines': new_lines[j1:j2]
-            })
-        elif tag == 'delete':
-            changes.append({
-                'op': 'delete',
-                'old_start': i1,
-                'old_end': i2
-            })
-        elif tag == 'insert':
-            changes.append({
-                'op': 'insert',
-                'position': i1,
-                'new_lines': new_lines[j1:j2]
-            })
-    
-    delta_size = sum(len(''.join(c.get('new_lines', []))) for c in changes)
-    
-    return {
-        'type': 'delta',
-        'changes': changes,
-        'size': delta_size,
-        'original_size': len(new_text),
-        'compression_ratio': 1 - (delta_size / len(new_text)) if len(new_text) > 0 else 0
-    }
-
-
-def compress_single_file(input_file_str: str, output_dir_str: str) -> Dict:
+def compress_single_file(input_file_str: str, output_dir_str: str,
+                         diff_engine: str = DIFF_ENGINE,
+                         compressed_format: int = COMPRESSED_FORMAT,
+                         container: str = COMPRESSED_CONTAINER,
+                         entropy: str = COMPRESSED_ENTROPY,
+                         entropy_level: int = COMPRESSED_ENTROPY_LEVEL,
+                         block_records: int = COMPRESSED_BLOCK_RECORDS,
+                         block_workers: int = 1,
+                         keyframe_interval: int = KEYFRAME_INTERVAL,
+                         keyframe_ratio: float = KEYFRAME_RATIO) -> Dict:
     """
     Compress a single file (worker function for parallel processing).
+    Captures go through DeltaCompressor.compress_capture, so the output is
+    what DeltaCompressor.compress_log_file writes; a binary container's
+    blocks are entropy coded on block_workers threads.
     Returns compression stats.
     """
     input_file = Path(input_file_str)
-    output_dir = Path(output_dir_str)
     
     try:
+        compressor = DeltaCompressor(str(input_file.parent), output_dir_str, diff_engine, compressed_format,
+                                     container, entropy, entropy_level, block_records, block_workers,
+                                     keyframe_interval, keyframe_ratio)
+        
         # Read raw captures
-        captures = []
-        with open(input_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                    captures.append(json.loads(line))
+        captures = list(JsonlReader(input_file, codec=compressor.codec).records())
         
         if not captures:
             return {
@@ -117,30 +82,13 @@ def compress_single_file(input_file_str: str, output_dir_str: str) -> Dict:
         
         # Compress each capture
         session_id = captures[0]['session_id']
-        last_content = ''
-        
         compressed_captures = []
         total_original = 0
         total_compressed = 0
         identical_count = 0
         
         for capture in captures:
-            raw_text = capture.get('raw_text', '')
-            
-            # Compute diff
-            diff_data = compute_diff(last_content, raw_text)
-            last_content = raw_text
-            
-            # Build compressed capture
-            compressed = {
-                'session_id': capture['session_id'],
-                'timestamp': capture['timestamp'],
-                'message_number': capture['message_number'],
-                'text_hash': capture['text_hash'],
-                'capture_method': capture['capture_method'],
-                'diff': diff_data
-            }
-            
+            compressed = compressor.compress_capture(session_id, capture)
             compressed_captures.append(compressed)
             
             # Track stats
@@ -152,10 +100,7 @@ def compress_single_file(input_file_str: str, output_dir_str: str) -> Dict:
                 identical_count += 1
         
         # Write compressed file
-        output_file = output_dir / f"compressed_{input_file.name}"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            for compressed in compressed_captures:
-                f.write(json.dumps(compressed, ensure_ascii=True) + '\n')
+        output_file = compressor.write_compressed(input_file, compressed_captures)
         
         compression_ratio = 1 - (total_compressed / total_original) if total_original > 0 else 0
         
@@ -188,42 +133,16 @@ def decompress_single_file(input_file_str: str, output_dir_str: str) -> Dict:
     
     try:
         # Read compressed captures
-        compressed_captures = []
-        with open(input_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                    compressed_captures.append(json.loads(line))
+        codec = get_codec()
+        compressed_captures = list(read_compressed(input_file, codec))
         
-        # Decompress each capture
+        # Decompress each capture (format 1 or 2, see line_dictionary)
         decompressed_captures = []
-        previous_text = ''
+        replay = DeltaReplay()
         
         for compressed in compressed_captures:
-            diff_data = compressed['diff']
-            
             # Reconstruct full text
-            if diff_data['type'] == 'full':
-                full_text = diff_data['content']
-            elif diff_data['type'] == 'identical':
-                full_text = previous_text
-            elif diff_data['type'] == 'delta':
-                lines = previous_text.splitlines(keepends=True)
-                for change in diff_data['changes']:
-                    op = change['op']
-                    if op == 'replace':
-                        start = change['old_start']
-                        end = change['old_end']
-                        lines[start:end] = change['new_lines']
-                    elif op == 'delete':
-                        start = change['old_start']
-                        end = change['old_end']
-                        del lines[start:end]
-                    elif op == 'insert':
-                        pos = change['position']
-                        lines[pos:pos] = change['new_lines']
-                full_text = ''.join(lines)
-            else:
-                full_text = ''
+            full_text = replay.apply(compressed['diff'])
             
             decompressed = {
                 'session_id': compressed['session_id'],
@@ -235,13 +154,11 @@ def decompress_single_file(input_file_str: str, output_dir_str: str) -> Dict:
             }
             
             decompressed_captures.append(decompressed)
-            previous_text = full_text
         
         # Write decompressed file
         output_file = output_dir / f"decompressed_{input_file.stem}.jsonl"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            for capture in decompressed_captures:
-                f.write(json.dumps(capture, ensure_ascii=True) + '\n')
+        with open(output_file, 'wb') as f:
+            f.write(codec.dumps_lines(decompressed_captures))
         
         return {
             'file': input_file.name,
@@ -268,10 +185,11 @@ class ParallelDeltaCompressor:
     Processes all files simultaneously across 20 cores.
     """
     
-    def __init__(self, input_dir: str, output_dir: str, max_workers: int = None):
+    def __init__(self, input_dir: str, output_dir: str, max_workers: int = None, diff_engine: str = DIFF_ENGINE):
         self.input_dir = Path(input_dir)
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
+        self.diff_engine = diff_engine
         
         # Auto-detect CPU count (20 for 12700K)
         self.max_workers = max_workers or mp.cpu_count()
@@ -298,9 +216,14 @@ class ParallelDeltaCompressor:
         file_paths = [str(f) for f in log_files]
         output_dirs = [str(self.output_dir)] * len(file_paths)
         
+        # Fewer files than cores: spread each file's container blocks over the spare ones
+        block_workers = max(1, self.max_workers // len(file_paths))
+        
         # Process ALL files SIMULTANEOUSLY
         with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
-            results = list(executor.map(compress_single_file, file_paths, output_dirs))
+            results = list(executor.map(partial(compress_single_file, diff_engine=self.diff_engine,
+                                                block_workers=block_workers),
+                                        file_paths, output_dirs))
         
         elapsed_ms = (time.time() - start_time) * 1000
         
@@ -354,7 +277,8 @@ class ParallelDeltaCompressor:
         """
         PARALLEL: Decompress all compressed files simultaneously.
         """
-        compressed_files = sorted(self.output_dir.glob("compressed_*.jsonl"))
+        compressed_files = sorted(path for path in self.output_dir.glob("compressed_*")
+                                  if path.suffix in ('.jsonl', CONTAINER_SUFFIX))
         
         if not compressed_files:
             print(f"⚠ No compressed files found in {self.output_dir}")
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Seek Index - random access into compressed files
+
+A compressed file is a chain of deltas: without help, reading capture
+#5000 means replaying the 4,999 records before it. Two things bound that
+work:
+
+- keyframes: the compressor writes a capture whole (a 'full' diff with
+  'keyframe': True - in format 2 it also starts a new line dictionary)
+  after KEYFRAME_INTERVAL deltas, or sooner when a delta would carry more
+  than KEYFRAME_RATIO of the capture's text anyway;
+- a sidecar index, <compressed file>.idx (JSON), with each record's
+  message_number, timestamp and byte offset - of its line in JSONL, of
+  its block in a container - and the record numbers of the keyframes.
+
+get_capture(file, n) and get_at_time(file, ts) look the record up, seek
+to the last keyframe at or before it and replay from there: at most
+KEYFRAME_INTERVAL deltas, whatever the file's length. Identical captures
+are not counted, they cost nothing to replay.
+
+Files written before keyframes (or whose index is missing or stale) are
+scanned once into an index in memory; their first record is their only
+keyframe, so they still decode, from the start.
+"""
+
+import json
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from compressor.container import is_container, iter_blocks, read_block, read_header
+from compressor.line_dictionary import FORMAT_DICTIONARY, DeltaReplay
+from config import KEYFRAME_INTERVAL, KEYFRAME_RATIO
+from curator.json_codec import JsonCodec
+from curator.jsonl_reader import JsonlReader
+
+
+INDEX_SUFFIX = '.idx'
+INDEX_VERSION = 1
+
+
+def needs_keyframe(diff: Dict, text: str, since_keyframe: int,
+                   interval: int = KEYFRAME_INTERVAL, ratio: float = KEYFRAME_RATIO) -> bool:
+    """
+    True if a capture whose diff (either format) is diff, after
+    since_keyframe deltas, should be written as a keyframe instead. The
+    ratio weighs the text the diff writes: a format-2 delta's new
+    dictionary lines, not the lines it merely refers to.
+    """
+    if diff['type'] == 'full':
+        return True
+    if diff['type'] != 'delta':
+        return False
+    if diff.get('format') == FORMAT_DICTIONARY:
+        written = sum(map(len, diff['lines']))
+    else:
+        written = diff['size']
+    return bool(interval and since_keyframe >= interval) or bool(ratio and written > ratio * len(text))
+
+
+def keyframe(text: str) -> Dict:
+    """A capture written whole, as a format-1 diff replay can start from."""
+    return {
+        'type': 'full',
+        'content': text,
+        'size': len(text),
+        'keyframe': True
+    }
+
+
+def index_path(compressed_file: Path) -> Path:
+    """The sidecar index of a compressed file."""
+    compressed_file = Path(compressed_file)
+    return compressed_file.with_name(compressed_file.name + INDEX_SUFFIX)
+
+
+class SeekIndex:
+    """Record positions of one compressed file, container or JSONL."""
+    
+    def __init__(self, message_numbers: List[int], timestamps: List[str], offsets: List[int],
+                 keyframes: List[int], size: int, container: bool):
+        self.message_numbers = message_numbers
+        self.timestamps = timestamps
+        self.offsets = offsets        # per record: its line's offset, or its block's
+        self.keyframes = keyframes    # record numbers, ascending
+        self.size = size              # of the compressed file the index describes
+        self.container = container
+        # First record of each message_number
+        self.records = {}
+        for record, message_number in enumerate(message_numbers):
+            self.records.setdefault(message_number, record)
+    
+    @classmethod
+    def scan(cls, compressed_file: Path, codec: JsonCodec = None) -> 'SeekIndex':
+        """Build the index of compressed_file by reading it through once."""
+        message_numbers, timestamps, offsets, keyframes = [], [], [], []
+        
+        def add(compressed: Dict, offset: int):
+            if not offsets or compressed['diff'].get('keyframe'):
+                keyframes.append(len(offsets))
+            message_numbers.append(compressed['message_number'])
+            timestamps.append(compressed['timestamp'])
+            offsets.append(offset)
+        
+        container = is_container(compressed_file)
+        if container:
+            for offset, records in iter_blocks(compressed_file):
+                for compressed in records:
+                    add(compressed, offset)
+        else:
+            reader = JsonlReader(compressed_file, codec=codec)
+            offset = 0
+            for compressed in reader.records():
+                add(compressed, offset)
+                offset = reader.offset
+        
+        return cls(message_numbers, timestamps, offsets, keyframes, Path(compressed_file).stat().st_size, container)
+    
+    @classmethod
+    def load(cls, compressed_file: Path, codec: JsonCodec = None) -> 'SeekIndex':
+        """The sidecar index of compressed_file, or a fresh scan if it is missing or stale."""
+        try:
+            with open(index_path(compressed_file), encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = None
+        
+        if (data is None or data.get('version') != INDEX_VERSION
+                or data['size'] != Path(compressed_file).stat().st_size):
+            return cls.scan(compressed_file, codec)
+        return cls(data['message_numbers'], data['timestamps'], data['offsets'], data['keyframes'],
+                   data['size'], data['container'])
+    
+    def save(self, compressed_file: Path) -> Path:
+        """Write the index next to compressed_file."""
+        output_file = index_path(compressed_file)
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': INDEX_VERSION,
+                'size': self.size,
+                'container': self.container,
+                'message_numbers': self.message_numbers,
+                'timestamps': self.timestamps,
+                'offsets': self.offsets,
+                'keyframes': self.keyframes
+            }, f, separators=(',', ':'))
+        return output_file
+    
+    def find(self, message_number: int) -> Optional[int]:
+        """Record number of a message_number, or None."""
+        return self.records.get(message_number)
+    
+    def find_time(self, timestamp: str) -> Optional[int]:
+        """Record number of the last capture taken at or before timestamp, or None."""
+        record = bisect_right(self.timestamps, timestamp) - 1
+        return record if record >= 0 else None
+    
+    def keyframe_for(self, record: int) -> int:
+        """The last keyframe at or before record."""
+        return self.keyframes[bisect_right(self.keyframes, record) - 1]
+
+
+def write_index(compressed_file: Path, codec: JsonCodec = None) -> Path:
+    """Index compressed_file and write the sidecar. Returns its path."""
+    return SeekIndex.scan(compressed_file, codec).save(compressed_file)
+
+
+def _records_from(compressed_file: Path, index: SeekIndex, record: int,
+                  codec: JsonCodec = None) -> Iterator[Dict]:
+    """The records of compressed_file from record number record on."""
+    offset = index.offsets[record]
+    if not index.container:
+        yield from JsonlReader(compressed_file, offset=offset, codec=codec).records()
+        return
+    
+    with open(compressed_file, 'rb') as f:
+        metadata, count = read_header(f)
+        f.seek(offset)
+        # The block holds the records from the first one indexed at its offset
+        skip = record - bisect_left(index.offsets, offset)
+        while record < count:
+            records = read_block(f, metadata)[skip:]
+            yield from records
+            record += len(records)
+            skip = 0
+
+
+def read_capture(compressed_file: Path, record: int, index: SeekIndex = None,
+                 codec: JsonCodec = None) -> Dict:
+    """
+    Rebuild the capture at record number record, replaying from the
+    keyframe before it.
+    """
+    index = index or SeekIndex.load(compressed_file, codec)
+    start = index.keyframe_for(record)
+    replay = DeltaReplay()
+    for n, compressed in enumerate(_records_from(compressed_file, index, start, codec), start):
+        full_text = replay.apply(compressed['diff'])
+        if n == record:
+            return {
+                'session_id': compressed['session_id'],
+                'timestamp': compressed['timestamp'],
+                'message_number': compressed['message_number'],
+                'text_hash': compressed['text_hash'],
+                'capture_method': compressed['capture_method'],
+                'raw_text': full_text
+            }
+    raise ValueError(f"{compressed_file} has no record {record} (stale index?)")
+
+
+def get_capture(compressed_file: Path, message_number: int, index: SeekIndex = None,
+                codec: JsonCodec = None) -> Optional[Dict]:
+    """The capture with message_number from a compressed file, or None."""
+    index = index or SeekIndex.load(compressed_file, codec)
+    record = index.find(message_number)
+    return None if record is None else read_capture(compressed_file, record, index, codec)
+
+
+def get_at_time(compressed_file: Path, timestamp: str, index: SeekIndex = None,
+                codec: JsonCodec = None) -> Optional[Dict]:
+    """
+    The capture on screen at timestamp (ISO format, like the Logger's) -
+    the last one taken at or before it - or None if it precedes them all.
+    """
+    index = index or SeekIndex.load(compressed_file, codec)
+    record = index.find_time(timestamp)
+    return None if record is None else read_capture(compressed_file, record, index, codec)
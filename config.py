@@ -1,4 +1,3 @@
-import os
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
@@ -6,6 +5,9 @@ AI-Librarian Configuration
 Environment-based configuration for portable deployment
 """
 
+import os
+from pathlib import Path
+
 
 # Base directories - use environment variables with fallbacks
 AI_LIBRARIAN_HOME = Path(os.getenv(
@@ -39,6 +41,45 @@ DEFAULT_COMPRESSION_INTERVAL = int(os.getenv('AI_LIBRARIAN_COMPRESSION_INTERVAL'
 DEFAULT_CHECK_INTERVAL = int(os.getenv('AI_LIBRARIAN_CHECK_INTERVAL', '30'))  # 30 seconds
 DEFAULT_MIN_FILE_AGE = int(os.getenv('AI_LIBRARIAN_MIN_FILE_AGE', '60'))  # 60 seconds
 
+# Curator UI-noise patterns: JSON file holding a list of regexes (empty = built-in set)
+NOISE_PATTERNS_FILE = os.getenv('AI_LIBRARIAN_NOISE_PATTERNS', '')
+
+# Curator near-duplicate detection: SimHash similarity above which captures collapse (0 = off; e.g. 0.9)
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv('AI_LIBRARIAN_NEAR_DUP_THRESHOLD', '0'))
+
+# Curator message-body storage: none (plain text), zlib (preset dictionary) or lzma
+BODY_COMPRESSION = os.getenv('AI_LIBRARIAN_BODY_COMPRESSION', 'none')
+
+# Curator monthly shards: archive a month this many days after it ends (0 = one database)
+SHARD_AFTER_DAYS = int(os.getenv('AI_LIBRARIAN_SHARD_AFTER_DAYS', '0'))
+
+# JSONL encode/decode library: auto (orjson if installed, else json), orjson or json
+JSON_CODEC = os.getenv('AI_LIBRARIAN_JSON_CODEC', 'auto')
+
+# Compressor line-diff engine: myers (O(ND)) or difflib (SequenceMatcher)
+DIFF_ENGINE = os.getenv('AI_LIBRARIAN_DIFF_ENGINE', 'myers')
+
+# Compressor output format: 2 (per-file line dictionary) or 1 (literal lines)
+COMPRESSED_FORMAT = int(os.getenv('AI_LIBRARIAN_COMPRESSED_FORMAT', '2'))
+
+# Compressor output container: jsonl (one JSON record per line) or binary (delta container)
+COMPRESSED_CONTAINER = os.getenv('AI_LIBRARIAN_COMPRESSED_CONTAINER', 'jsonl')
+
+# Binary container entropy stage: none, zlib, lzma or bz2 per block, at a level (-1 = codec default)
+COMPRESSED_ENTROPY = os.getenv('AI_LIBRARIAN_COMPRESSED_ENTROPY', 'none')
+COMPRESSED_ENTROPY_LEVEL = int(os.getenv('AI_LIBRARIAN_COMPRESSED_ENTROPY_LEVEL', '-1'))
+
+# Binary container: delta records per independently decodable block
+COMPRESSED_BLOCK_RECORDS = int(os.getenv('AI_LIBRARIAN_COMPRESSED_BLOCK_RECORDS', '256'))
+
+# Compressor keyframes: a whole capture every N deltas (0 = first only), or when a delta carries
+# more than this share of the capture's text (0 = off)
+KEYFRAME_INTERVAL = int(os.getenv('AI_LIBRARIAN_KEYFRAME_INTERVAL', '100'))
+KEYFRAME_RATIO = float(os.getenv('AI_LIBRARIAN_KEYFRAME_RATIO', '0'))
+
+# Curator watch mode: seconds between polls of the raw log directory
+WATCH_POLL_INTERVAL = float(os.getenv('AI_LIBRARIAN_WATCH_INTERVAL', '1.0'))
+
 # Ensure critical directories exist
 def ensure_directories():
     """Create necessary directories if they don't exist."""
@@ -67,6 +108,20 @@ def show_config():
     print(f"Compression Interval: {DEFAULT_COMPRESSION_INTERVAL}s")
     print(f"Check Interval:       {DEFAULT_CHECK_INTERVAL}s")
     print(f"Min File Age:         {DEFAULT_MIN_FILE_AGE}s")
+    print(f"Noise Patterns:       {NOISE_PATTERNS_FILE or '(built-in)'}")
+    print(f"Near-Dup Threshold:   {NEAR_DUPLICATE_THRESHOLD or 'off'}")
+    print(f"Body Compression:     {BODY_COMPRESSION}")
+    print(f"Shard After:          {f'{SHARD_AFTER_DAYS} days' if SHARD_AFTER_DAYS else 'off'}")
+    print(f"JSON Codec:           {JSON_CODEC}")
+    print(f"Watch Interval:       {WATCH_POLL_INTERVAL}s")
+    print(f"Diff Engine:          {DIFF_ENGINE}")
+    print(f"Compressed Format:    v{COMPRESSED_FORMAT}")
+    print(f"Compressed Container: {COMPRESSED_CONTAINER}")
+    print(f"Compressed Entropy:   {COMPRESSED_ENTROPY}"
+          f"{'' if COMPRESSED_ENTROPY_LEVEL == -1 else f' level {COMPRESSED_ENTROPY_LEVEL}'}")
+    print(f"Block Records:        {COMPRESSED_BLOCK_RECORDS}")
+    print(f"Keyframes:            {f'every {KEYFRAME_INTERVAL} deltas' if KEYFRAME_INTERVAL else 'first capture'}"
+          f"{f', or past {KEYFRAME_RATIO:.0%} changed' if KEYFRAME_RATIO else ''}")
     print("=" * 60)
 
 if __name__ == "__main__":
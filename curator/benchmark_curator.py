@@ -0,0 +1,981 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Curator Benchmarks
+Micro-benchmarks for the Curator's hot paths on a synthetic capture corpus.
+
+The corpus mimics what the Logger records: every capture is the whole
+visible window - sidebar, title bar, the conversation so far (scrolled to
+the last few turns) and the footer - so consecutive captures overlap
+heavily and the same chrome lines repeat in nearly every snapshot.
+The Compressor's own benchmarks (diff engines, formats, containers,
+entropy stage, seek index) run on it from compressor/benchmark_compressor.py.
+
+Usage:
+    python benchmark_curator.py noise [captures]
+    python benchmark_curator.py backfill [messages]
+    python benchmark_curator.py parallel [files] [captures_per_file] [workers]
+    python benchmark_curator.py segment [captures]
+    python benchmark_curator.py compressed [captures]
+    python benchmark_curator.py neardup [captures]
+    python benchmark_curator.py bodies [messages]
+    python benchmark_curator.py stats [messages]
+    python benchmark_curator.py shards [messages] [months]
+    python benchmark_curator.py export [messages] [workers]
+    python benchmark_curator.py reader [captures]
+    python benchmark_curator.py codec [captures]
+    python benchmark_curator.py watch [captures] [capture_interval_ms]
+    python benchmark_curator.py migrate [messages]
+"""
+
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from itertools import groupby
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from compressor.delta_compressor import DeltaCompressor
+from config import WATCH_POLL_INTERVAL
+from curator.claude_curator import WATCH_LATENCY_TARGET, CapturePipeline, ClaudeCurator, batched
+from curator.body_codec import train_dictionary
+from curator.bulk_export import export_archive, import_archive
+from curator.curator_writer import CuratorWriter
+from curator.fts import fts_query
+from curator.json_codec import JsonCodec, OrjsonCodec, orjson
+from curator.jsonl_reader import JsonlReader
+from curator.migrations import MIGRATIONS, Migrator
+from curator.near_duplicates import snapshot_fingerprint
+from curator.noise_filter import DEFAULT_NOISE_PATTERNS, NoiseFilter
+from curator.shards import month_bounds
+from curator.stats_counters import read_daily_stats, read_stats
+from query_tools.librarian_query import LibrarianQuery
+
+
+SIDEBAR = [
+    "New chat", "Chats", "Projects", "Artifacts", "Code", "Starred",
+    "Recents", "Delta compression notes", "SQLite tuning", "Orchestrator logs",
+    "Claude", "Minimize", "Restore", "Close", "Sidebar", "Home",
+]
+FOOTER = [
+    "Reply to Claude...", "Claude can make mistakes. Please double-check responses.",
+    "Notifications", "Project content",
+]
+WORDS = (
+    "the curator parses raw captures and stores messages in sqlite while the "
+    "compressor keeps only deltas between window snapshots so search stays fast "
+    "index query batch transaction offset ledger snippet token session capture "
+    "orchestrator logger timestamp conversation archive shard export import"
+).split()
+
+
+def make_paragraph(rng: random.Random, min_words: int = 12, max_words: int = 60) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))).capitalize() + '.'
+
+
+def make_session(captures: int, session_id: str = "claude_session_bench",
+                 seed: int = 42, visible_turns: int = 12) -> List[Dict]:
+    """Build logger-shaped captures for one synthetic session."""
+    rng = random.Random(seed)
+    start = datetime(2025, 11, 1, 9, 0, 0)
+    turns: List[str] = []
+    records = []
+    
+    for number in range(captures):
+        # Most captures add a turn; some only re-render (cursor, scroll)
+        roll = rng.random()
+        if roll < 0.6 or not turns:
+            prefix = "You: " if len(turns) % 2 == 0 else ""
+            turns.append(prefix + '\n'.join(make_paragraph(rng) for _ in range(rng.randint(1, 4))))
+        elif roll < 0.8:
+            turns[-1] += '\n' + make_paragraph(rng)
+        
+        visible = turns[-visible_turns:]
+        raw_text = '\n'.join(SIDEBAR + visible + FOOTER)
+        
+        records.append({
+            'session_id': session_id,
+            'timestamp': (start + timedelta(seconds=5 * number)).isoformat(),
+            'message_number': number,
+            'raw_text': raw_text,
+            'text_hash': hashlib.md5(raw_text.encode()).hexdigest(),
+            'capture_method': 'bulletproof_ui_automation'
+        })
+    
+    return records
+
+
+def write_session(log_file: Path, records: List[Dict]):
+    """Write captures the way the Logger does (one JSON object per line)."""
+    with open(log_file, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=True) + '\n')
+
+
+def report(label: str, count: int, unit: str, seconds: float):
+    rate = count / seconds if seconds > 0 else 0
+    print(f"  {label:<32} {count:>10,} {unit} in {seconds:7.3f}s = {rate:>14,.0f} {unit}/sec")
+
+
+def bench_noise(captures: int = 2000):
+    """Lines/sec of UI-noise filtering: per-pattern loop vs compiled + LRU."""
+    records = make_session(captures)
+    lines = [line.strip() for record in records for line in record['raw_text'].split('\n')]
+    lines = [line for line in lines if line]
+    
+    print(f"\nNOISE FILTER - {captures:,} captures, {len(lines):,} lines")
+    print("=" * 60)
+    
+    # Before: six re.search calls per line
+    start = time.perf_counter()
+    legacy = []
+    for line in lines:
+        noise = False
+        for pattern in DEFAULT_NOISE_PATTERNS:
+            if re.search(pattern, line, re.IGNORECASE):
+                noise = True
+                break
+        legacy.append(noise)
+    report("per-pattern re.search", len(lines), "lines", time.perf_counter() - start)
+    
+    # After: compiled matcher (prefix tuple + substrings), no cache
+    uncached = NoiseFilter(cache_size=0)
+    start = time.perf_counter()
+    combined = [uncached.is_noise(line) for line in lines]
+    report("compiled matcher", len(lines), "lines", time.perf_counter() - start)
+    
+    # After: compiled matcher + LRU
+    cached = NoiseFilter()
+    start = time.perf_counter()
+    memoized = [cached.is_noise(line) for line in lines]
+    report("compiled matcher + LRU", len(lines), "lines", time.perf_counter() - start)
+    
+    assert legacy == combined == memoized, "filters disagree"
+    print(f"  LRU: {cached.cache_info()}")
+
+
+def make_messages(count: int, per_conversation: int = 1000, seed: int = 7) -> List[Dict]:
+    """Build extracted (not raw) messages spread over several conversations."""
+    rng = random.Random(seed)
+    start = datetime(2025, 11, 1, 9, 0, 0)
+    messages = []
+    for number in range(count):
+        content = '\n'.join(make_paragraph(rng) for _ in range(rng.randint(1, 5)))
+        messages.append({
+            'session_id': f"claude_session_{number // per_conversation:05d}",
+            'content': content,
+            'timestamp': (start + timedelta(seconds=5 * number)).isoformat(),
+            'content_hash': hashlib.md5(f"{number}:{content}".encode()).hexdigest()
+        })
+    return messages
+
+
+# The baseline curator's schema: bodies inline, an index over them, no FTS
+BASELINE_SCHEMA = '''
+    CREATE TABLE conversations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT UNIQUE,
+        start_time TEXT, end_time TEXT, message_count INTEGER,
+        total_chars INTEGER, created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, conversation_id INTEGER,
+        message_number INTEGER, role TEXT, content TEXT, timestamp TEXT,
+        content_hash TEXT, tokens_estimate INTEGER,
+        FOREIGN KEY (conversation_id) REFERENCES conversations(id)
+    );
+    CREATE INDEX idx_content ON messages(content);
+    CREATE INDEX idx_timestamp ON messages(timestamp);
+    CREATE INDEX idx_conversation ON messages(conversation_id);
+'''
+BACKFILL_TARGET = 10.0  # speedup over the baseline writer the bulk writer was asked for
+
+
+def baseline_backfill(db_path: Path, pipeline: CapturePipeline, messages: List[Dict]):
+    """
+    The baseline store_conversation, once per conversation: a fresh default
+    connection, one execute per message, one commit.
+    """
+    for session_id, group in groupby(messages, key=lambda msg: msg['session_id']):
+        conversation = list(group)
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT id FROM conversations WHERE session_id = ?', (session_id,))
+        if cursor.fetchone():
+            conn.close()
+            continue
+        
+        cursor.execute('''
+            INSERT INTO conversations (session_id, start_time, end_time, message_count, total_chars)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (session_id, conversation[0]['timestamp'], conversation[-1]['timestamp'], len(conversation),
+              sum(len(msg['content']) for msg in conversation)))
+        conversation_id = cursor.lastrowid
+        
+        prev_content = ""
+        for idx, msg in enumerate(conversation):
+            role = pipeline.detect_message_role(msg['content'], prev_content)
+            tokens = pipeline.estimate_tokens(msg['content'])
+            cursor.execute('''
+                INSERT INTO messages (conversation_id, message_number, role, content,
+                                      timestamp, content_hash, tokens_estimate)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (conversation_id, idx, role, msg['content'], msg['timestamp'], msg['content_hash'], tokens))
+            prev_content = msg['content']
+        
+        conn.commit()
+        conn.close()
+
+
+def writer_backfill(db_path: Path, pipeline: CapturePipeline, messages: List[Dict], batch_size: int = 200):
+    """The CuratorWriter path: prepared rows, executemany, large transactions."""
+    prepared = []
+    prev_content = ""
+    for msg in messages:
+        prepared.append(dict(msg, role=pipeline.detect_message_role(msg['content'], prev_content),
+                             tokens_estimate=pipeline.estimate_tokens(msg['content'])))
+        prev_content = msg['content']
+    
+    with CuratorWriter(db_path) as writer:
+        for start in range(0, len(prepared), batch_size):
+            batch = prepared[start:start + batch_size]
+            writer.append_messages(batch[0]['session_id'], batch)
+            writer.commit_if_due()
+
+
+def bench_backfill(count: int = 100000):
+    """
+    Messages/sec inserted on a backfill: the baseline writer vs CuratorWriter,
+    against the BACKFILL_TARGET speedup. The baseline is also timed without
+    its index over message bodies, to show how much of its cost that was.
+    """
+    messages = make_messages(count)
+    total_mb = sum(len(m['content']) for m in messages) / 1024 / 1024
+    
+    print(f"\nBACKFILL - {count:,} messages ({total_mb:.1f} MB of content)")
+    print("=" * 60)
+    
+    work_dir = Path(tempfile.mkdtemp(prefix="curator_bench_"))
+    try:
+        pipeline = CapturePipeline()
+        results = {}
+        for label, backfill, schema in [
+                ("baseline store_conversation", baseline_backfill, BASELINE_SCHEMA),
+                ("  baseline without idx_content", baseline_backfill,
+                 BASELINE_SCHEMA.replace('CREATE INDEX idx_content ON messages(content);', '')),
+                ("CuratorWriter + blobs, FTS", writer_backfill, None)]:
+            output_dir = work_dir / f"run_{len(results)}"
+            if schema is not None:
+                # The baseline ran on a rollback-journal database
+                output_dir.mkdir()
+                conn = sqlite3.connect(output_dir / "conversations.db")
+                conn.executescript(schema)
+                conn.close()
+            else:
+                with redirect_stdout(io.StringIO()):
+                    ClaudeCurator(str(work_dir), str(output_dir)).close()
+            
+            start = time.perf_counter()
+            backfill(output_dir / "conversations.db", pipeline, messages)
+            results[label] = time.perf_counter() - start
+            report(label, count, "msgs", results[label])
+        
+        before, _, after = results.values()
+        speedup = before / after
+        print(f"  Speedup: {speedup:.1f}x (target {BACKFILL_TARGET:.0f}x: {'met' if speedup >= BACKFILL_TARGET else 'MISSED'})")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_parallel(files: int = 40, captures: int = 500, workers: int = None):
+    """Captures/sec curating many session files: sequential vs --workers N."""
+    workers = workers or os.cpu_count() or 1
+    
+    print(f"\nPARALLEL CURATION - {files} files x {captures:,} captures, {workers} workers")
+    print("=" * 60)
+    
+    work_dir = Path(tempfile.mkdtemp(prefix="curator_bench_"))
+    try:
+        raw_logs = work_dir / "raw_logs"
+        raw_logs.mkdir()
+        for n in range(files):
+            write_session(raw_logs / f"claude_session_{n:04d}.jsonl",
+                          make_session(captures, f"claude_session_{n:04d}", seed=n))
+        
+        results = {}
+        tables = {}
+        for run, (label, count) in enumerate([("sequential", 1), (f"--workers {workers}", workers)]):
+            log = io.StringIO()
+            with redirect_stdout(log):
+                curator = ClaudeCurator(str(raw_logs), str(work_dir / f"processed_{run}"))
+                start = time.perf_counter()
+                curator.process_all_logs(count)
+            results[label] = time.perf_counter() - start
+            report(label, files * captures, "captures", results[label])
+            
+            # Per-stage lines from the parallel report
+            for line in log.getvalue().splitlines():
+                if line.startswith((" Extract", " Write", " Writer")):
+                    print(f"    {line.strip()}")
+            
+            tables[label] = curator.writer.conn.execute(
+                'SELECT conversation_id, message_number, content_hash FROM messages ORDER BY id'
+            ).fetchall()
+            curator.close()
+        
+        before, after = results.values()
+        print(f"  Speedup: {before / after:.1f}x")
+        assert len(set(map(tuple, tables.values()))) == 1, "parallel output differs from sequential"
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_segment(captures: int = 2000):
+    """Stored size, insert time and search duplication: whole snapshots vs turns."""
+    records = make_session(captures)
+    pipeline = CapturePipeline()
+    
+    # Before: every capture's filtered snapshot stored as a message
+    snapshots = []
+    prev_content = ""
+    for record in pipeline.iter_unique_captures(records):
+        content = pipeline.extract_conversation_content(record['raw_text'])
+        if content and len(content) > 50:
+            snapshots.append({'content': content, 'timestamp': record['timestamp'],
+                              'content_hash': record['text_hash'],
+                              'role': pipeline.detect_message_role(content, prev_content),
+                              'tokens_estimate': pipeline.estimate_tokens(content)})
+            prev_content = content
+    
+    # After: only the newly appeared text of each capture
+    turns = list(pipeline.iter_extracted_messages(pipeline.iter_unique_captures(records)))
+    
+    # A paragraph from early in the session, visible in many snapshots
+    probe = turns[1]['content'].split('\n')[0]
+    
+    print(f"\nSEGMENTATION - {captures:,} captures")
+    print("=" * 60)
+    
+    work_dir = Path(tempfile.mkdtemp(prefix="curator_bench_"))
+    try:
+        for label, rows in [("whole snapshots", snapshots), ("segmented turns", turns)]:
+            with redirect_stdout(io.StringIO()):
+                curator = ClaudeCurator(str(work_dir), str(work_dir / label.replace(' ', '_')))
+            
+            start = time.perf_counter()
+            for batch in batched(rows, curator.batch_size):
+                curator.writer.append_messages("claude_session_bench", batch)
+            curator.writer.commit()
+            elapsed = time.perf_counter() - start
+            
+            hits = curator.writer.conn.execute(
+                'SELECT COUNT(*) FROM blobs_fts JOIN messages m ON m.blob_id = blobs_fts.rowid '
+                'WHERE blobs_fts MATCH ?', (fts_query(probe),)
+            ).fetchone()[0]
+            curator.writer.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            curator.close()
+            
+            chars = sum(len(row['content']) for row in rows)
+            size_mb = curator.db_path.stat().st_size / 1024 / 1024
+            report(label, len(rows), "msgs", elapsed)
+            print(f"    {chars:,} characters, database {size_mb:.2f} MB, "
+                  f"{hits} search hits for one early paragraph")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_compressed(captures: int = 5000):
+    """Captures/sec through decode -> extract -> segment: raw log vs compressed log."""
+    print(f"\nCOMPRESSED INPUT - {captures:,} captures")
+    print("=" * 60)
+    
+    work_dir = Path(tempfile.mkdtemp(prefix="curator_bench_"))
+    try:
+        raw_file = work_dir / "claude_session_bench.jsonl"
+        write_session(raw_file, make_session(captures))
+        with redirect_stdout(io.StringIO()):
+            compressed_file = DeltaCompressor(str(work_dir), str(work_dir)).compress_log_file(raw_file)
+        
+        mb = {path: path.stat().st_size / 1024 / 1024 for path in (raw_file, compressed_file)}
+        print(f"  raw {mb[raw_file]:.1f} MB, compressed {mb[compressed_file]:.1f} MB")
+        
+        outputs = []
+        for label, log_file, raw_text in [
+            ("raw log", raw_file, True),
+            ("compressed, full reconstruction", compressed_file, True),
+            ("compressed, delta-aware", compressed_file, False),
+        ]:
+            pipeline = CapturePipeline()  # cold noise cache each run
+            progress = pipeline.new_progress()
+            start = time.perf_counter()
+            captures_iter = pipeline.iter_captures(log_file, progress, raw_text)
+            messages = list(pipeline.iter_extracted_messages(pipeline.iter_unique_captures(captures_iter), progress))
+            report(label, progress['captures'], "captures", time.perf_counter() - start)
+            outputs.append([m['content'] for m in messages])
+        
+        assert outputs[0] == outputs[1] == outputs[2], "compressed input curates differently"
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def add_flicker(records: List[Dict], seed: int = 5) -> List[Dict]:
+    """
+    Interleave re-render captures that differ only by a ticking relative
+    timestamp under the title bar - a new text_hash, no new conversation.
+    """
+    rng = random.Random(seed)
+    flickering = []
+    for record in records:
+        for tick in range(rng.choice([0, 1, 1, 2, 3])):
+            lines = record['raw_text'].split('\n')
+            lines.insert(len(SIDEBAR), f"Last edited {tick + 1} minutes ago")
+            raw_text = '\n'.join(lines)
+            flickering.append(dict(record, raw_text=raw_text,
+                                   text_hash=hashlib.md5(raw_text.encode()).hexdigest()))
+        flickering.append(record)
+    for number, record in enumerate(flickering):
+        record['message_number'] = number
+    return flickering
+
+
+def bench_neardup(captures: int = 2000):
+    """Rows/bytes written and captures/sec with near-duplicate detection off vs on."""
+    records = add_flicker(make_session(captures))
+    # The Logger restarted: a second session opens on the window the first
+    # ended on and follows the same conversation from there
+    restart = make_session(captures + captures // 10, "claude_session_restart")[captures - 1:]
+    
+    print(f"\nNEAR-DUPLICATES - {len(records) + len(restart):,} captures "
+          f"({len(records) - captures:,} flicker re-renders, one restarted session)")
+    print("=" * 60)
+    
+    pipeline = CapturePipeline()
+    snapshots = [pipeline.noise_filter.filter_lines(r['raw_text'].split('\n')) for r in records]
+    start = time.perf_counter()
+    for lines in snapshots:
+        snapshot_fingerprint(lines)
+    report("fingerprint snapshots", len(snapshots), "snapshots", time.perf_counter() - start)
+    
+    work_dir = Path(tempfile.mkdtemp(prefix="curator_bench_"))
+    try:
+        raw_logs = work_dir / "raw_logs"
+        raw_logs.mkdir()
+        write_session(raw_logs / "claude_session_bench.jsonl", records)
+        write_session(raw_logs / "claude_session_restart.jsonl", restart)
+        
+        for label, threshold in [("detection off", 0), ("detection on (0.9)", 0.9)]:
+            log = io.StringIO()
+            with redirect_stdout(log):
+                curator = ClaudeCurator(str(raw_logs), str(work_dir / label.split()[1]),
+                                        near_duplicate_threshold=threshold)
+                start = time.perf_counter()
+                curator.process_all_logs()
+            elapsed = time.perf_counter() - start
+            
+            rows, chars = curator.writer.conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(length(b.content)), 0) FROM messages m JOIN blobs b ON b.id = m.blob_id'
+            ).fetchone()
+            curator.close()
+            
+            report(label, len(records) + len(restart), "captures", elapsed)
+            print(f"    {rows:,} rows, {chars:,} characters stored")
+            for line in log.getvalue().splitlines():
+                if line.startswith(" Near-duplicates"):
+                    print(f"    {line.strip()}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_bodies(count: int = 50000, lookups: int = 200):
+    """Database size, insert rate and get_conversation latency per body storage mode."""
+    messages = make_messages(count, per_conversation=500)
+    pipeline = CapturePipeline()
+    prepared = []
+    prev_content = ""
+    for msg in messages:
+        prepared.append(dict(msg, role=pipeline.detect_message_role(msg['content'], prev_content),
+                             tokens_estimate=pipeline.estimate_tokens(msg['content'])))
+        prev_content = msg['content']
+    sessions = sorted({msg['session_id'] for msg in messages})
+    rng = random.Random(1)
+    
+    total_mb = sum(len(m['content']) for m in messages) / 1024 / 1024
+    print(f"\nBODY STORAGE - {count:,} messages ({total_mb:.1f} MB of content)")
+    print("=" * 60)
+    
+    work_dir = Path(tempfile.mkdtemp(prefix="curator_bench_"))
+    try:
+        for label, compression, trained in [("plain text", 'none', False),
+                                            ("zlib, boilerplate dictionary", 'zlib', False),
+                                            ("zlib, trained dictionary", 'zlib', True),
+                                            ("lzma", 'lzma', False)]:
+            output_dir = work_dir / label.replace(' ', '_').replace(',', '')
+            with redirect_stdout(io.StringIO()):
+                curator = ClaudeCurator(str(work_dir), str(output_dir), body_compression=compression)
+            if trained:
+                # As if `train-dictionary` had run on an earlier slice of the history
+                sample = [msg['content'] for msg in rng.sample(messages, min(2000, count))]
+                curator.writer.conn.execute('INSERT INTO body_dictionaries (dictionary) VALUES (?)',
+                                            (train_dictionary(sample),))
+                curator.writer.bodies.prepare()
+            
+            writer = curator.writer
+            start = time.perf_counter()
+            for batch in batched(prepared, curator.batch_size):
+                writer.append_messages(batch[0]['session_id'], batch)
+                writer.commit_if_due()
+            writer.commit()
+            report(label, count, "msgs", time.perf_counter() - start)
+            
+            writer.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            curator.close()
+            size_mb = curator.db_path.stat().st_size / 1024 / 1024
+            
+            librarian = LibrarianQuery(str(curator.db_path))
+            start = time.perf_counter()
+            for _ in range(lookups):
+                librarian.get_conversation(rng.choice(sessions), max_messages=50)
+            latency_ms = (time.perf_counter() - start) / lookups * 1000
+            start = time.perf_counter()
+            for _ in range(lookups // 10):
+                librarian.search(rng.choice(WORDS), limit=10)
+            search_ms = (time.perf_counter() - start) / (lookups // 10) * 1000
+            print(f"    database {size_mb:.2f} MB, get_conversation {latency_ms:.2f} ms, "
+                  f"search {search_ms:.2f} ms")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# What show_summary / get_stats ran before the counter tables
+SCAN_STATS_SQL = [
+    'SELECT COUNT(*) FROM conversations',
+    'SELECT COUNT(*) FROM messages',
+    'SELECT SUM(total_chars) FROM conversations',
+    'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs',
+    'SELECT role, COUNT(*) FROM messages GROUP BY role',
+]
+
+
+def bench_stats(count: int = 100000, lookups: int = 20):
+    """Stats latency: scanning the archive vs reading the trigger-kept counters, and the insert cost."""
+    messages = make_messages(count)
+    
+    print(f"\nSTATS - {count:,} messages")
+    print("=" * 60)
+    
+    work_dir = Path(tempfile.mkdtemp(prefix="curator_bench_"))
+    try:
+        pipeline = CapturePipeline()
+        for label, counters in [("without counter triggers", False), ("with counter triggers", True)]:
+            output_dir = work_dir / label.replace(' ', '_')
+            ClaudeCurator(str(work_dir), str(output_dir)).close()
+            db_path = output_dir / "conversations.db"
+            if not counters:
+                conn = sqlite3.connect(db_path)
+                for (trigger,) in conn.execute(
+                        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'stats_%'").fetchall():
+                    conn.execute(f'DROP TRIGGER {trigger}')
+                conn.close()
+            
+            start = time.perf_counter()
+            writer_backfill(db_path, pipeline, messages)
+            report(f"insert, {label}", count, "msgs", time.perf_counter() - start)
+        
+        conn = sqlite3.connect(db_path)
+        start = time.perf_counter()
+        for _ in range(lookups):
+            for sql in SCAN_STATS_SQL:
+                conn.execute(sql).fetchall()
+        scan_ms = (time.perf_counter() - start) / lookups * 1000
+        
+        start = time.perf_counter()
+        for _ in range(lookups):
+            read_stats(conn)
+            read_daily_stats(conn)
+        counter_ms = (time.perf_counter() - start) / lookups * 1000
+        conn.close()
+        
+        print(f"  Stats by scanning the archive: {scan_ms:8.3f} ms")
+        print(f"  Stats from counter tables:     {counter_ms:8.3f} ms")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_shards(count: int = 60000, months: int = 6, lookups: int = 40):
+    """One database vs closed months archived into shards: query latency and live-database VACUUM."""
+    messages = make_messages(count, per_conversation=500)
+    first_ms = month_bounds("2025-05")[0]
+    span_ms = months * 30 * 86400000
+    pipeline = CapturePipeline()
+    prepared = []
+    prev_content = ""
+    for number, msg in enumerate(messages):
+        moment = datetime.fromtimestamp((first_ms + span_ms * number // count) / 1000)
+        prepared.append(dict(msg, timestamp=moment.isoformat(),
+                             role=pipeline.detect_message_role(msg['content'], prev_content),
+                             tokens_estimate=pipeline.estimate_tokens(msg['content'])))
+        prev_content = msg['content']
+    last_month = prepared[-1]['timestamp'][:7]
+    rng = random.Random(3)
+    
+    print(f"\nSHARDS - {count:,} messages over {months} months")
+    print("=" * 60)
+    
+    work_dir = Path(tempfile.mkdtemp(prefix="curator_bench_"))
+    try:
+        with redirect_stdout(io.StringIO()):
+            curator = ClaudeCurator(str(work_dir), str(work_dir / "processed"), near_duplicate_threshold=0)
+        writer = curator.writer
+        for batch in batched(prepared, curator.batch_size):
+            writer.append_messages(batch[0]['session_id'], batch)
+            writer.commit_if_due()
+        writer.commit()
+        
+        def measure(label: str):
+            librarian = LibrarianQuery(str(curator.db_path))
+            start = time.perf_counter()
+            for _ in range(lookups):
+                librarian.search(rng.choice(WORDS), limit=10)
+            search_ms = (time.perf_counter() - start) / lookups * 1000
+            start = time.perf_counter()
+            for _ in range(lookups):
+                librarian.search_by_date(after_date=f"{last_month}-01", limit=10)
+            date_ms = (time.perf_counter() - start) / lookups * 1000
+            start = time.perf_counter()
+            writer.conn.execute('VACUUM')
+            vacuum_ms = (time.perf_counter() - start) * 1000
+            size_mb = curator.db_path.stat().st_size / 1024 / 1024
+            print(f"  {label:<28} search {search_ms:7.2f} ms, last month by date {date_ms:6.2f} ms, "
+                  f"live VACUUM {vacuum_ms:8.1f} ms ({size_mb:.1f} MB)")
+        
+        measure("one database")
+        with redirect_stdout(io.StringIO()):
+            cutoff_ms = month_bounds(last_month)[0] + 15 * 86400000
+            archived = curator.archive_shards(int((time.time() * 1000 - cutoff_ms) // 86400000))
+        measure(f"live + {len(archived)} shards")
+        curator.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_export(count: int = 100000, workers: int = None):
+    """Export MB/s: per-conversation JSON files vs the streaming formats, and bulk import."""
+    messages = make_messages(count, per_conversation=100)
+    workers = workers or os.cpu_count() or 1
+    
+    print(f"\nEXPORT - {count:,} messages")
+    print("=" * 60)
+    
+    work_dir = Path(tempfile.mkdtemp(prefix="curator_bench_"))
+    try:
+        with redirect_stdout(io.StringIO()):
+            curator = ClaudeCurator(str(work_dir), str(work_dir / "processed"), near_duplicate_threshold=0)
+        writer_backfill(curator.db_path, CapturePipeline(), messages)
+        sessions = sorted({msg['session_id'] for msg in messages})
+        
+        json_dir = work_dir / "json"
+        json_dir.mkdir()
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            for session_id in sessions:
+                curator.export_conversation_to_json(session_id, json_dir / f"{session_id}.json")
+        seconds = time.perf_counter() - start
+        size_mb = sum(f.stat().st_size for f in json_dir.iterdir()) / 1024 / 1024
+        print(f"  {'JSON per conversation':<28} {size_mb:7.1f} MB in {seconds:6.2f}s ({size_mb / seconds:6.1f} MB/s)")
+        
+        runs = [('ndjson', False, 1), ('binary', False, 1), ('binary', True, 1)]
+        if workers > 1:
+            runs.append(('binary', True, workers))
+        for fmt, compress, jobs in runs:
+            output = work_dir / f"export.{fmt}"
+            totals = export_archive(curator.db_path, output, fmt, compress, workers=jobs)
+            size_mb = totals['bytes'] / 1024 / 1024
+            label = f"{fmt}{' + zlib' if compress else ''}, {jobs} worker{'s' if jobs > 1 else ''}"
+            print(f"  {label:<28} {size_mb:7.1f} MB in {totals['seconds']:6.2f}s "
+                  f"({size_mb / totals['seconds']:6.1f} MB/s)")
+        
+        with redirect_stdout(io.StringIO()):
+            target = ClaudeCurator(str(work_dir), str(work_dir / "imported"))
+        totals = import_archive(output, target.writer)
+        report("import (binary + zlib)", totals['stored'], "msgs", totals['seconds'])
+        target.close()
+        curator.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_reader(captures: int = 30000):
+    """Reading a multi-hundred-MB session log: file-object line loops vs the mmap reader."""
+    work_dir = Path(tempfile.mkdtemp(prefix="curator_bench_"))
+    log_file = work_dir / "claude_session_bench.jsonl"
+    write_session(log_file, make_session(captures))
+    size = log_file.stat().st_size
+    with open(log_file, 'rb') as f:
+        f.seek(size // 2)
+        f.readline()
+        middle = f.tell()  # first line boundary past the middle
+    
+    print(f"\nREADER - {captures:,} captures, {size / 1024 / 1024:.0f} MB")
+    print("=" * 60)
+    
+    def text_mode(decode: bool):
+        with open(log_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    json.loads(line) if decode else len(line)
+    
+    def binary_mode(decode: bool):
+        with open(log_file, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    json.loads(line) if decode else len(line.decode('utf-8'))
+    
+    def mapped(decode: bool, offset: int = 0):
+        reader = JsonlReader(log_file, offset, complete_only=offset > 0, codec=JsonCodec())
+        if decode:
+            for _ in reader.records():
+                pass
+        else:
+            for line in reader.lines():
+                len(str(line, 'utf-8'))
+    
+    def best_of_three(read, decode: bool) -> float:
+        seconds = float('inf')
+        for _ in range(3):  # the log is in the page cache after the first pass
+            start = time.perf_counter()
+            read(decode)
+            seconds = min(seconds, time.perf_counter() - start)
+        return seconds
+    
+    try:
+        print(f"  {'':<30} {'lines to str':>12} {'+ json decode':>14}")
+        for label, read, read_bytes in [
+                ("text-mode file (compressor)", text_mode, size),
+                ("binary file (curator)", binary_mode, size),
+                ("JsonlReader", mapped, size),
+                ("JsonlReader from mid-file", lambda decode: mapped(decode, middle), size - middle)]:
+            lines_s, decode_s = best_of_three(read, False), best_of_three(read, True)
+            print(f"  {label:<30} {lines_s:11.3f}s {decode_s:13.3f}s "
+                  f"({read_bytes / 1024 / 1024 / decode_s:6.1f} MB/s)")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_codec(captures: int = 10000):
+    """JSON codecs on capture-shaped records: raw Logger lines and compressor delta lines."""
+    work_dir = Path(tempfile.mkdtemp(prefix="curator_bench_"))
+    raw_file = work_dir / "claude_session_bench.jsonl"
+    write_session(raw_file, make_session(captures))
+    with redirect_stdout(io.StringIO()):
+        compressed_file = DeltaCompressor(str(work_dir), str(work_dir / "compressed")).compress_log_file(raw_file)
+    
+    codecs = [JsonCodec()] + ([OrjsonCodec()] if orjson is not None else [])
+    print(f"\nCODEC - {captures:,} captures ({', '.join(codec.name for codec in codecs)})")
+    print("=" * 60)
+    if orjson is None:
+        print("  orjson not installed - stdlib only")
+    
+    def best_of_three(run) -> float:
+        seconds = float('inf')
+        for _ in range(3):
+            start = time.perf_counter()
+            run()
+            seconds = min(seconds, time.perf_counter() - start)
+        return seconds
+    
+    def per_line_json():
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                json.loads(line)
+    
+    try:
+        for label, path in [("raw log", raw_file), ("compressed log", compressed_file)]:
+            records = list(JsonlReader(path).records())
+            size_mb = path.stat().st_size / 1024 / 1024
+            print(f"  {label}: {len(records):,} lines, {size_mb:.1f} MB")
+            
+            runs = [("decode, json per line (before)", per_line_json),
+                    ("encode, json.dumps per line (before)",
+                     lambda: [json.dumps(record, ensure_ascii=True) + '\n' for record in records])]
+            for codec in codecs:
+                runs.append((f"decode, {codec.name} via JsonlReader",
+                             lambda codec=codec: sum(1 for _ in JsonlReader(path, codec=codec).records())))
+                runs.append((f"encode, {codec.name}.dumps_lines",
+                             lambda codec=codec: codec.dumps_lines(records)))
+            for name, run in sorted(runs, key=lambda item: item[0].split(',')[0]):
+                seconds = best_of_three(run)
+                print(f"    {name:<36} {seconds:7.3f}s ({size_mb / seconds:7.1f} MB/s)")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_watch(captures: int = 300, interval_ms: int = 50):
+    """Watch mode against a Logger appending captures: capture-to-searchable latency."""
+    work_dir = Path(tempfile.mkdtemp(prefix="curator_bench_"))
+    raw_logs = work_dir / "raw_logs"
+    raw_logs.mkdir()
+    log_file = raw_logs / "claude_session_bench.jsonl"
+    backlog = make_session(captures * 10)
+    write_session(log_file, backlog[:captures * 9])  # already on disk when the watch starts
+    
+    print(f"\nWATCH - {captures:,} captures appended every {interval_ms}ms "
+          f"after a {captures * 9:,}-capture backlog")
+    print("=" * 60)
+    
+    def logger():
+        time.sleep(0.5)
+        for record in backlog[captures * 9:]:
+            record['timestamp'] = datetime.now().isoformat()
+            with open(log_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=True) + '\n')
+            time.sleep(interval_ms / 1000)
+    
+    try:
+        curator = ClaudeCurator(str(raw_logs), str(work_dir / "processed"))
+        appender = threading.Thread(target=logger)
+        appender.start()
+        polls = int((0.5 + captures * interval_ms / 1000 + 2) / WATCH_POLL_INTERVAL)
+        with redirect_stdout(io.StringIO()):
+            totals = curator.watch(max_polls=polls)
+        appender.join()
+        curator.close()
+        
+        latency = totals['latency']
+        print(f"  polls every {WATCH_POLL_INTERVAL:g}s: {totals['polls']}, "
+              f"messages stored: {totals['messages']:,} ({latency['count']:,} captured live)")
+        if latency['count']:
+            print(f"  capture-to-searchable: p50 {latency['p50']:.2f}s, p95 {latency['p95']:.2f}s, "
+                  f"max {latency['max']:.2f}s (target {WATCH_LATENCY_TARGET:g}s)")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_migrate(count: int = 100000):
+    """Rebuilding the FTS index of a populated database: one statement vs the batched migration."""
+    messages = make_messages(count)
+    work_dir = Path(tempfile.mkdtemp(prefix="curator_bench_"))
+    
+    print(f"\nMIGRATE - rebuild blobs_fts over {count:,} messages")
+    print("=" * 60)
+    
+    def concurrent_load(db_path: Path, stop: threading.Event, waits: Dict):
+        """A writer committing small transactions and a reader querying, as the watch daemon and query tools do."""
+        writer = sqlite3.connect(db_path, timeout=600, isolation_level=None)
+        reader = sqlite3.connect(db_path)
+        while not stop.is_set():
+            start = time.perf_counter()
+            writer.execute('BEGIN IMMEDIATE')
+            writer.execute('INSERT INTO bench_writes DEFAULT VALUES')
+            writer.execute('COMMIT')
+            waits['write'] = max(waits['write'], time.perf_counter() - start)
+            
+            start = time.perf_counter()
+            reader.execute('SELECT COUNT(*) FROM messages WHERE timestamp_ms > 0').fetchone()
+            waits['read'] = max(waits['read'], time.perf_counter() - start)
+            time.sleep(0.1)
+        writer.close()
+        reader.close()
+    
+    try:
+        output_dir = work_dir / "processed"
+        ClaudeCurator(str(work_dir), str(output_dir)).close()
+        db_path = output_dir / "conversations.db"
+        writer_backfill(db_path, CapturePipeline(), messages)
+        
+        fts_migration = [migration for migration in MIGRATIONS if migration.name == 'blob full-text index']
+        for label, batched in [("one statement (before)", False), ("batched migration", True)]:
+            with redirect_stdout(io.StringIO()):
+                writer = ClaudeCurator(str(work_dir), str(output_dir)).writer
+            conn = writer.conn
+            conn.executescript('''
+                DROP TRIGGER blobs_fts_insert;
+                DROP TRIGGER blobs_fts_delete;
+                DROP TABLE blobs_fts;
+                CREATE TABLE IF NOT EXISTS bench_writes (id INTEGER PRIMARY KEY);
+            ''')
+            conn.execute('DELETE FROM schema_migrations WHERE version = ?', (fts_migration[0].version,))
+            conn.commit()
+            
+            waits = {'write': 0.0, 'read': 0.0}
+            stop = threading.Event()
+            load = threading.Thread(target=concurrent_load, args=(db_path, stop, waits))
+            load.start()
+            time.sleep(0.2)
+            
+            start = time.perf_counter()
+            try:
+                if batched:
+                    with redirect_stdout(io.StringIO()):
+                        Migrator(conn, fts_migration).migrate()
+                else:
+                    conn.execute('BEGIN IMMEDIATE')
+                    fts_migration[0].steps[0](conn)  # same DDL, then one 'rebuild'
+                    conn.execute("INSERT INTO blobs_fts(blobs_fts) VALUES ('rebuild')")
+                    conn.commit()
+                seconds = time.perf_counter() - start
+            finally:
+                stop.set()
+                load.join()
+                writer.close()
+            
+            print(f"  {label:<24} {seconds:7.2f}s   longest concurrent write wait {waits['write']:6.3f}s, "
+                  f"read {waits['read']:6.3f}s")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    
+    command = sys.argv[1]
+    args = [int(a) for a in sys.argv[2:]]
+    
+    if command == "noise":
+        bench_noise(*args)
+    elif command == "backfill":
+        bench_backfill(*args)
+    elif command == "parallel":
+        bench_parallel(*args)
+    elif command == "segment":
+        bench_segment(*args)
+    elif command == "compressed":
+        bench_compressed(*args)
+    elif command == "neardup":
+        bench_neardup(*args)
+    elif command == "bodies":
+        bench_bodies(*args)
+    elif command == "stats":
+        bench_stats(*args)
+    elif command == "shards":
+        bench_shards(*args)
+    elif command == "export":
+        bench_export(*args)
+    elif command == "reader":
+        bench_reader(*args)
+    elif command == "codec":
+        bench_codec(*args)
+    elif command == "watch":
+        bench_watch(*args)
+    elif command == "migrate":
+        bench_migrate(*args)
+    else:
+        print(f"Unknown benchmark: {command}")
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main()
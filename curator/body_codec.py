@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Body Codec - optional compressed storage of message bodies
+
+blobs.content holds either plain TEXT (the default, and always for bodies
+that would not shrink) or a BLOB: one codec tag byte followed by the
+compressed body.
+
+- zlib: raw deflate with a preset dictionary. Turns are short, so most of
+  their redundancy is with other turns rather than within themselves; the
+  dictionary (trained from UI boilerplate that survives the noise filter
+  plus lines and words that recur across stored bodies) gives deflate
+  something to back-reference from the first byte. Dictionaries are kept
+  in body_dictionaries and referenced by id from every body, so a
+  retrained dictionary never orphans older rows.
+- lzma: raw LZMA2, no dictionary (Python's lzma has no preset-dictionary
+  support). Better on long bodies, worse on short ones.
+
+Readers decode lazily - only rows actually returned - with
+BodyCodec.decode(), and SQL that needs the text (the FTS index, which
+reads it through the blob_text view) calls body_text(), registered on
+the connection by BodyCodec.register().
+"""
+
+import lzma
+import sqlite3
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, Optional, Union
+
+
+BODY_COMPRESSIONS = ('none', 'zlib', 'lzma')
+
+DICTIONARY_SIZE = 32768        # zlib's window: larger dictionaries are truncated
+DICTIONARY_SAMPLE_BODIES = 2000  # stored bodies sampled when training
+ZLIB_LEVEL = 6
+
+_TAG_ZLIB = 1
+_TAG_LZMA = 2
+_LZMA_FILTERS = [{'id': lzma.FILTER_LZMA2, 'preset': 6, 'dict_size': 1 << 16}]  # bodies are small
+
+# Claude Desktop text that survives the noise filter and recurs in bodies
+UI_BOILERPLATE = [
+    "Recents", "Reply to Claude...", "You: ", "Copy", "Retry", "Edit",
+    "Thought process", "Searched the web", "Request {", "Response", "```",
+    "```python", "```bash", "```json", "Claude can make mistakes. Please double-check responses.",
+    "Let me ", "Here's ", "I'll ", "The ", " the ", " and ", " to ", " of ", " in ",
+]
+BOILERPLATE_WEIGHT = 1000  # counted as if seen this often in the samples
+
+
+def train_dictionary(samples: Iterable[str], size: int = DICTIONARY_SIZE) -> bytes:
+    """
+    Build a zlib preset dictionary from sample bodies: UI boilerplate plus
+    the lines, then words, that recur across samples. Most frequent last,
+    since deflate reaches the end of the dictionary with the shortest
+    distances.
+    """
+    lines = Counter()
+    words = Counter()
+    for text in samples:
+        for line in set(text.split('\n')):
+            if len(line) > 3:
+                lines[line] += 1
+        words.update(set(text.split()))
+    for phrase in UI_BOILERPLATE:
+        lines[phrase] += BOILERPLATE_WEIGHT
+    
+    chosen = []
+    used = 0
+    candidates = [(count, line + '\n') for line, count in lines.items() if count > 1]
+    candidates += [(count, word + ' ') for word, count in words.items() if count > 1 and len(word) > 2]
+    for count, piece in sorted(candidates, key=lambda item: -item[0]):
+        encoded = piece.encode('utf-8')
+        if used + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        used += len(encoded)
+    
+    return b''.join(reversed(chosen))
+
+
+class BodyCodec:
+    """
+    Encodes bodies for blobs.content and decodes stored values.
+    
+    compression picks the encoding for new bodies ('none', 'zlib' or
+    'lzma'); decoding handles every encoding regardless. Dictionaries are
+    read from the connection's database the first time a body needs one.
+    """
+    
+    def __init__(self, conn: sqlite3.Connection, compression: str = 'none'):
+        if compression not in BODY_COMPRESSIONS:
+            raise ValueError(f"Unknown body compression: {compression} (expected one of {BODY_COMPRESSIONS})")
+        
+        self.conn = conn
+        self.compression = compression
+        self.dictionaries: Dict[int, bytes] = {}
+        self.dictionary_id: Optional[int] = None
+    
+    def register(self):
+        """Make body_text(content) available to SQL on this connection."""
+        self.conn.create_function('body_text', 1, self.decode, deterministic=True)
+    
+    def prepare(self, train_from: Optional[Iterable[str]] = None):
+        """
+        Pick the dictionary new zlib bodies use: the newest stored one, or
+        one trained now (from train_from, if given) and stored.
+        """
+        if self.compression != 'zlib':
+            return
+        
+        row = self.conn.execute('SELECT id, dictionary FROM body_dictionaries ORDER BY id DESC LIMIT 1').fetchone()
+        if row is None:
+            dictionary = train_dictionary(train_from or [])
+            cursor = self.conn.execute('INSERT INTO body_dictionaries (dictionary) VALUES (?)', (dictionary,))
+            row = (cursor.lastrowid, dictionary)
+        
+        self.dictionary_id, self.dictionaries[row[0]] = row[0], row[1]
+    
+    def dictionary(self, dictionary_id: int) -> bytes:
+        if dictionary_id not in self.dictionaries:
+            row = self.conn.execute('SELECT dictionary FROM body_dictionaries WHERE id = ?',
+                                    (dictionary_id,)).fetchone()
+            if row is None:
+                raise ValueError(f"Body dictionary {dictionary_id} is missing")
+            self.dictionaries[dictionary_id] = row[0]
+        return self.dictionaries[dictionary_id]
+    
+    def encode(self, text: str) -> Union[str, bytes]:
+        """Value to store for a body: compressed bytes, or the text if that is no larger."""
+        if self.compression == 'none':
+            return text
+        
+        raw = text.encode('utf-8')
+        if self.compression == 'zlib':
+            dictionary_id = self.dictionary_id
+            compressor = zlib.compressobj(ZLIB_LEVEL, zlib.DEFLATED, -15, 9,
+                                          zdict=self.dictionary(dictionary_id))
+            packed = (bytes([_TAG_ZLIB]) + dictionary_id.to_bytes(2, 'big')
+                      + compressor.compress(raw) + compressor.flush())
+        else:
+            packed = bytes([_TAG_LZMA]) + lzma.compress(raw, format=lzma.FORMAT_RAW, filters=_LZMA_FILTERS)
+        
+        return packed if len(packed) < len(raw) else text
+    
+    def decode(self, value: Union[str, bytes, None]) -> Optional[str]:
+        """Text of a stored body (plain TEXT passes straight through)."""
+        if value is None or isinstance(value, str):
+            return value
+        
+        tag = value[0]
+        if tag == _TAG_ZLIB:
+            dictionary_id = int.from_bytes(value[1:3], 'big')
+            decompressor = zlib.decompressobj(-15, zdict=self.dictionary(dictionary_id))
+            raw = decompressor.decompress(value[3:]) + decompressor.flush()
+        elif tag == _TAG_LZMA:
+            raw = lzma.decompress(value[1:], format=lzma.FORMAT_RAW, filters=_LZMA_FILTERS)
+        else:
+            raise ValueError(f"Unknown body encoding tag: {tag}")
+        
+        return raw.decode('utf-8')
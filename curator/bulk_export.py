@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bulk Export - streaming dumps of the whole archive, and loading them back
+
+An export is a stream of records: each conversation's header followed by
+its messages in order. Nothing is held per conversation - conversations
+are walked on the covering start-time index and each one's messages on
+its covering order index, one cursor row at a time - so memory stays
+flat however large the archive or a conversation is.
+
+Formats:
+
+- ndjson: one JSON object per line, {"type": "conversation", ...} or
+  {"type": "message", "session_id": ..., ...}.
+- binary: MAGIC, a version byte and a flags byte, then records. A record
+  is a 4-byte big-endian length and a payload: a kind byte followed by
+  its fields, integers as (zigzag) varints and strings as varint length
+  + UTF-8, each offset by one so that 0 means null. Messages carry no
+  session id; they belong to the conversation record before them. With
+  FLAG_ZLIB the records are grouped into independently deflated frames
+  (4-byte length + zlib stream) of about FRAME_BYTES each.
+
+Work is split into units - runs of up to UNIT_CONVERSATIONS conversations
+of one database (the live one or a shard) - each written to its own
+part file, by a process pool when workers > 1, and the parts are joined
+in order, so a parallel export is byte-identical to a sequential one.
+
+Records hold what import needs to rebuild a database: content hashes
+(dedupe on re-import) and SimHash fingerprints (near-duplicate lookups
+later on) travel with the bodies, which are exported decoded.
+"""
+
+import shutil
+import sqlite3
+import struct
+import tempfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+from curator.body_codec import BodyCodec
+from curator.json_codec import JsonCodec, get_codec
+from curator.jsonl_reader import JsonlReader
+from curator.near_duplicates import from_signed
+from curator.shards import ShardCatalog, shard_uri
+
+
+EXPORT_FORMATS = ('ndjson', 'binary')
+
+MAGIC = b'AILX'
+VERSION = 1
+FLAG_ZLIB = 1
+
+KIND_CONVERSATION = 1
+KIND_MESSAGE = 2
+
+FRAME_BYTES = 256 * 1024    # raw record bytes per zlib frame
+UNIT_CONVERSATIONS = 200    # conversations per export unit (parallel grain)
+UNITS_AHEAD_PER_WORKER = 2  # units exported ahead of the one being joined
+ZLIB_LEVEL = 1              # favour throughput over the last bytes of ratio
+
+CONVERSATION_FIELDS = ('session_id', 'start_time', 'end_time', 'message_count', 'total_chars')
+MESSAGE_FIELDS = ('message_number', 'role', 'timestamp', 'tokens_estimate', 'content_hash', 'simhash', 'content')
+_STRING_FIELDS = {'session_id', 'start_time', 'end_time', 'role', 'timestamp', 'content_hash', 'content'}
+
+_LENGTH = struct.Struct('>I')
+
+
+# ----------------------------------------------------------------------
+# Binary record encoding
+# ----------------------------------------------------------------------
+
+def _put_varint(out: bytearray, value: int):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _get_varint(data: bytes, pos: int) -> tuple:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_binary(record: Dict) -> bytes:
+    """A record as length + payload."""
+    is_message = record['type'] == 'message'
+    payload = bytearray([KIND_MESSAGE if is_message else KIND_CONVERSATION])
+    for field in (MESSAGE_FIELDS if is_message else CONVERSATION_FIELDS):
+        value = record[field]
+        if value is None:
+            payload.append(0)
+        elif field in _STRING_FIELDS:
+            raw = value.encode('utf-8')
+            _put_varint(payload, len(raw) + 1)
+            payload += raw
+        else:
+            _put_varint(payload, (value * 2 if value >= 0 else -value * 2 - 1) + 1)  # zigzag
+    return _LENGTH.pack(len(payload)) + payload
+
+
+def decode_binary(payload: bytes, session_id: Optional[str]) -> Dict:
+    """A record from its payload; messages get session_id from their conversation."""
+    kind = payload[0]
+    fields = MESSAGE_FIELDS if kind == KIND_MESSAGE else CONVERSATION_FIELDS
+    record = {'type': 'message' if kind == KIND_MESSAGE else 'conversation'}
+    if kind == KIND_MESSAGE:
+        record['session_id'] = session_id
+    pos = 1
+    for field in fields:
+        value, pos = _get_varint(payload, pos)
+        if value == 0:
+            record[field] = None
+        elif field in _STRING_FIELDS:
+            record[field] = payload[pos:pos + value - 1].decode('utf-8')
+            pos += value - 1
+        else:
+            value -= 1
+            record[field] = (value >> 1) ^ -(value & 1)
+    return record
+
+
+def encode_ndjson(record: Dict, codec: JsonCodec) -> bytes:
+    return codec.dumps(record) + b'\n'
+
+
+def check_options(fmt: str, compress: bool):
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt} (expected one of {EXPORT_FORMATS})")
+    if compress and fmt != 'binary':
+        raise ValueError("zlib framing is only available for the binary format")
+
+
+class RecordWriter:
+    """Writes records to a binary file object in one format, framing binary output if asked."""
+    
+    def __init__(self, out: BinaryIO, fmt: str = 'ndjson', compress: bool = False):
+        check_options(fmt, compress)
+        self.out = out
+        self.codec = get_codec()
+        self.fmt = fmt
+        self.compress = compress
+        self.frame = bytearray()
+    
+    def write(self, record: Dict):
+        data = encode_binary(record) if self.fmt == 'binary' else encode_ndjson(record, self.codec)
+        if not self.compress:
+            self.out.write(data)
+            return
+        self.frame += data
+        if len(self.frame) >= FRAME_BYTES:
+            self.flush()
+    
+    def flush(self):
+        """Close the current zlib frame (frames are independent, so parts concatenate)."""
+        if self.frame:
+            packed = zlib.compress(bytes(self.frame), ZLIB_LEVEL)
+            self.out.write(_LENGTH.pack(len(packed)) + packed)
+            self.frame.clear()
+
+
+def write_header(out: BinaryIO, fmt: str, compress: bool):
+    if fmt == 'binary':
+        out.write(MAGIC + bytes([VERSION, FLAG_ZLIB if compress else 0]))
+
+
+def iter_export(path: Path) -> Iterator[Dict]:
+    """Records of an export file, whichever format it is in."""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            yield from JsonlReader(path).records()
+            return
+        
+        version, flags = f.read(2)
+        if version != VERSION:
+            raise ValueError(f"Unsupported export version: {version}")
+        session_id = None
+        for payload in _iter_payloads(f, bool(flags & FLAG_ZLIB)):
+            record = decode_binary(payload, session_id)
+            if record['type'] == 'conversation':
+                session_id = record['session_id']
+            yield record
+
+
+def _iter_payloads(f: BinaryIO, compressed: bool) -> Iterator[bytes]:
+    def chunks():
+        while True:
+            head = f.read(_LENGTH.size)
+            if not head:
+                return
+            yield f.read(_LENGTH.unpack(head)[0])
+    
+    if not compressed:
+        yield from chunks()
+        return
+    
+    for packed in chunks():
+        frame = zlib.decompress(packed)
+        pos = 0
+        while pos < len(frame):
+            (length,) = _LENGTH.unpack_from(frame, pos)
+            yield frame[pos + 4:pos + 4 + length]
+            pos += 4 + length
+
+
+# ----------------------------------------------------------------------
+# Reading the archive
+# ----------------------------------------------------------------------
+
+def _range_clause(after_ms: Optional[int], before_ms: Optional[int]) -> tuple:
+    """WHERE clause on start_ms (covering index) and its parameters; open bounds are omitted."""
+    clauses, params = [], []
+    if after_ms is not None:
+        clauses.append('start_ms >= ?')
+        params.append(after_ms)
+    if before_ms is not None:
+        clauses.append('start_ms <= ?')
+        params.append(before_ms)
+    return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+
+def iter_records(conn: sqlite3.Connection, bodies: BodyCodec, conversation_ids: List[int]) -> Iterator[Dict]:
+    """Header and messages of each conversation, streamed from the cursors."""
+    for conversation_id in conversation_ids:
+        row = conn.execute('''
+            SELECT session_id, start_time, end_time, message_count, total_chars
+            FROM conversations WHERE id = ?
+        ''', (conversation_id,)).fetchone()
+        yield {'type': 'conversation', **dict(zip(CONVERSATION_FIELDS, row))}
+        
+        for number, role, timestamp, tokens, content_hash, simhash, content in conn.execute('''
+            SELECT m.message_number, m.role, m.timestamp, m.tokens_estimate, m.content_hash, m.simhash, b.content
+            FROM messages m
+            LEFT JOIN blobs b ON b.id = m.blob_id
+            WHERE m.conversation_id = ?
+            ORDER BY m.message_number
+        ''', (conversation_id,)):
+            yield {'type': 'message', 'session_id': row[0], 'message_number': number, 'role': role,
+                   'timestamp': timestamp, 'tokens_estimate': tokens, 'content_hash': content_hash,
+                   'simhash': from_signed(simhash) if simhash is not None else None,
+                   'content': bodies.decode(content) or ''}
+
+
+def plan_units(live_db: Path, after_ms: Optional[int] = None, before_ms: Optional[int] = None,
+               unit_size: int = UNIT_CONVERSATIONS) -> List[Dict]:
+    """
+    Export units, oldest data first: the shards overlapping the range
+    (from the catalog), then the live database, each cut into runs of
+    unit_size conversation ids in start order.
+    """
+    live_db = Path(live_db)
+    databases = [shard_uri(shard['path'], shard['sealed'])
+                 for shard in ShardCatalog(live_db.parent).shards(after_ms, before_ms)]
+    databases.append(live_db.resolve().as_uri() + '?mode=ro')
+    
+    where, params = _range_clause(after_ms, before_ms)
+    units = []
+    for uri in databases:
+        conn = sqlite3.connect(uri, uri=True)
+        ids = [conversation_id for (conversation_id,) in conn.execute(
+            f'SELECT id FROM conversations{where} ORDER BY start_ms, id', params)]
+        conn.close()
+        units += [{'database': uri, 'conversation_ids': ids[start:start + unit_size]}
+                  for start in range(0, len(ids), unit_size)]
+    return units
+
+
+def export_unit(unit: Dict, part: str, fmt: str, compress: bool) -> Dict:
+    """Write one unit's records to a part file (no header); returns its counts."""
+    conn = sqlite3.connect(unit['database'], uri=True)
+    bodies = BodyCodec(conn)
+    counts = {'conversations': 0, 'messages': 0}
+    with open(part, 'wb') as out:
+        writer = RecordWriter(out, fmt, compress)
+        for record in iter_records(conn, bodies, unit['conversation_ids']):
+            writer.write(record)
+            counts['conversations' if record['type'] == 'conversation' else 'messages'] += 1
+        writer.flush()
+    conn.close()
+    return counts
+
+
+def export_archive(live_db: Path, output: Path, fmt: str = 'ndjson', compress: bool = False,
+                   after_ms: Optional[int] = None, before_ms: Optional[int] = None, workers: int = 1) -> Dict:
+    """
+    Stream the archive (the live database and its shards, optionally only
+    conversations starting within [after_ms, before_ms]) into one export
+    file. Returns counts, output bytes and seconds.
+    """
+    check_options(fmt, compress)
+    start = time.perf_counter()
+    units = plan_units(live_db, after_ms, before_ms)
+    totals = {'conversations': 0, 'messages': 0}
+    
+    part_dir = Path(tempfile.mkdtemp(prefix='export_', dir=Path(output).parent))
+    try:
+        parts = [str(part_dir / f"part{n:06d}") for n in range(len(units))]
+        with open(output, 'wb') as out:
+            write_header(out, fmt, compress)
+            
+            def append(part: str, counts: Dict):
+                for key in totals:
+                    totals[key] += counts[key]
+                with open(part, 'rb') as f:
+                    shutil.copyfileobj(f, out, 1 << 20)
+                Path(part).unlink()
+            
+            if workers > 1:
+                # A bounded window of units in flight keeps the part files few
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    in_flight = deque()
+                    for unit, part in zip(units, parts):
+                        in_flight.append((part, executor.submit(export_unit, unit, part, fmt, compress)))
+                        if len(in_flight) >= UNITS_AHEAD_PER_WORKER * workers:
+                            part, future = in_flight.popleft()
+                            append(part, future.result())
+                    while in_flight:
+                        part, future = in_flight.popleft()
+                        append(part, future.result())
+            else:
+                for unit, part in zip(units, parts):
+                    append(part, export_unit(unit, part, fmt, compress))
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+    
+    totals['bytes'] = Path(output).stat().st_size
+    totals['seconds'] = time.perf_counter() - start
+    return totals
+
+
+# ----------------------------------------------------------------------
+# Loading an export
+# ----------------------------------------------------------------------
+
+def import_archive(path: Path, writer, batch_size: int = 200) -> Dict:
+    """
+    Bulk-load an export through a CuratorWriter. Messages are appended in
+    batches per conversation; content hashes make re-importing a no-op.
+    Near-duplicate merging is suspended - the export already went
+    through it. Returns counts and seconds.
+    """
+    start = time.perf_counter()
+    totals = {'conversations': 0, 'messages': 0, 'stored': 0}
+    distance, writer.near_duplicate_distance = writer.near_duplicate_distance, None
+    batch: List[Dict] = []
+    
+    def store():
+        if batch:
+            totals['stored'] += writer.append_messages(batch[0]['session_id'], batch)
+            writer.commit_if_due()
+            batch.clear()
+    
+    try:
+        for record in iter_export(path):
+            if record['type'] == 'conversation':
+                store()
+                totals['conversations'] += 1
+                continue
+            totals['messages'] += 1
+            batch.append(record)
+            if len(batch) >= batch_size:
+                store()
+        store()
+        writer.commit()
+    except Exception:
+        writer.rollback()
+        raise
+    finally:
+        writer.near_duplicate_distance = distance
+    
+    totals['seconds'] = time.perf_counter() - start
+    return totals
@@ -1,1016 +1,1349 @@
-import json
-import re
-import sqlite3
-import sys
-    import codecs
-    import sys
 #!/usr/bin/env python3
-
 # -*- coding: utf-8 -*-
-
 """
-
 Claude Desktop Curator
-
 Processes raw logs from the Logger and extracts structured conversations.
 
 The Curator reads JSONL files from the Logger, filters out UI noise,
-
 extracts actual conversation messages, and organizes them into
-
 structured, searchable conversations.
-
 """
 
+import json
+import queue
+import sqlite3
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from multiprocessing import Manager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# Import centralized configuration and sibling modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from compressor.container import CONTAINER_SUFFIX, read_container
+from compressor.line_dictionary import FORMAT_DICTIONARY, apply_changes
+from config import (BODY_COMPRESSION, COMPRESSED_DIR, NEAR_DUPLICATE_THRESHOLD, NOISE_PATTERNS_FILE,
+                    SHARD_AFTER_DAYS, WATCH_POLL_INTERVAL)
+from curator.body_codec import DICTIONARY_SAMPLE_BODIES, BodyCodec, train_dictionary
+from curator.bulk_export import export_archive, import_archive
+from curator.curator_writer import DEFAULT_COMMIT_SIZE, CuratorWriter, epoch_ms
+from curator.fts import fts_query
+from curator.jsonl_reader import JsonlReader
+from curator.migrations import Migrator
+from curator.near_duplicates import hamming, max_distance_for, snapshot_fingerprint
+from curator.noise_filter import NoiseFilter
+from curator.segmenter import new_lines
+from curator.shards import ShardCatalog, archivable_months, archive_month, shard_uri
+from curator.stats_counters import create_stats, read_stats, recompute_stats
 
 
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    import codecs
+    sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
+    sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
 
 
+# Streaming pipeline tuning
+DEFAULT_BATCH_SIZE = 200   # messages per insert batch
+DEDUPE_WINDOW = 1024       # recent text hashes remembered by the dedupe stage
+FILES_AHEAD_PER_WORKER = 2  # parallel mode: extracted files allowed to wait for the writer
+BATCHES_AHEAD_PER_FILE = 2  # parallel mode: extracted batches a file's queue holds for the writer
+WORKER_POLL_SECONDS = 1.0   # parallel mode: how often a waiting writer checks its worker is alive
+RESUME_KEYS = ('offset', 'last_message_number', 'last_text_hash')  # where the ledger resumes a file
 
+# Watch mode
+WATCH_LATENCY_TARGET = 5.0     # seconds from capture to searchable
+WATCH_LATENCY_WINDOW = 10000   # most recent message latencies summarised
+WATCH_REPORT_INTERVAL = 300    # seconds between latency summaries
 
 
+def batched(iterable: Iterable, size: int) -> Iterator[List]:
+    """Group an iterable into lists of at most `size` items."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
 
-# Fix Windows console encoding
-
-if sys.platform == 'win32':
 
+def capture_time(timestamp: Optional[str]) -> Optional[float]:
+    """Epoch seconds of a Logger timestamp (naive ISO, local time); None if unreadable."""
+    ms = epoch_ms(timestamp)
+    return None if ms is None else ms / 1000
 
-    sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
 
-    sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
+def latency_summary(latencies: Iterable[float]) -> Dict:
+    """Count, p50, p95 and max of a set of latencies in seconds (None when empty)."""
+    ordered = sorted(latencies)
+    if not ordered:
+        return {'count': 0, 'p50': None, 'p95': None, 'max': None}
+    
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+    
+    return {'count': len(ordered), 'p50': percentile(0.5), 'p95': percentile(0.95), 'max': ordered[-1]}
 
-class ClaudeCurator:
 
+class CapturePipeline:
     """
-
-    Curator Agent for processing Claude Desktop conversation logs.
-
+    The database-free half of curation: decode captures, drop repeats,
+    filter UI noise and prepare message rows.
+    
+    Holds no connection, so it can run in worker processes while a single
+    ClaudeCurator owns the database.
+    """
+    
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE, noise_filter: NoiseFilter = None,
+                 near_duplicate_threshold: Optional[float] = NEAR_DUPLICATE_THRESHOLD):
+        # Messages held in memory (and inserted) per pipeline batch
+        self.batch_size = batch_size
+        
+        # Patterns to identify UI noise, compiled into a single cached matcher
+        self.noise_filter = noise_filter or NoiseFilter.from_config(NOISE_PATTERNS_FILE)
+        self.ui_noise_patterns = self.noise_filter.patterns
+        
+        # SimHash similarity above which snapshots are near-duplicates (None = off)
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.near_duplicate_distance = max_distance_for(near_duplicate_threshold)
+    
+    
+    def is_ui_noise(self, text: str) -> bool:
+        """Check if text is UI noise that should be filtered out."""
+        return self.noise_filter.is_noise(text)
+    
+    def extract_conversation_content(self, raw_text: str) -> Optional[str]:
+        """
+        Extract actual conversation content from raw UI capture.
+        
+        The raw_text contains everything visible in Claude Desktop,
+        including UI elements, sidebars, etc. We need to extract
+        just the conversation messages.
+        """
+        lines = raw_text.splitlines()
+        
+        # Filter out UI noise
+        clean_lines = self.noise_filter.filter_lines(lines)
+        
+        # Join and return
+        content = '\n'.join(clean_lines)
+        return content if content else None
+    
+    def parse_raw_log(self, log_file: Path) -> List[Dict]:
+        """Parse a raw (or compressed) JSONL log file into a list of captures."""
+        try:
+            return list(self.iter_captures(log_file, self.new_progress()))
+        except Exception as e:
+            print(f" Error reading {log_file}: {e}")
+            return []
+    
+    # ------------------------------------------------------------------
+    # Streaming pipeline: read line -> decode -> dedupe -> extract -> segment -> batch
+    # Each stage is a generator, so only one batch of messages is ever
+    # held in memory no matter how large the session log grows.
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def new_progress(offset: int = 0, skip_through: Optional[int] = None,
+                     last_snapshot: Optional[str] = None) -> Dict:
+        """Create the progress record the pipeline stages update as they stream."""
+        return {
+            'offset': offset,                # byte offset after the last line read
+            'skip_through': skip_through,    # compressed input: already-curated message_number
+            'session_id': None,
+            'captures': 0,
+            'last_message_number': None,
+            'last_text_hash': None,
+            'last_snapshot': last_snapshot,  # filtered text of the last capture segmented
+            'capture_start': None,           # offset / number / hash before the capture last read
+            'held_from': None,               # capture_start of the oldest held near-duplicate
+            'near_duplicate_rows': 0,        # captures collapsed into a neighbouring snapshot
+            'near_duplicate_bytes': 0        # bytes those captures would have stored
+        }
+    
+    def iter_captures(self, log_file: Path, progress: Dict, raw_text: bool = True) -> Iterator[Dict]:
+        """
+        Stream decoded captures from a raw log or a compressed_*.jsonl file.
+        
+        Raw logs are read from progress['offset']; only complete lines are
+        consumed, so a line the Logger is still writing is left for the next
+        run. Compressed files are always replayed from the start (deltas need
+        their base text) and captures up to progress['skip_through'] are
+        skipped.
+        
+        With raw_text=False, compressed captures carry 'clean_lines' (the
+        noise-filtered lines, see iter_compressed_captures) instead of the
+        reconstructed 'raw_text'. progress['capture_start'] holds where the
+        capture just yielded starts, for resuming before it.
+        """
+        if log_file.name.startswith('compressed_'):
+            captures = self.iter_compressed_captures(log_file, progress, raw_text)
+        else:
+            captures = self.iter_raw_captures(log_file, progress)
+        
+        start = {key: progress[key] for key in RESUME_KEYS}
+        for capture in captures:
+            progress['capture_start'] = start
+            progress['captures'] += 1
+            progress['last_message_number'] = capture.get('message_number')
+            progress['last_text_hash'] = capture.get('text_hash')
+            if progress['session_id'] is None:
+                progress['session_id'] = capture.get('session_id', 'unknown')
+            yield capture
+            start = {key: progress[key] for key in RESUME_KEYS}
+    
+    def iter_log_records(self, log_file: Path, progress: Dict) -> Iterator[Dict]:
+        """Read and decode complete JSONL lines, advancing progress['offset']."""
+        reader = JsonlReader(log_file, progress['offset'], complete_only=True)
+        for record in reader.records(on_error=lambda e: print(f"  Failed to parse line: {e}")):
+            progress['offset'] = reader.offset
+            yield record
+        progress['offset'] = reader.offset  # trailing blank lines
+    
+    def iter_container_records(self, log_file: Path, progress: Dict) -> Iterator[Dict]:
+        """Decode a binary delta container (the compressor rewrites it whole)."""
+        yield from read_container(log_file)
+        progress['offset'] = log_file.stat().st_size
+    
+    def iter_raw_captures(self, log_file: Path, progress: Dict) -> Iterator[Dict]:
+        """Stream captures from a raw Logger file."""
+        return self.iter_log_records(log_file, progress)
+    
+    def iter_compressed_captures(self, log_file: Path, progress: Dict,
+                                 raw_text: bool = True) -> Iterator[Dict]:
+        """
+        Stream captures from a delta-compressed file (compressor output).
+        
+        The capture's lines are kept as a list and the replace / delete /
+        insert ops are applied to it in place (line_dictionary.apply_changes).
+        Alongside it runs a list with each line's noise-filtered form, and
+        only the lines an op brings in are filtered - so a delta costs work
+        proportional to what changed, not to the window size. The full text is joined only when raw_text
+        is requested; otherwise the capture carries 'clean_lines'.
+        
+        Format-2 files (see compressor/line_dictionary) name an op's lines
+        by id; the ids resolve to the file's dictionary, and each distinct
+        line is filtered once, when the dictionary gains it (or again after
+        a keyframe starts the dictionary over).
+        """
+        lines: List[str] = []   # reconstructed capture, splitlines(keepends=True)
+        clean: List[str] = []   # clean_line() of each entry in lines
+        clean_line = self.noise_filter.clean_line
+        skip_through = progress['skip_through']
+        dictionary: List[str] = []  # format 2: the file's distinct lines, by id
+        clean_ids: List[str] = []   # clean_line() of each dictionary line
+        
+        if log_file.suffix == CONTAINER_SUFFIX:
+            records = self.iter_container_records(log_file, progress)
+        else:
+            records = self.iter_log_records(log_file, progress)
+        
+        for compressed in records:
+            diff_data = compressed['diff']
+            kind = diff_data['type']
+            interned = diff_data.get('format') == FORMAT_DICTIONARY
+            if diff_data.get('keyframe'):
+                dictionary, clean_ids = [], []
+            if interned:
+                dictionary.extend(diff_data['lines'])
+                clean_ids.extend(clean_line(line) for line in diff_data['lines'])
+            
+            if kind == 'full':
+                if interned:
+                    lines = [dictionary[line_id] for line_id in diff_data['ids']]
+                    clean = [clean_ids[line_id] for line_id in diff_data['ids']]
+                else:
+                    lines = diff_data['content'].splitlines(keepends=True)
+                    clean = [clean_line(line) for line in lines]
+            elif kind == 'delta':
+                changes = diff_data['changes']
+                if interned:
+                    apply_changes(lines, changes, dictionary)
+                    apply_changes(clean, changes, clean_ids)
+                else:
+                    apply_changes(lines, changes)
+                    apply_changes(clean, [dict(change, new_lines=[clean_line(line) for line in change['new_lines']])
+                                          if 'new_lines' in change else change for change in changes])
+            elif kind != 'identical':
+                lines, clean = [], []
+            
+            if skip_through is not None and compressed['message_number'] <= skip_through:
+                continue
+            
+            capture = {
+                'session_id': compressed['session_id'],
+                'timestamp': compressed['timestamp'],
+                'message_number': compressed['message_number'],
+                'text_hash': compressed['text_hash']
+            }
+            if raw_text:
+                capture['raw_text'] = ''.join(lines)
+            else:
+                capture['clean_lines'] = [line for line in clean if line]
+            yield capture
+    
+    def iter_unique_captures(self, captures: Iterable[Dict],
+                             last_text_hash: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Drop captures whose text_hash was seen recently.
+        
+        Only a bounded window of hashes is kept in memory; repeats older
+        than that are caught by the (conversation_id, content_hash) check
+        at insert time.
+        """
+        recent = OrderedDict()
+        if last_text_hash:
+            recent[last_text_hash] = None
+        
+        for capture in captures:
+            text_hash = capture.get('text_hash')
+            
+            if text_hash in recent:
+                recent.move_to_end(text_hash)
+                continue
+            
+            recent[text_hash] = None
+            if len(recent) > DEDUPE_WINDOW:
+                recent.popitem(last=False)
+            
+            yield capture
+    
+    def iter_extracted_messages(self, captures: Iterable[Dict],
+                                progress: Optional[Dict] = None) -> Iterator[Dict]:
+        """
+        Extract conversation content from each capture, dropping noise-only
+        ones, and segment it against the previous snapshot so each message
+        holds only the newly appeared text (see segmenter). Rows are
+        prepared for the writer (role, token estimate, SimHash).
+        
+        With near-duplicate detection on, a snapshot whose fingerprint is
+        within near_duplicate_distance bits of the last segmented one (a
+        cursor blink, a ticking relative timestamp) is held back instead of
+        segmented. A later snapshot that differs enough supersedes it, and
+        whatever it added is picked up then; only the last held snapshot of
+        the stream is segmented on its own.
+        
+        With a progress record, segmentation resumes from
+        progress['last_snapshot'] and keeps it up to date, and collapsed
+        captures are counted in near_duplicate_rows / near_duplicate_bytes.
+        While a snapshot is held, progress['held_from'] is where the oldest
+        held capture starts; the ledger stops there, so a run committed and
+        interrupted mid-hold reads those captures again.
+        """
+        previous = []
+        if progress and progress.get('last_snapshot'):
+            previous = progress['last_snapshot'].split('\n')
+        
+        distance = self.near_duplicate_distance
+        previous_fingerprint = None
+        if distance is not None and previous:
+            previous_fingerprint = snapshot_fingerprint(previous)
+        held = None  # (capture, lines, fingerprint, turn) of the pending near-duplicate
+        prev_content = ""
+        
+        def segment(capture: Dict, lines: List[str], fingerprint: Optional[int],
+                    turn: Optional[List[str]] = None) -> Optional[Dict]:
+            nonlocal previous, previous_fingerprint, prev_content
+            if turn is None:
+                turn = new_lines(previous, lines)
+            previous, previous_fingerprint = lines, fingerprint
+            if progress is not None:
+                progress['last_snapshot'] = '\n'.join(lines)
+            
+            if not turn:
+                return None  # re-render: nothing new on screen
+            
+            text = '\n'.join(turn)
+            message = {
+                'content': text,
+                'timestamp': capture.get('timestamp'),
+                'content_hash': capture.get('text_hash'),
+                'role': self.detect_message_role(text, prev_content),
+                'tokens_estimate': self.estimate_tokens(text),
+                'simhash': fingerprint
+            }
+            prev_content = text
+            return message
+        
+        def collapse(dropped) -> None:
+            if progress is not None and dropped[3]:
+                progress['near_duplicate_rows'] += 1
+                progress['near_duplicate_bytes'] += len('\n'.join(dropped[3]).encode('utf-8'))
+        
+        for capture in captures:
+            lines = capture.get('clean_lines')
+            if lines is None:
+                # Every line break splitlines() knows, like the compressor's line units
+                lines = self.noise_filter.filter_lines(capture.get('raw_text', '').splitlines())
+            content = '\n'.join(lines)
+            
+            if not content or len(content) <= 50:  # Minimum meaningful content
+                continue
+            
+            fingerprint = None
+            if distance is not None:
+                fingerprint = snapshot_fingerprint(lines)
+                if previous_fingerprint is not None and hamming(fingerprint, previous_fingerprint) <= distance:
+                    if held is not None:
+                        collapse(held)
+                    elif progress is not None:
+                        progress['held_from'] = progress.get('capture_start')
+                    held = (capture, lines, fingerprint, new_lines(previous, lines))
+                    continue
+                if held is not None:
+                    collapse(held)
+                    held = None
+                    if progress is not None:
+                        progress['held_from'] = None
+            
+            message = segment(capture, lines, fingerprint)
+            if message is not None:
+                yield message
+        
+        # The stream ended on a near-duplicate: nothing supersedes it
+        if held is not None:
+            if progress is not None:
+                progress['held_from'] = None
+            message = segment(*held)
+            if message is not None:
+                yield message
+    
+    def iter_message_batches(self, log_file: Path, progress: Dict,
+                             seen_hash: Optional[str] = None) -> Iterator[List[Dict]]:
+        """
+        The whole read -> decode -> dedupe -> extract chain for one log file,
+        grouped into batch_size lists. progress is up to date whenever a
+        batch is yielded.
+        """
+        captures = self.iter_captures(log_file, progress, raw_text=False)
+        unique = self.iter_unique_captures(captures, seen_hash)
+        messages = self.iter_extracted_messages(unique, progress)
+        return batched(messages, self.batch_size)
+    
+    def detect_message_role(self, content: str, prev_content: str = "") -> str:
+        """
+        Detect if a message is from 'user' or 'assistant'.
+        
+        Heuristics:
+        - Short messages are usually user input
+        - Messages with thinking blocks are assistant
+        - Messages with tool calls are assistant
+        - Messages with code blocks are often assistant
+        """
+        # Check for assistant indicators
+        if "```" in content:  # Code blocks
+            return "assistant"
+        if "Request {" in content and "Response" in content:  # Tool calls
+            return "assistant"
+        if len(content) > 500:  # Long responses usually assistant
+            return "assistant"
+        
+        # Check for user indicators
+        if len(content) < 200 and not any(indicator in content for indicator in ["", "", ""]):
+            return "user"
+        
+        # Default to assistant for longer content
+        return "assistant" if len(content) > 200 else "user"
     
+    def estimate_tokens(self, text: str) -> int:
+        """Rough estimate of token count (1 token ~= 4 chars)."""
+        return len(text) // 4
 
-    Responsibilities:
 
-    1. Parse raw JSONL files from Logger
+# ============================================================================
+# PARALLEL EXTRACTION (worker processes - no database access)
+# ============================================================================
 
-    2. Extract actual conversation content (filter UI noise)
+_worker_pipeline: Optional[CapturePipeline] = None
 
-    3. Detect message boundaries and conversation structure
 
-    4. Store in SQLite database for efficient querying
+def init_extract_worker(noise_patterns: List[str], batch_size: int,
+                        near_duplicate_threshold: Optional[float] = None):
+    """Build the worker's pipeline once, so the noise LRU stays warm across files."""
+    global _worker_pipeline
+    _worker_pipeline = CapturePipeline(batch_size, NoiseFilter(noise_patterns), near_duplicate_threshold)
 
-    5. Create searchable index of conversations
 
+def extract_single_file(log_file_str: str, progress: Dict, seen_hash: Optional[str], batches) -> Dict:
     """
-
+    Run decode -> dedupe -> extract for one log file (worker function for
+    parallel curation). Each message batch goes to the writer as soon as
+    it is extracted, paired with the progress snapshot the writer records
+    in the ledger alongside it, through batches - a bounded queue, so the
+    worker blocks rather than holding more than a batch while the writer
+    catches up. None follows the last batch. Returns the run's progress.
+    """
+    log_file = Path(log_file_str)
+    start_time = time.perf_counter()
+    
+    try:
+        for batch in _worker_pipeline.iter_message_batches(log_file, progress, seen_hash):
+            batches.put((batch, dict(progress)))
+        batches.put(None)
+        
+        return {
+            'file': log_file.name,
+            'success': True,
+            'progress': progress,
+            'seconds': time.perf_counter() - start_time
+        }
     
+    except Exception as e:
+        batches.put(None)
+        return {
+            'file': log_file.name,
+            'success': False,
+            'error': str(e)
+        }
 
-    def __init__(self, raw_logs_dir: str, output_dir: str):
 
+class ClaudeCurator(CapturePipeline):
+    """
+    Curator Agent for processing Claude Desktop conversation logs.
+    
+    Responsibilities:
+    1. Parse raw JSONL files from Logger
+    2. Extract actual conversation content (filter UI noise)
+    3. Detect message boundaries and conversation structure
+    4. Store in SQLite database for efficient querying
+    5. Create searchable index of conversations
+    """
+    
+    def __init__(self, raw_logs_dir: str, output_dir: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                 noise_filter: NoiseFilter = None, commit_size: int = DEFAULT_COMMIT_SIZE,
+                 near_duplicate_threshold: Optional[float] = NEAR_DUPLICATE_THRESHOLD,
+                 body_compression: str = BODY_COMPRESSION, shard_after_days: int = SHARD_AFTER_DAYS,
+                 compressed_dir: Optional[str] = None):
         self.raw_logs_dir = Path(raw_logs_dir)
-
+        # Where the Compressor writes compressed_* files (the orchestrator's
+        # compressor/compressed); None reads only raw_logs_dir
+        self.compressed_dir = Path(compressed_dir) if compressed_dir else None
         self.output_dir = Path(output_dir)
-
         self.output_dir.mkdir(exist_ok=True)
-
         
-
-        # Database path
-
+        super().__init__(batch_size, noise_filter, near_duplicate_threshold)
+        
+        # Database path and the single connection all reads/writes go through
         self.db_path = self.output_dir / "conversations.db"
-
+        self.writer = CuratorWriter(self.db_path, commit_size,
+                                    near_duplicate_distance=self.near_duplicate_distance,
+                                    body_compression=body_compression)
+        
+        # Closed months move out of the live database into sealed monthly shards
+        self.catalog = ShardCatalog(self.output_dir)
+        self.shard_after_days = shard_after_days
         
-
         # Initialize database
-
         self.init_database()
-
-        
-
-        # Patterns to identify different message types
-
-        self.ui_noise_patterns = [
-
-            r'^(New chat|Chats|Projects|Artifacts|Code|Starred)',
-
-            r'^(Chrome Legacy Window|Minimize|Restore|Close)',
-
-            r'^(Sidebar|Home|Claude)',
-
-            r'^(How can I help you today\?)',
-
-            r'^(Claude can make mistakes)',
-
-            r'(Notifications|Project content)',
-
-        ]
-
-        
-
+    
+    def close(self):
+        """Commit anything pending and release the database connection."""
+        self.writer.commit()
+        self.writer.close()
+    
     def init_database(self):
-
         """Initialize SQLite database with schema."""
-
-        conn = sqlite3.connect(self.db_path)
-
+        conn = self.writer.conn
         cursor = conn.cursor()
-
+        existing = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'messages'").fetchone() is not None
         
-
         # Conversations table
-
         cursor.execute('''
-
             CREATE TABLE IF NOT EXISTS conversations (
-
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-
                 session_id TEXT UNIQUE,
-
                 start_time TEXT,
-
                 end_time TEXT,
-
                 message_count INTEGER,
-
                 total_chars INTEGER,
-
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                start_ms INTEGER,  -- start_time / end_time as epoch milliseconds
+                end_ms INTEGER
+            )
+        ''')
+        
+        # Message bodies, stored once per distinct text (content-addressed)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS blobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                hash TEXT UNIQUE,  -- sha256 of content
+                content TEXT,      -- plain text, or a compressed BLOB (see body_codec)
+                size INTEGER,      -- characters of plain text
+                refcount INTEGER DEFAULT 0
+            )
+        ''')
+        
+        # Preset dictionaries compressed bodies refer to by id
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS body_dictionaries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                dictionary BLOB,
                 created_at TEXT DEFAULT CURRENT_TIMESTAMP
-
             )
-
         ''')
-
         
-
-        # Messages table
-
+        # Bodies as text, whichever way they are stored
+        cursor.execute('''
+            CREATE VIEW IF NOT EXISTS blob_text AS
+            SELECT id, body_text(content) AS content FROM blobs
+        ''')
+        
+        # Messages table (content lives in blobs)
         cursor.execute('''
-
             CREATE TABLE IF NOT EXISTS messages (
-
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-
                 conversation_id INTEGER,
-
                 message_number INTEGER,
-
                 role TEXT,  -- 'user' or 'assistant'
-
-                content TEXT,
-
+                blob_id INTEGER,
                 timestamp TEXT,
-
                 content_hash TEXT,
-
                 tokens_estimate INTEGER,
-
-                FOREIGN KEY (conversation_id) REFERENCES conversations(id)
-
+                simhash INTEGER,  -- SimHash of the snapshot (near-duplicate detection)
+                timestamp_ms INTEGER,  -- timestamp as epoch milliseconds
+                FOREIGN KEY (conversation_id) REFERENCES conversations(id),
+                FOREIGN KEY (blob_id) REFERENCES blobs(id)
             )
-
         ''')
-
         
-
-        # Create indexes for faster searching
-
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_content ON messages(content)')
-
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON messages(timestamp)')
-
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_conversation ON messages(conversation_id)')
-
+        # Per-file ingest ledger: how far into each raw log we've curated
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ingest_ledger (
+                file_name TEXT PRIMARY KEY,
+                session_id TEXT,
+                byte_offset INTEGER,
+                last_message_number INTEGER,
+                inode INTEGER,
+                size INTEGER,
+                mtime REAL,
+                last_text_hash TEXT,
+                last_snapshot TEXT,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Databases curated before the blob store kept bodies in messages.content
+        cursor.execute('PRAGMA table_info(messages)')
+        migrate_bodies = 'content' in {row[1] for row in cursor.fetchall()}
+        
+        # Every change since the tables above - columns and their backfills,
+        # indexes, triggers, the FTS index - is a versioned migration
+        Migrator(conn, verbose=existing).migrate()
+        
+        # Running totals for show_summary / get_stats (counted once when first created)
+        create_stats(conn)
+        
+        # Compressed mode: the preset dictionary, trained on first use
+        self.writer.bodies.prepare(self.sample_bodies())
         
-
         conn.commit()
-
-        conn.close()
-
         print(f" Database initialized at {self.db_path}")
-
+        
+        # Reclaim the pages the inline bodies used to occupy
+        if migrate_bodies:
+            conn.execute('VACUUM')
     
-
-    def is_ui_noise(self, text: str) -> bool:
-
-        """Check if text is UI noise that should be filtered out."""
-
-        for pattern in self.ui_noise_patterns:
-
-            if re.search(pattern, text, re.IGNORECASE):
-
-                return True
-
-        return False
-
+    def sample_bodies(self, limit: int = DICTIONARY_SAMPLE_BODIES) -> Iterator[str]:
+        """A random sample of stored bodies (dictionary training input)."""
+        bodies = self.writer.bodies
+        cursor = self.writer.conn.execute('SELECT content FROM blobs ORDER BY random() LIMIT ?', (limit,))
+        return (bodies.decode(content) for (content,) in cursor)
     
-
-    def extract_conversation_content(self, raw_text: str) -> Optional[str]:
-
+    def train_body_dictionary(self):
+        """Train a new preset dictionary from the stored bodies; new bodies use it."""
+        dictionary = train_dictionary(self.sample_bodies())
+        self.writer.conn.execute('INSERT INTO body_dictionaries (dictionary) VALUES (?)', (dictionary,))
+        self.writer.bodies.prepare()
+        self.writer.commit()
+        print(f" Trained a {len(dictionary):,}-byte body dictionary")
+    
+    def list_log_files(self) -> List[Path]:
         """
-
-        Extract actual conversation content from raw UI capture.
-
+        Raw logs and compressed files (JSONL or delta containers) to curate, sorted.
         
-
-        The raw_text contains everything visible in Claude Desktop,
-
-        including UI elements, sidebars, etc. We need to extract
-
-        just the conversation messages.
-
+        Compressed files are looked for in raw_logs_dir and compressed_dir. A
+        raw log whose compressed copy is in compressed_dir is curated from
+        that copy (the delta-aware path) rather than a second time raw.
         """
-
-        lines = raw_text.split('\n')
-
+        log_files = {path.name: path for path in self.raw_logs_dir.glob("*.jsonl")}
+        log_files.update((path.name, path) for path in self.raw_logs_dir.glob(f"compressed_*{CONTAINER_SUFFIX}"))
         
-
-        # Filter out UI noise
-
-        clean_lines = []
-
-        for line in lines:
-
-            line = line.strip()
-
-            if line and not self.is_ui_noise(line):
-
-                clean_lines.append(line)
-
+        if self.compressed_dir and self.compressed_dir.is_dir():
+            for pattern in ("compressed_*.jsonl", f"compressed_*{CONTAINER_SUFFIX}"):
+                for path in self.compressed_dir.glob(pattern):
+                    log_files[path.name] = path
+                    log_files.pop(path.stem[len('compressed_'):] + '.jsonl', None)
         
-
-        # Join and return
-
-        content = '\n'.join(clean_lines)
-
-        return content if content else None
-
+        return sorted(log_files.values())
     
-
-    def parse_raw_log(self, log_file: Path) -> List[Dict]:
-
-        """Parse a raw JSONL log file."""
-
-        messages = []
-
+    def plan_log_file(self, log_file: Path) -> Optional[Dict]:
+        """
+        Work out from the ingest ledger where curation of a log file resumes.
         
-
-        try:
-
-            with open(log_file, 'r', encoding='utf-8') as f:
-
-                for line in f:
-
-                    if line.strip():
-
-                        try:
-
-                            msg = json.loads(line)
-
-                            messages.append(msg)
-
-                        except json.JSONDecodeError as e:
-
-                            print(f"  Failed to parse line: {e}")
-
-                            continue
-
-        except Exception as e:
-
-            print(f" Error reading {log_file}: {e}")
-
-            return []
-
+        Returns a task - the file's stat, a fresh progress record and the
+        last curated text hash - or None if the file is unchanged since the
+        last run.
+        """
+        stat = log_file.stat()
+        ledger = self.writer.get_ledger_entry(log_file.name)
+        task = {'stat': stat, 'progress': self.new_progress(), 'seen_hash': None, 'rescan': False}
+        resume = {'last_snapshot': ledger['last_snapshot']} if ledger else {}
         
-
-        return messages
-
+        if ledger:
+            task['seen_hash'] = ledger['last_text_hash']
+            
+            if ledger['inode'] != stat.st_ino or stat.st_size < ledger['byte_offset']:
+                # Replaced or truncated - rescan; stored hashes prevent duplicates
+                task['rescan'] = True
+            elif ledger['size'] == stat.st_size and ledger['mtime'] == stat.st_mtime:
+                return None
+            elif log_file.name.startswith('compressed_'):
+                # Rewritten by the compressor - replay, skipping what we have
+                task['progress'] = self.new_progress(skip_through=ledger['last_message_number'], **resume)
+            else:
+                task['progress'] = self.new_progress(offset=ledger['byte_offset'], **resume)
+        
+        return task
     
-
-    def detect_message_role(self, content: str, prev_content: str = "") -> str:
-
+    def store_batches(self, log_file: Path, stat, batches: Iterable, progress: Dict) -> int:
         """
-
-        Detect if a message is from 'user' or 'assistant'.
-
+        Insert message batches, advancing the ledger in the same transactions.
         
-
-        Heuristics:
-
-        - Short messages are usually user input
-
-        - Messages with thinking blocks are assistant
-
-        - Messages with tool calls are assistant
-
-        - Messages with code blocks are often assistant
-
+        batches yields (batch, progress) pairs - the progress record as it
+        stood once that batch was complete - and progress is the record for
+        the whole run. Returns the number of messages stored.
         """
-
-        # Check for assistant indicators
-
-        if "```" in content:  # Code blocks
-
-            return "assistant"
-
-        if "Request {" in content and "Response" in content:  # Tool calls
-
-            return "assistant"
-
-        if len(content) > 500:  # Long responses usually assistant
-
-            return "assistant"
-
+        writer = self.writer
+        stored = 0
         
-
-        # Check for user indicators
-
-        if len(content) < 200 and not any(indicator in content for indicator in ["", "", ""]):
-
-            return "user"
-
+        for batch, batch_progress in batches:
+            stored += writer.append_messages(batch_progress['session_id'], batch)
+            writer.update_ledger_entry(log_file.name, batch_progress, stat)
+            writer.commit_if_due()
         
-
-        # Default to assistant for longer content
-
-        return "assistant" if len(content) > 200 else "user"
-
-    
-
-    def estimate_tokens(self, text: str) -> int:
-
-        """Rough estimate of token count (1 token ~= 4 chars)."""
-
-        return len(text) // 4
-
+        # Captures after the last stored message were consumed too
+        writer.update_ledger_entry(log_file.name, progress, stat)
+        writer.commit()
+        return stored
     
-
-    def process_log_file(self, log_file: Path):
-
+    def process_log_file(self, log_file: Path) -> Dict:
         """
-
-        Process a single raw log file and extract conversations.
-
+        Process a single raw or compressed log file and extract conversations.
+        
+        Incremental: the ingest ledger remembers how far the previous run
+        got, so only captures appended since then are parsed and added to
+        the existing conversation. Captures stream through the pipeline and
+        are inserted batch_size messages at a time. Returns run stats.
         """
-
         print(f"\n Processing: {log_file.name}")
-
         
-
-        # Parse the raw log
-
-        raw_messages = self.parse_raw_log(log_file)
-
-        
-
-        if not raw_messages:
-
-            print("  No messages found in log file")
-
-            return
-
-        
-
-        print(f" Found {len(raw_messages)} raw captures")
-
+        stats = {'file': log_file.name, 'captures': 0, 'messages': 0,
+                 'near_duplicate_rows': 0, 'near_duplicate_bytes': 0,
+                 'seconds': 0.0, 'captures_per_sec': 0.0}
+        start_time = time.perf_counter()
         
-
-        # Extract session info
-
-        session_id = raw_messages[0].get('session_id', 'unknown')
-
-        
-
-        # Track unique content by hash to avoid duplicates
-
-        seen_hashes = set()
-
-        extracted_messages = []
-
-        
-
-        for raw_msg in raw_messages:
-
-            text_hash = raw_msg.get('text_hash')
-
-            raw_text = raw_msg.get('raw_text', '')
-
-            timestamp = raw_msg.get('timestamp')
-
+        try:
+            task = self.plan_log_file(log_file)
+            if task is None:
+                print("  No new captures since last run")
+                return stats
+            if task['rescan']:
+                print("  Log file was replaced, re-reading from the start")
             
-
-            # Skip if we've seen this exact content before
-
-            if text_hash in seen_hashes:
-
-                continue
-
-            seen_hashes.add(text_hash)
-
+            # Nothing is read until the writer pulls the first batch
+            progress = task['progress']
+            batches = ((batch, progress)
+                       for batch in self.iter_message_batches(log_file, progress, task['seen_hash']))
+            stats['messages'] = self.store_batches(log_file, task['stat'], batches, progress)
             
-
-            # Extract actual conversation content
-
-            content = self.extract_conversation_content(raw_text)
-
+            stats['captures'] = progress['captures']
+            stats['near_duplicate_rows'] = progress['near_duplicate_rows']
+            stats['near_duplicate_bytes'] = progress['near_duplicate_bytes']
+            stats['seconds'] = time.perf_counter() - start_time
+            if stats['seconds'] > 0:
+                stats['captures_per_sec'] = stats['captures'] / stats['seconds']
             
-
-            if content and len(content) > 50:  # Minimum meaningful content
-
-                extracted_messages.append({
-
-                    'content': content,
-
-                    'timestamp': timestamp,
-
-                    'content_hash': text_hash
-
-                })
-
+            if stats['captures']:
+                print(f" Read {stats['captures']} new raw captures, stored {stats['messages']} messages "
+                      f"({stats['captures_per_sec']:,.0f} captures/sec)")
+            else:
+                print("  No new captures found in log file")
         
-
-        print(f" Extracted {len(extracted_messages)} unique messages")
-
+        except Exception as e:
+            print(f" Error processing {log_file.name}: {e}")
+            self.writer.rollback()
         
-
-        # Store in database
-
-        self.store_conversation(session_id, extracted_messages)
-
+        return stats
     
-
     def store_conversation(self, session_id: str, messages: List[Dict]):
-
         """Store extracted conversation in database."""
-
-        conn = sqlite3.connect(self.db_path)
-
-        cursor = conn.cursor()
-
+        prev_content = ""
+        rows = []
+        for msg in messages:
+            rows.append(dict(msg,
+                             role=self.detect_message_role(msg['content'], prev_content),
+                             tokens_estimate=self.estimate_tokens(msg['content'])))
+            prev_content = msg['content']
         
-
         try:
-
-            # Check if conversation already exists
-
-            cursor.execute('SELECT id FROM conversations WHERE session_id = ?', (session_id,))
-
-            existing = cursor.fetchone()
-
-            
-
-            if existing:
-
-                print(f"  Conversation {session_id} already exists, skipping")
-
-                return
-
-            
-
-            # Calculate conversation stats
-
-            start_time = messages[0]['timestamp'] if messages else None
-
-            end_time = messages[-1]['timestamp'] if messages else None
-
-            total_chars = sum(len(msg['content']) for msg in messages)
-
-            
-
-            # Insert conversation
-
-            cursor.execute('''
-
-                INSERT INTO conversations (session_id, start_time, end_time, message_count, total_chars)
-
-                VALUES (?, ?, ?, ?, ?)
-
-            ''', (session_id, start_time, end_time, len(messages), total_chars))
-
-            
-
-            conversation_id = cursor.lastrowid
-
-            
-
-            # Insert messages
-
-            prev_content = ""
-
-            for idx, msg in enumerate(messages):
-
-                role = self.detect_message_role(msg['content'], prev_content)
-
-                tokens = self.estimate_tokens(msg['content'])
-
-                
-
-                cursor.execute('''
-
-                    INSERT INTO messages (conversation_id, message_number, role, content, 
-
-                                        timestamp, content_hash, tokens_estimate)
-
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-
-                ''', (conversation_id, idx, role, msg['content'], 
-
-                      msg['timestamp'], msg['content_hash'], tokens))
-
-                
-
-                prev_content = msg['content']
-
-            
-
-            conn.commit()
-
-            print(f" Stored conversation: {session_id} ({len(messages)} messages, {total_chars:,} chars)")
-
-            
-
+            stored = self.writer.append_messages(session_id, rows)
+            self.writer.commit()
+            print(f" Stored conversation: {session_id} ({stored} messages)")
         except Exception as e:
-
             print(f" Error storing conversation: {e}")
-
-            conn.rollback()
-
-        finally:
-
-            conn.close()
-
+            self.writer.rollback()
     
-
     def export_conversation_to_json(self, session_id: str, output_file: Path):
-
-        """Export a conversation to JSON format."""
-
-        conn = sqlite3.connect(self.db_path)
-
-        cursor = conn.cursor()
-
-        
-
-        # Get conversation
-
-        cursor.execute('SELECT * FROM conversations WHERE session_id = ?', (session_id,))
-
-        conv = cursor.fetchone()
-
+        """Export a conversation (from the live database or an archived shard) to JSON format."""
+        databases = self.iter_databases()  # held, so the matching shard stays open
+        for conn, bodies in databases:
+            cursor = conn.cursor()
+            
+            # Get conversation
+            cursor.execute('SELECT * FROM conversations WHERE session_id = ?', (session_id,))
+            conv = cursor.fetchone()
+            if conv:
+                break
         
-
         if not conv:
-
             print(f" Conversation {session_id} not found")
-
             return
-
         
-
         # Get messages
-
         cursor.execute('''
-
-            SELECT message_number, role, content, timestamp, tokens_estimate
-
-            FROM messages
-
-            WHERE conversation_id = ?
-
-            ORDER BY message_number
-
+            SELECT m.message_number, m.role, COALESCE(b.content, ''), m.timestamp, m.tokens_estimate
+            FROM messages m
+            LEFT JOIN blobs b ON b.id = m.blob_id
+            WHERE m.conversation_id = ?
+            ORDER BY m.message_number
         ''', (conv[0],))
-
         
-
         messages = []
-
         for row in cursor.fetchall():
-
             messages.append({
-
                 'message_number': row[0],
-
                 'role': row[1],
-
-                'content': row[2],
-
+                'content': bodies.decode(row[2]),
                 'timestamp': row[3],
-
                 'tokens_estimate': row[4]
-
             })
-
         
-
         # Create export object
-
         export_data = {
-
             'session_id': conv[1],
-
             'start_time': conv[2],
-
             'end_time': conv[3],
-
             'message_count': conv[4],
-
             'total_chars': conv[5],
-
             'messages': messages
-
         }
-
         
-
         # Write to file
-
         with open(output_file, 'w', encoding='utf-8') as f:
-
             json.dump(export_data, f, indent=2, ensure_ascii=True)
-
         
-
         print(f" Exported to {output_file}")
-
-        conn.close()
-
     
-
-    def process_all_logs(self):
-
-        """Process all raw log files in the input directory."""
-
-        log_files = sorted(self.raw_logs_dir.glob("*.jsonl"))
-
+    def bulk_export(self, output_file: Path, fmt: str = 'ndjson', compress: bool = False,
+                    after_date: str = None, before_date: str = None, workers: int = 1) -> Optional[Dict]:
+        """
+        Stream every conversation - live database and shards - or those
+        starting between two ISO dates, into one NDJSON or binary export
+        (see curator.bulk_export). Returns the export totals.
+        """
+        bounds = []
+        for date in (after_date, before_date):
+            ms = epoch_ms(date) if date else None
+            if date and ms is None:
+                print(f" Invalid date: {date} (expected ISO format, e.g. 2025-11-01)")
+                return None
+            bounds.append(ms)
+        
+        self.writer.commit()
+        try:
+            totals = export_archive(self.db_path, output_file, fmt, compress, *bounds, workers)
+        except ValueError as e:
+            print(f" Export failed: {e}")
+            return None
+        
+        size_mb = totals['bytes'] / 1024 / 1024
+        rate = size_mb / totals['seconds'] if totals['seconds'] > 0 else 0
+        print(f" Exported {totals['conversations']} conversations, {totals['messages']} messages "
+              f"to {output_file}")
+        print(f" {size_mb:.2f} MB in {totals['seconds']:.2f}s ({rate:.1f} MB/s)")
+        return totals
+    
+    def bulk_import(self, export_file: Path) -> Optional[Dict]:
+        """Load an export written by bulk_export into this database."""
+        try:
+            totals = import_archive(export_file, self.writer, self.batch_size)
+        except (OSError, ValueError) as e:
+            print(f" Import failed: {e}")
+            return None
+        
+        size_mb = Path(export_file).stat().st_size / 1024 / 1024
+        rate = size_mb / totals['seconds'] if totals['seconds'] > 0 else 0
+        print(f" Imported {totals['conversations']} conversations, {totals['stored']} of "
+              f"{totals['messages']} messages from {export_file}")
+        print(f" {size_mb:.2f} MB in {totals['seconds']:.2f}s ({rate:.1f} MB/s)")
+        return totals
+    
+    def process_all_logs(self, workers: int = 1):
+        """
+        Process all raw log files in the input directory.
+        
+        With workers > 1, decoding and extraction run in a process pool and
+        this process only writes; files are still stored in sorted order, so
+        the database ends up identical to a sequential run.
+        """
+        log_files = self.list_log_files()
         
-
         if not log_files:
-
-            print(f"  No JSONL files found in {self.raw_logs_dir}")
-
+            searched = [self.raw_logs_dir] + ([self.compressed_dir] if self.compressed_dir else [])
+            print(f"  No JSONL files found in {' or '.join(map(str, searched))}")
             return
-
         
-
         print(f"\n Found {len(log_files)} log files to process")
-
         print("=" * 60)
-
         
-
-        for log_file in log_files:
-
-            self.process_log_file(log_file)
-
+        totals = {'captures': 0, 'near_duplicate_rows': 0, 'near_duplicate_bytes': 0}
+        writer_rows = self.writer.near_duplicate_rows
+        writer_bytes = self.writer.near_duplicate_bytes
+        start_time = time.perf_counter()
+        
+        if workers > 1:
+            totals = self.process_logs_parallel(log_files, workers)
+        else:
+            for log_file in log_files:
+                stats = self.process_log_file(log_file)
+                for key in totals:
+                    totals[key] += stats[key]
+        
+        elapsed = time.perf_counter() - start_time
+        if totals['captures'] and elapsed > 0:
+            print(f"\n Throughput: {totals['captures'] / elapsed:,.0f} captures/sec")
+        
+        if self.near_duplicate_distance is not None:
+            cross_rows = self.writer.near_duplicate_rows - writer_rows
+            cross_bytes = self.writer.near_duplicate_bytes - writer_bytes
+            print(f" Near-duplicates: {totals['near_duplicate_rows']} collapsed within sessions, "
+                  f"{cross_rows} skipped across sessions - "
+                  f"{totals['near_duplicate_rows'] + cross_rows} rows, "
+                  f"{totals['near_duplicate_bytes'] + cross_bytes:,} bytes not written")
+        
+        if self.shard_after_days:
+            self.archive_shards(self.shard_after_days)
+        
+        # Show summary
+        self.show_summary()
+    
+    def process_logs_parallel(self, log_files: List[Path], workers: int) -> Dict:
+        """
+        Extract log files in a process pool and store them from this process.
+        
+        At most FILES_AHEAD_PER_WORKER * workers files are in flight, each
+        streaming its batches through a queue of BATCHES_AHEAD_PER_FILE, so
+        memory is bounded by batches, not by file size. Files are taken in
+        submission order: the writer drains the oldest file's queue while
+        later ones keep extracting (and block once their queue is full).
+        Returns the run totals.
+        """
+        totals = {'captures': 0, 'messages': 0, 'near_duplicate_rows': 0, 'near_duplicate_bytes': 0,
+                  'extract_seconds': 0.0, 'write_seconds': 0.0, 'wait_seconds': 0.0}
+        window = FILES_AHEAD_PER_WORKER * workers
+        in_flight = deque()
+        
+        with Manager() as manager, ProcessPoolExecutor(max_workers=workers, initializer=init_extract_worker,
+                                                       initargs=(self.noise_filter.patterns, self.batch_size,
+                                                                 self.near_duplicate_threshold)) as executor:
+            for log_file in log_files:
+                task = self.plan_log_file(log_file)
+                future = None
+                if task is not None:
+                    task['batches'] = manager.Queue(maxsize=BATCHES_AHEAD_PER_FILE)
+                    future = executor.submit(extract_single_file, str(log_file),
+                                             task['progress'], task['seen_hash'], task['batches'])
+                in_flight.append((log_file, task, future))
+                
+                if len(in_flight) >= window:
+                    self.store_extracted(*in_flight.popleft(), totals)
+            
+            while in_flight:
+                self.store_extracted(*in_flight.popleft(), totals)
+        
+        def rate(count: int, seconds: float) -> str:
+            return f"{count / seconds:,.0f}/sec" if seconds > 0 else "-"
+        
+        print("\n" + "=" * 60)
+        print(f" PARALLEL CURATION - {workers} workers")
+        print("=" * 60)
+        print(f" Extract (decode/dedupe/filter): {totals['captures']:,} captures, "
+              f"{totals['extract_seconds']:.2f}s worker time "
+              f"({rate(totals['captures'], totals['extract_seconds'])} per worker)")
+        print(f" Write (single connection):      {totals['messages']:,} messages, "
+              f"{totals['write_seconds']:.2f}s ({rate(totals['messages'], totals['write_seconds'])})")
+        print(f" Writer waiting on workers:      {totals['wait_seconds']:.2f}s")
+        
+        return totals
+    
+    def store_extracted(self, log_file: Path, task: Optional[Dict], future, totals: Dict):
+        """Write one file's batches as its worker streams them, then its progress."""
+        print(f"\n Processing: {log_file.name}")
+        
+        if task is None:
+            print("  No new captures since last run")
+            return
+        if task['rescan']:
+            print("  Log file was replaced, re-reading from the start")
+        
+        # The run's progress is only known once the worker is done; store_batches reads it last
+        progress: Dict = {}
+        waited = {'seconds': 0.0}
+        
+        def batches() -> Iterator[tuple]:
+            while True:
+                wait_start = time.perf_counter()
+                try:
+                    item = task['batches'].get(timeout=WORKER_POLL_SECONDS)
+                except queue.Empty:
+                    item = False
+                waited['seconds'] += time.perf_counter() - wait_start
+                if item is None or (item is False and future.done()):
+                    break  # end of file, or the worker died before saying so
+                if item is not False:
+                    yield item
+            
+            result = future.result()
+            if not result['success']:
+                raise RuntimeError(result['error'])
+            progress.update(result['progress'])
+        
+        write_start = time.perf_counter()
+        try:
+            stored = self.store_batches(log_file, task['stat'], batches(), progress)
+        except Exception as e:
+            print(f" Error processing {log_file.name}: {e}")
+            self.writer.rollback()
+            return
+        finally:
+            totals['wait_seconds'] += waited['seconds']
+        totals['write_seconds'] += time.perf_counter() - write_start - waited['seconds']
+        result = future.result()
+        
+        captures = result['progress']['captures']
+        totals['captures'] += captures
+        totals['messages'] += stored
+        totals['near_duplicate_rows'] += result['progress']['near_duplicate_rows']
+        totals['near_duplicate_bytes'] += result['progress']['near_duplicate_bytes']
+        totals['extract_seconds'] += result['seconds']
         
-
-        # Show summary
-
-        self.show_summary()
-
+        if captures:
+            print(f" Read {captures} new raw captures, stored {stored} messages")
+        else:
+            print("  No new captures found in log file")
     
-
-    def show_summary(self):
-
-        """Display summary of stored conversations."""
-
-        conn = sqlite3.connect(self.db_path)
-
-        cursor = conn.cursor()
-
+    def watch(self, poll_interval: float = WATCH_POLL_INTERVAL, max_polls: Optional[int] = None) -> Dict:
+        """
+        Tail the raw log directory, curating captures as the Logger appends them.
         
-
-        cursor.execute('SELECT COUNT(*) FROM conversations')
-
-        conv_count = cursor.fetchone()[0]
-
+        One long-running curator: the database connection and the compiled
+        noise filter stay warm between polls. Each poll only stats the log
+        files; those whose size or mtime moved go through the usual
+        incremental ingest (ledger offset, pipeline, writer) and are
+        committed file by file, so new captures land in small transactions
+        and become searchable at once.
         
-
-        cursor.execute('SELECT COUNT(*) FROM messages')
-
-        msg_count = cursor.fetchone()[0]
-
+        Capture-to-searchable latency - commit time minus the capture's
+        timestamp - is printed per file and summarised (p50 / p95 / max)
+        every WATCH_REPORT_INTERVAL seconds and on exit, against
+        WATCH_LATENCY_TARGET. Captures older than the watch itself (the
+        backlog caught up on the first poll) are not counted. Runs until
+        interrupted, or for max_polls polls; returns the totals.
+        """
+        watched = self.raw_logs_dir if not self.compressed_dir else f"{self.raw_logs_dir} and {self.compressed_dir}"
+        print(f"\n Watching {watched} every {poll_interval:g}s (Ctrl+C to stop)")
+        started = time.time()
+        seen = {}  # log file name -> (size, mtime) when last curated
+        latencies = deque(maxlen=WATCH_LATENCY_WINDOW)
+        totals = {'polls': 0, 'captures': 0, 'messages': 0}
+        archive_day = None
+        next_report = time.monotonic() + WATCH_REPORT_INTERVAL
         
-
-        cursor.execute('SELECT SUM(total_chars) FROM conversations')
-
-        total_chars = cursor.fetchone()[0] or 0
-
+        try:
+            while max_polls is None or totals['polls'] < max_polls:
+                poll_start = time.monotonic()
+                
+                log_files = self.list_log_files()
+                for log_file in log_files:
+                    try:
+                        stat = log_file.stat()
+                    except FileNotFoundError:
+                        continue  # removed by the compressor since the listing
+                    signature = (stat.st_size, stat.st_mtime_ns)
+                    if seen.get(log_file.name) != signature:
+                        seen[log_file.name] = signature
+                        self.curate_appended(log_file, started, latencies, totals)
+                for name in set(seen) - {log_file.name for log_file in log_files}:
+                    del seen[name]
+                totals['polls'] += 1
+                
+                today = time.strftime('%Y-%m-%d')
+                if self.shard_after_days and today != archive_day:
+                    archive_day = today
+                    self.archive_shards(self.shard_after_days)
+                
+                if time.monotonic() >= next_report:
+                    next_report = time.monotonic() + WATCH_REPORT_INTERVAL
+                    self.report_latency(latencies)
+                
+                if max_polls is None or totals['polls'] < max_polls:
+                    time.sleep(max(0.0, poll_interval - (time.monotonic() - poll_start)))
+        except KeyboardInterrupt:
+            # Ledger and messages advance together per batch: drop the partial one
+            self.writer.rollback()
+            print()
+        
+        totals['latency'] = self.report_latency(latencies)
+        print(f" Watched {totals['polls']} polls: {totals['captures']} captures, "
+              f"{totals['messages']} messages stored")
+        return totals
+    
+    def curate_appended(self, log_file: Path, since: float, latencies, totals: Dict):
+        """
+        Watch mode's ingest of one changed log file: curate what was
+        appended since the ledger offset, commit it, and record the latency
+        of every message captured after `since`.
+        """
+        try:
+            task = self.plan_log_file(log_file)
+            if task is None:
+                return
+            
+            progress = task['progress']
+            timestamps = []
+            
+            def batches():
+                for batch in self.iter_message_batches(log_file, progress, task['seen_hash']):
+                    timestamps.extend(message['timestamp'] for message in batch)
+                    yield batch, progress
+            
+            stored = self.store_batches(log_file, task['stat'], batches(), progress)
+            searchable = time.time()
+        except Exception as e:
+            print(f" Error processing {log_file.name}: {e}")
+            self.writer.rollback()
+            return
+        
+        totals['captures'] += progress['captures']
+        totals['messages'] += stored
+        fresh = [searchable - captured for captured in map(capture_time, timestamps)
+                 if captured is not None and captured >= since]
+        latencies.extend(fresh)
+        
+        if stored:
+            line = f" {log_file.name}: +{stored} messages from {progress['captures']} captures"
+            if fresh:
+                line += f", searchable {max(fresh):.1f}s after capture"
+            print(line)
+    
+    def report_latency(self, latencies) -> Dict:
+        """Print and return the capture-to-searchable latency summary."""
+        summary = latency_summary(latencies)
+        if summary['count']:
+            over = sum(1 for latency in latencies if latency > WATCH_LATENCY_TARGET)
+            print(f" Capture-to-searchable over {summary['count']} messages: p50 {summary['p50']:.1f}s, "
+                  f"p95 {summary['p95']:.1f}s, max {summary['max']:.1f}s "
+                  f"(target {WATCH_LATENCY_TARGET:g}s, {over} over)")
+        else:
+            print(" Capture-to-searchable: no new captures yet")
+        return summary
+    
+    def show_summary(self):
+        """Display summary of stored conversations (from the stats counters)."""
+        totals = read_stats(self.writer.conn)
         
-
         print("\n" + "=" * 60)
-
         print(" CURATOR SUMMARY")
-
         print("=" * 60)
-
-        print(f" Conversations: {conv_count}")
-
-        print(f" Messages: {msg_count}")
-
-        print(f" Total Characters: {total_chars:,}")
-
+        print(f" Conversations: {totals['conversations']}")
+        print(f" Messages: {totals['messages']}")
+        print(f" Total Characters: {totals['total_chars']:,}")
+        print(f" Distinct Bodies: {totals['blobs']} ({totals['blob_chars']:,} characters stored)")
+        shards = self.catalog.shards()
+        if shards:
+            print(f" Archived Shards: {len(shards)} monthly "
+                  f"({sum(s['conversations'] for s in shards)} conversations, "
+                  f"{sum(s['messages'] for s in shards)} messages)")
         print(f" Database: {self.db_path}")
-
         print("=" * 60)
-
-        
-
-        conn.close()
-
     
-
+    def show_migrations(self):
+        """List the schema migrations this database has been through."""
+        print("\n SCHEMA MIGRATIONS")
+        print("=" * 60)
+        for state in Migrator(self.writer.conn).history():
+            line = f"  {state['version']:>3}  {state['name']:<32} {state['status']:<9}"
+            if state['status'] != 'in place':
+                line += f" {state['rows']:>10,} rows {state['seconds']:8.1f}s"
+            print(line.rstrip())
+    
+    def recompute_stats(self):
+        """Rebuild the stats counters from the archive tables."""
+        recompute_stats(self.writer.conn)
+        self.writer.commit()
+        print(" Stats counters recomputed")
+    
+    def cleanup_blobs(self):
+        """Delete message bodies that no message references any more."""
+        removed = self.writer.delete_unreferenced_blobs()
+        self.writer.commit()
+        print(f" Removed {removed} unreferenced bodies")
+    
     def search_conversations(self, query: str, limit: int = 10):
-
-        """Search for conversations containing a query string."""
-
-        conn = sqlite3.connect(self.db_path)
-
-        cursor = conn.cursor()
-
-        
-
-        cursor.execute('''
-
-            SELECT c.session_id, c.start_time, m.role, m.content, m.timestamp
-
-            FROM messages m
-
-            JOIN conversations c ON m.conversation_id = c.id
-
-            WHERE m.content LIKE ?
-
-            ORDER BY m.timestamp DESC
-
-            LIMIT ?
-
-        ''', (f'%{query}%', limit))
-
+        """Search for conversations containing a query string (live database and shards)."""
+        results = []
+        for conn, bodies in self.iter_databases():
+            cursor = conn.execute('''
+                SELECT m.timestamp_ms, c.session_id, c.start_time, m.role, b.content, m.timestamp
+                FROM blobs_fts
+                JOIN blobs b ON b.id = blobs_fts.rowid
+                JOIN messages m ON m.blob_id = b.id
+                JOIN conversations c ON m.conversation_id = c.id
+                WHERE blobs_fts MATCH ?
+                ORDER BY m.timestamp_ms DESC
+                LIMIT ?
+            ''', (fts_query(query), limit))
+            results += [row[:4] + (bodies.decode(row[4]), row[5]) for row in cursor.fetchall()]
         
-
-        results = cursor.fetchall()
-
+        results.sort(key=lambda row: row[0] or 0, reverse=True)
+        results = results[:limit]
         
-
         if not results:
-
             print(f" No results found for '{query}'")
-
         else:
-
             print(f"\n Found {len(results)} results for '{query}'")
-
             print("=" * 60)
-
-            for session_id, start_time, role, content, timestamp in results:
-
+            for _, session_id, start_time, role, content, timestamp in results:
                 print(f"\n {timestamp}")
-
                 print(f" {role.upper()}")
-
                 preview = content[:200] + "..." if len(content) > 200 else content
-
                 print(f" {preview}")
-
                 print("-" * 60)
-
+    
+    def iter_databases(self) -> Iterator[tuple]:
+        """
+        (connection, body codec) for the live database, then each archived
+        shard, newest first. A shard's connection stays open until the
+        iteration moves past it.
+        """
+        yield self.writer.conn, self.writer.bodies
+        for shard in reversed(self.catalog.shards()):
+            conn = sqlite3.connect(shard_uri(shard['path'], shard['sealed']), uri=True)
+            try:
+                yield conn, BodyCodec(conn)
+            finally:
+                conn.close()
+    
+    def archive_shards(self, older_than_days: int):
+        """
+        Move every month that ended more than older_than_days ago out of the
+        live database into its own sealed shard (see curator.shards).
+        """
+        before_ms = int((time.time() - older_than_days * 86400) * 1000)
+        archived = []
+        for month in archivable_months(self.writer.conn, before_ms):
+            entry = archive_month(self.writer, self.catalog, month)
+            if entry:
+                archived.append(entry)
+                print(f" Archived {month}: {entry['conversations']} conversations, "
+                      f"{entry['messages']} messages -> {entry['path']}")
         
+        if archived:
+            # The live database only holds the open months now: merge away the
+            # FTS delete markers the move left, then give the pages back
+            self.writer.conn.execute("INSERT INTO blobs_fts(blobs_fts) VALUES ('optimize')")
+            self.writer.commit()
+            self.writer.conn.execute('VACUUM')
+        else:
+            print(" No months ready to archive")
+        return archived
 
-        conn.close()
 
 def main():
-
     """Main execution function."""
-
-
     
-
     # Default paths
-
     raw_logs_dir = Path(__file__).parent.parent / "logger" / "raw_logs"
-
     output_dir = Path(__file__).parent / "processed"
-
     
-
+    # Parallel extraction for the default action
+    args = sys.argv[1:]
+    workers = 1
+    if "--workers" in args:
+        i = args.index("--workers")
+        workers = int(args[i + 1]) if i + 1 < len(args) else 1
+        del args[i:i + 2]
+    
     # Initialize curator
-
-    curator = ClaudeCurator(str(raw_logs_dir), str(output_dir))
-
+    curator = ClaudeCurator(str(raw_logs_dir), str(output_dir), compressed_dir=str(COMPRESSED_DIR))
     
-
     # Check for command-line arguments
-
-    if len(sys.argv) > 1:
-
-        command = sys.argv[1]
-
+    if args:
+        command = args[0]
         
-
-        if command == "search" and len(sys.argv) > 2:
-
-            query = " ".join(sys.argv[2:])
-
+        if command == "search" and len(args) > 1:
+            query = " ".join(args[1:])
             curator.search_conversations(query)
-
-        elif command == "export" and len(sys.argv) > 2:
-
-            session_id = sys.argv[2]
-
+        elif command == "export" and len(args) > 1:
+            session_id = args[1]
             output_file = output_dir / f"{session_id}.json"
-
             curator.export_conversation_to_json(session_id, output_file)
-
+        elif command == "export-all" and len(args) > 1:
+            options = {}
+            for flag, key in (("--format", 'fmt'), ("--after", 'after_date'), ("--before", 'before_date')):
+                if flag in args[2:]:
+                    i = args.index(flag)
+                    options[key] = args[i + 1] if i + 1 < len(args) else None
+            curator.bulk_export(Path(args[1]), compress="--zlib" in args, workers=workers, **options)
+        elif command == "import" and len(args) > 1:
+            curator.bulk_import(Path(args[1]))
+        elif command == "cleanup":
+            curator.cleanup_blobs()
+        elif command == "train-dictionary":
+            curator.train_body_dictionary()
+        elif command == "shard":
+            days = int(args[1]) if len(args) > 1 else curator.shard_after_days
+            curator.archive_shards(days)
+        elif command == "watch":
+            curator.watch(float(args[1]) if len(args) > 1 else WATCH_POLL_INTERVAL)
+        elif command == "migrations":
+            curator.show_migrations()
+        elif command == "stats":
+            if "--recompute" in args:
+                curator.recompute_stats()
+            curator.show_summary()
         else:
-
             print("Usage:")
-
-            print("  python claude_curator.py              # Process all logs")
-
+            print("  python claude_curator.py [--workers N]  # Process all logs (N extract processes)")
             print("  python claude_curator.py search <query>  # Search conversations")
-
             print("  python claude_curator.py export <session_id>  # Export to JSON")
-
+            print("  python claude_curator.py [--workers N] export-all <file> [--format ndjson|binary] [--zlib]")
+            print("                           [--after YYYY-MM-DD] [--before YYYY-MM-DD]  # Stream the archive out")
+            print("  python claude_curator.py import <file>  # Load an export into this database")
+            print("  python claude_curator.py cleanup  # Drop unreferenced message bodies")
+            print("  python claude_curator.py train-dictionary  # Retrain the body compression dictionary")
+            print("  python claude_curator.py stats [--recompute]  # Show totals (rebuilding the counters first)")
+            print("  python claude_curator.py shard [days]  # Archive months that ended over N days ago")
+            print("  python claude_curator.py watch [seconds]  # Curate new captures as they are logged")
+            print("  python claude_curator.py migrations  # Show applied schema migrations and their durations")
     else:
-
         # Default action: process all logs
+        curator.process_all_logs(workers)
 
-        curator.process_all_logs()
 
 if __name__ == "__main__":
-
     main()
-
-    
-
-    def read_compressed_log(self, compressed_file: Path) -> List[str]:
-
-        """
-
-        Read and decompress a compressed log file on-the-fly.
-
-        Returns list of full text content for each capture.
-
-        """
-
-        try:
-
-            with open(compressed_file, 'r', encoding='utf-8') as f:
-
-                compressed_captures = [json.loads(line) for line in f if line.strip()]
-
-        except Exception as e:
-
-            print(f" Error reading compressed file: {e}")
-
-            return []
-
-        
-
-        # Decompress on-the-fly
-
-        decompressed_texts = []
-
-        previous_text = ''
-
-        
-
-        for compressed in compressed_captures:
-
-            diff_data = compressed['diff']
-
-            
-
-            # Reconstruct full text
-
-            if diff_data['type'] == 'full':
-
-                full_text = diff_data['content']
-
-            elif diff_data['type'] == 'identical':
-
-                full_text = previous_text
-
-            elif diff_data['type'] == 'delta':
-
-                # Reconstruct from delta
-
-                lines = previous_text.splitlines(keepends=True)
-
-                
-
-                for change in diff_data['changes']:
-
-                    op = change['op']
-
-                    
-
-                    if op == 'replace':
-
-                        start = change['old_start']
-
-                        end = change['old_end']
-
-                        lines[start:end] = change['new_lines']
-
-                    elif op == 'delete':
-
-                        start = change['old_start']
-
-                        end = change['old_end']
-
-                        del lines[start:end]
-
-                    elif op == 'insert':
-
-                        pos = change['position']
-
-                        lines[pos:pos] = change['new_lines']
-
-                
-
-                full_text = ''.join(lines)
-
-            else:
-
-                full_text = ''
-
-            
-
-            # Build reconstructed message
-
-            decompressed_texts.append({
-
-                'session_id': compressed['session_id'],
-
-                'timestamp': compressed['timestamp'],
-
-                'message_number': compressed['message_number'],
-
-                'text_hash': compressed['text_hash'],
-
-                'raw_text': full_text
-
-            })
-
-            
-
-            previous_text = full_text
-
-        
-
-        return decompressed_texts
-
-    
-
-    def parse_raw_log(self, log_file: Path) -> List[Dict]:
-
-        """Parse a raw JSONL log file (works with both raw and compressed)."""
-
-        
-
-        # Check if it's a compressed file
-
-        if 'compressed_' in log_file.name:
-
-            print(f"    Detected compressed file, decompressing on-the-fly...")
-
-            return self.read_compressed_log(log_file)
-
-        
-
-        # Regular raw file parsing (original code)
-
-        messages = []
-
-        
-
-        try:
-
-            with open(log_file, 'r', encoding='utf-8') as f:
-
-                for line in f:
-
-                    if line.strip():
-
-                        try:
-
-                            msg = json.loads(line)
-
-                            messages.append(msg)
-
-                        except json.JSONDecodeError as e:
-
-                            print(f"  Failed to parse line: {e}")
-
-                            continue
-
-        except Exception as e:
-
-            print(f" Error reading {log_file}: {e}")
-
-            return []
-
-        
-
-        return messages
-
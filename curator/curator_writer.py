@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Curator Writer - bulk, single-connection database writer
+
+Holds one persistent SQLite connection tuned for write throughput
+(WAL journal, synchronous=NORMAL, large page cache, in-memory temp
+store) and inserts messages in batches inside explicit transactions
+that span many batches. Messages arrive fully prepared (role and token
+estimate already computed by the curation pipeline), so the write path
+does nothing but SQL.
+
+Each batch is executemany'd into a TEMP staging table and then moved
+with two INSERT ... SELECTs: new bodies into the content-addressed blobs
+table, then the message rows pointing at them. The FTS5 sync trigger
+then fires inside one statement: FTS5 flushes its pending index data at
+every statement boundary, so row-at-a-time inserts would write a tiny
+index segment per message. Bodies already in the store are neither
+stored nor indexed again. With body compression on, bodies are encoded
+(see body_codec) before they are staged.
+
+With near-duplicate detection on, a message whose snapshot fingerprint is
+within near_duplicate_distance bits of one already stored for another
+conversation (candidates come from the banded SimHash indexes, see
+near_duplicates) is merged into it: the message's opening and closing
+runs of lines that conversation already holds, in the same order, around
+the matching message are dropped, and if nothing is left the message is
+skipped. This is what a Logger restart looks like - the new session's
+first capture replays the window the old session ended on. Lines in
+between are kept even when they occur in that window.
+"""
+
+import hashlib
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from curator.body_codec import BodyCodec
+from curator.near_duplicates import BANDS, band_sql, band_values, from_signed, hamming, overlap_span, to_signed
+
+
+DEFAULT_COMMIT_SIZE = 5000    # messages per transaction
+DEFAULT_CACHE_SIZE_KB = 65536  # 64 MB page cache
+
+WRITER_PRAGMAS = [
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA temp_store = MEMORY',
+]
+
+
+def content_digest(text: str) -> str:
+    """Blob key: sha256 of the message body."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def epoch_ms(timestamp: Optional[str]) -> Optional[int]:
+    """
+    Epoch milliseconds of an ISO-8601 timestamp, or None if unparsable.
+    A timestamp without an offset - the Logger's - is local time.
+    """
+    if not timestamp:
+        return None
+    try:
+        moment = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+    return int(moment.timestamp() * 1000)
+
+
+class CuratorWriter:
+    """
+    Owns the Curator's database connection.
+    
+    Writes accumulate in an open transaction; commit_if_due() commits once
+    commit_size messages are pending, commit() commits unconditionally.
+    The ingest ledger is written on the same connection, so a committed
+    ledger offset always matches the committed messages.
+    
+    near_duplicate_rows / near_duplicate_bytes count the messages skipped
+    and the bytes not written as near-duplicates of another conversation's.
+    """
+    
+    def __init__(self, db_path: Path, commit_size: int = DEFAULT_COMMIT_SIZE,
+                 cache_size_kb: int = DEFAULT_CACHE_SIZE_KB,
+                 near_duplicate_distance: Optional[int] = None, body_compression: str = 'none'):
+        self.db_path = Path(db_path)
+        self.commit_size = commit_size
+        self.pending = 0
+        
+        self.near_duplicate_distance = near_duplicate_distance
+        self.near_duplicate_rows = 0
+        self.near_duplicate_bytes = 0
+        
+        self.conn = sqlite3.connect(self.db_path)
+        for pragma in WRITER_PRAGMAS:
+            self.conn.execute(pragma)
+        self.conn.execute(f'PRAGMA cache_size = -{int(cache_size_kb)}')
+        
+        # Encodes new bodies; body_text() lets SQL (the FTS triggers) read them
+        self.bodies = BodyCodec(self.conn, body_compression)
+        self.bodies.register()
+        self.conn.create_function('epoch_ms', 1, epoch_ms, deterministic=True)
+        
+        self.conn.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS message_staging (
+                conversation_id INTEGER,
+                message_number INTEGER,
+                role TEXT,
+                body,
+                size INTEGER,
+                timestamp TEXT,
+                timestamp_ms INTEGER,
+                content_hash TEXT,
+                tokens_estimate INTEGER,
+                blob_hash TEXT,
+                simhash INTEGER
+            )
+        ''')
+        
+        self.near_duplicate_sql = f'''
+            SELECT simhash, conversation_id, message_number FROM messages
+            WHERE simhash IS NOT NULL AND conversation_id != ?
+              AND ({' OR '.join(f"{band_sql('simhash', band)} = ?" for band in range(BANDS))})
+        '''
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        self.close()
+    
+    def commit(self):
+        self.conn.commit()
+        self.pending = 0
+    
+    def commit_if_due(self):
+        if self.pending >= self.commit_size:
+            self.commit()
+    
+    def rollback(self):
+        self.conn.rollback()
+        self.pending = 0
+    
+    def close(self):
+        self.conn.close()
+    
+    # ------------------------------------------------------------------
+    # Messages
+    # ------------------------------------------------------------------
+    
+    def append_messages(self, session_id: str, messages: List[Dict]) -> int:
+        """
+        Append prepared messages to a conversation, creating it on first sight.
+        
+        Each message needs content, timestamp, content_hash, role and
+        tokens_estimate, and may carry a simhash. Messages whose content
+        hash is already stored for the conversation are skipped, and
+        near-duplicates of another conversation's are merged into it (see
+        module docstring). Returns the number inserted.
+        """
+        cursor = self.conn.cursor()
+        
+        cursor.execute('''
+            SELECT id, message_count, total_chars FROM conversations WHERE session_id = ?
+        ''', (session_id,))
+        existing = cursor.fetchone()
+        
+        if existing:
+            conversation_id, message_count, total_chars = existing
+            message_count = message_count or 0
+            total_chars = total_chars or 0
+            
+            cursor.execute('''
+                SELECT COALESCE(MAX(message_number), -1) + 1 FROM messages WHERE conversation_id = ?
+            ''', (conversation_id,))
+            next_number = cursor.fetchone()[0]
+        else:
+            if not messages:
+                return 0
+            
+            cursor.execute('''
+                INSERT INTO conversations (session_id, start_time, end_time, message_count, total_chars,
+                                           start_ms, end_ms)
+                VALUES (?, ?, ?, 0, 0, ?, ?)
+            ''', (session_id, messages[0]['timestamp'], messages[0]['timestamp'],
+                  epoch_ms(messages[0]['timestamp']), epoch_ms(messages[0]['timestamp'])))
+            conversation_id = cursor.lastrowid
+            message_count = 0
+            total_chars = 0
+            next_number = 0
+        
+        # One lookup for the whole batch instead of one per message
+        stored_hashes = set()
+        if existing:
+            hashes = list({msg['content_hash'] for msg in messages})
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                cursor.execute(f'''
+                    SELECT content_hash FROM messages
+                    WHERE conversation_id = ? AND content_hash IN ({','.join('?' * len(chunk))})
+                ''', (conversation_id, *chunk))
+                stored_hashes.update(row[0] for row in cursor.fetchall())
+        
+        inserted = []
+        for msg in messages:
+            if msg['content_hash'] in stored_hashes:
+                continue
+            stored_hashes.add(msg['content_hash'])
+            if msg.get('simhash') is not None and self.near_duplicate_distance is not None:
+                msg = self.merge_near_duplicate(conversation_id, msg)
+                if msg is None:
+                    continue
+            inserted.append(msg)
+        
+        if not inserted:
+            return 0
+        
+        # Stage the batch, then move it with one statement per table (see module docstring)
+        cursor.executemany('''
+            INSERT INTO message_staging (conversation_id, message_number, role, body, size, timestamp,
+                                         timestamp_ms, content_hash, tokens_estimate, blob_hash, simhash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (conversation_id, next_number + idx, msg['role'], self.bodies.encode(msg['content']),
+             len(msg['content']), msg['timestamp'], epoch_ms(msg['timestamp']),
+             msg['content_hash'], msg['tokens_estimate'],
+             content_digest(msg['content']),
+             to_signed(msg['simhash']) if msg.get('simhash') is not None else None)
+            for idx, msg in enumerate(inserted)
+        ])
+        cursor.execute('''
+            INSERT INTO blobs (hash, content, size)
+            SELECT blob_hash, body, size
+            FROM message_staging
+            WHERE true
+            ON CONFLICT(hash) DO NOTHING
+        ''')
+        cursor.execute('''
+            INSERT INTO messages (conversation_id, message_number, role, blob_id,
+                                  timestamp, content_hash, tokens_estimate, simhash, timestamp_ms)
+            SELECT s.conversation_id, s.message_number, s.role, b.id,
+                   s.timestamp, s.content_hash, s.tokens_estimate, s.simhash, s.timestamp_ms
+            FROM message_staging s
+            JOIN blobs b ON b.hash = s.blob_hash
+            ORDER BY s.rowid
+        ''')
+        cursor.execute('DELETE FROM message_staging')
+        
+        # Update conversation stats
+        new_chars = sum(len(msg['content']) for msg in inserted)
+        cursor.execute('''
+            UPDATE conversations
+            SET start_time = COALESCE(start_time, ?),
+                end_time = ?,
+                start_ms = COALESCE(start_ms, ?),
+                end_ms = ?,
+                message_count = ?,
+                total_chars = ?
+            WHERE id = ?
+        ''', (inserted[0]['timestamp'], inserted[-1]['timestamp'],
+              epoch_ms(inserted[0]['timestamp']), epoch_ms(inserted[-1]['timestamp']),
+              message_count + len(inserted), total_chars + new_chars, conversation_id))
+        
+        self.pending += len(inserted)
+        return len(inserted)
+    
+    def find_near_duplicate(self, conversation_id: int, fingerprint: int) -> Optional[tuple]:
+        """
+        The closest message of another conversation within
+        near_duplicate_distance bits, as (conversation_id, message_number).
+        """
+        best = None
+        cursor = self.conn.execute(self.near_duplicate_sql, (conversation_id, *band_values(fingerprint)))
+        for stored, other_id, message_number in cursor:
+            distance = hamming(from_signed(stored), fingerprint)
+            if distance <= self.near_duplicate_distance and (best is None or distance < best[0]):
+                best = (distance, other_id, message_number)
+        return best[1:] if best else None
+    
+    def merge_near_duplicate(self, conversation_id: int, msg: Dict) -> Optional[Dict]:
+        """
+        Drop the head and tail of msg that a near-duplicate conversation
+        already holds, line for line and in order. Returns the message to
+        store (msg itself if there is no near-duplicate) or None if nothing
+        new is left.
+        """
+        match = self.find_near_duplicate(conversation_id, msg['simhash'])
+        if match is None:
+            return msg
+        
+        # The matching snapshot's window: its turn and the turns before it,
+        # going back until they cover as many lines as this message holds,
+        # after the conversation's first turn (the only one holding chrome)
+        lines = msg['content'].split('\n')
+        turns = []
+        covered = 0
+        cursor = self.conn.execute('''
+            SELECT m.message_number, b.content FROM messages m JOIN blobs b ON b.id = m.blob_id
+            WHERE m.conversation_id = ? AND m.message_number <= ?
+            ORDER BY m.message_number DESC
+        ''', match)
+        for message_number, content in cursor:
+            turns.append(self.bodies.decode(content).split('\n'))
+            covered += len(turns[-1])
+            if covered >= len(lines):
+                break
+        cursor = self.conn.execute('''
+            SELECT b.content FROM messages m JOIN blobs b ON b.id = m.blob_id
+            WHERE m.conversation_id = ? AND m.message_number < ?
+            ORDER BY m.message_number LIMIT 1
+        ''', (match[0], message_number))
+        for (content,) in cursor:
+            turns.append(self.bodies.decode(content).split('\n'))
+        window = [line for turn in reversed(turns) for line in turn]
+        
+        head, tail = overlap_span(lines, window)
+        remainder = '\n'.join(lines[head:len(lines) - tail])
+        saved = len(msg['content'].encode('utf-8')) - len(remainder.encode('utf-8'))
+        self.near_duplicate_bytes += saved
+        if not remainder:
+            self.near_duplicate_rows += 1
+            return None
+        if not saved:
+            return msg
+        return dict(msg, content=remainder, tokens_estimate=len(remainder) // 4)
+    
+    def delete_unreferenced_blobs(self) -> int:
+        """Drop bodies no message points at any more. Returns the number removed."""
+        cursor = self.conn.execute('DELETE FROM blobs WHERE refcount <= 0')
+        self.pending += cursor.rowcount
+        return cursor.rowcount
+    
+    # ------------------------------------------------------------------
+    # Ingest ledger
+    # ------------------------------------------------------------------
+    
+    def get_ledger_entry(self, file_name: str) -> Optional[Dict]:
+        """Look up how far a log file has already been curated."""
+        cursor = self.conn.execute('''
+            SELECT byte_offset, last_message_number, inode, size, mtime, last_text_hash, last_snapshot
+            FROM ingest_ledger
+            WHERE file_name = ?
+        ''', (file_name,))
+        row = cursor.fetchone()
+        
+        if not row:
+            return None
+        
+        return {
+            'byte_offset': row[0],
+            'last_message_number': row[1],
+            'inode': row[2],
+            'size': row[3],
+            'mtime': row[4],
+            'last_text_hash': row[5],
+            'last_snapshot': row[6]
+        }
+    
+    def update_ledger_entry(self, file_name: str, progress: Dict, stat):
+        """
+        Record how far a log file has been curated (committed with the messages).
+        
+        progress is the pipeline's progress record: session_id, offset,
+        last_message_number, last_text_hash and last_snapshot. While a
+        near-duplicate is held (progress['held_from']) the entry stops
+        where that capture starts, since it is not stored yet, and records
+        only that much of the file as curated.
+        """
+        size = stat.st_size
+        if progress.get('held_from'):
+            progress = {**progress, **progress['held_from']}
+            size = progress['offset']
+        self.conn.execute('''
+            INSERT INTO ingest_ledger (file_name, session_id, byte_offset, last_message_number,
+                                       inode, size, mtime, last_text_hash, last_snapshot, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(file_name) DO UPDATE SET
+                session_id = COALESCE(excluded.session_id, session_id),
+                byte_offset = excluded.byte_offset,
+                last_message_number = COALESCE(excluded.last_message_number, last_message_number),
+                inode = excluded.inode,
+                size = excluded.size,
+                mtime = excluded.mtime,
+                last_text_hash = COALESCE(excluded.last_text_hash, last_text_hash),
+                last_snapshot = COALESCE(excluded.last_snapshot, last_snapshot),
+                updated_at = CURRENT_TIMESTAMP
+        ''', (file_name, progress['session_id'], progress['offset'], progress['last_message_number'],
+              stat.st_ino, size, stat.st_mtime, progress['last_text_hash'],
+              progress.get('last_snapshot')))
@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FTS - full-text query building shared by the curator and the query tools
+
+Kept apart from claude_curator so readers (query_tools) can build MATCH
+expressions without importing the whole curator.
+"""
+
+
+def fts_query(text: str) -> str:
+    """
+    Turn free-form search text into an FTS5 MATCH expression.
+    
+    The text is matched as a phrase (words in order, punctuation ignored),
+    and the last word is treated as a prefix so partial words still hit,
+    much like the old LIKE '%query%' search did.
+    """
+    phrase = '"' + text.strip().replace('"', '""') + '"'
+    return phrase + ' *' if text.strip() else phrase
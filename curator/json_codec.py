@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON Codec - one JSONL line format, encoded by the fastest library installed
+
+Raw logs, compressed logs and NDJSON exports are read and written through
+a codec instead of calling json directly:
+
+- JsonCodec: the standard library. Defines the line format - compact
+  separators, ASCII only (everything else \\u-escaped) - so files stay
+  7-bit clean whatever the conversation contains.
+- OrjsonCodec: orjson, when installed. Decodes straight from the mapped
+  memoryviews JsonlReader hands out and encodes several times faster.
+  Its output is brought to the same bytes as JsonCodec (non-ASCII
+  escaped the way json escapes it); the records it would spell
+  differently - floats orjson formats unlike repr(), NaN and infinities,
+  integers beyond 64 bits - are handed to JsonCodec instead.
+
+Output is therefore byte-identical whichever codec wrote it, and either
+codec reads anything the other wrote, including the older ", "-separated
+lines.
+
+get_codec() picks the codec: 'auto' (orjson if installed, else json),
+'orjson' or 'json'. loads_many() and dumps_lines() work on many lines per
+call, which is where the stdlib decoder gains most.
+"""
+
+import json
+import re
+from typing import Any, Iterable, List, Sequence, Union
+
+from config import JSON_CODEC
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+JSON_CODECS = ('auto', 'orjson', 'json')
+
+# json.dumps() builds a new encoder per call when given options - keep one
+_ENCODER = json.JSONEncoder(ensure_ascii=True, separators=(',', ':'))
+_NOT_ASCII = re.compile('[^\x00-\x7e]')
+
+
+def _floats_spelled_like_repr(obj: Any) -> bool:
+    """
+    False if obj holds a float orjson writes unlike repr() - outside
+    [1e-4, 1e16) it picks a different notation (0.00005 vs 5e-05, 1e16 vs
+    1e+16), and NaN / infinities become null. Walking the record is far
+    cheaper than scanning the encoded line for them.
+    """
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+        elif isinstance(item, float) and not (1e-4 <= abs(item) < 1e16 or item == 0.0):
+            return False
+    return True
+
+
+def _escape(match) -> str:
+    """json's \\u escape of one character (astral characters as a surrogate pair)."""
+    n = ord(match.group())
+    if n < 0x10000:
+        return '\\u%04x' % n
+    n -= 0x10000
+    return '\\u%04x\\u%04x' % (0xd800 | (n >> 10), 0xdc00 | (n & 0x3ff))
+
+
+class JsonCodec:
+    """The standard library's json - the reference line format."""
+    
+    name = 'json'
+    
+    def dumps(self, obj: Any) -> bytes:
+        """One record as a line (without its newline)."""
+        return _ENCODER.encode(obj).encode('ascii')
+    
+    def dumps_lines(self, objs: Iterable[Any]) -> bytes:
+        """Many records as newline-terminated lines."""
+        encode = _ENCODER.encode
+        return b''.join([(encode(obj) + '\n').encode('ascii') for obj in objs])
+    
+    def loads(self, data: Union[bytes, memoryview, str]) -> Any:
+        if isinstance(data, memoryview):
+            data = str(data, 'utf-8')  # json.loads takes no buffers
+        return json.loads(data)
+    
+    def loads_many(self, lines: Sequence[Union[bytes, memoryview]]) -> List[Any]:
+        """
+        Decode many lines in one call, as one JSON array. Raises ValueError
+        if any line is not a single JSON value (the caller then decodes
+        line by line to find it).
+        """
+        if not lines:
+            return []
+        records = json.loads(b'[' + b','.join(lines) + b']')
+        if len(records) != len(lines):
+            raise ValueError("Lines do not hold one JSON value each")
+        return records
+
+
+class OrjsonCodec(JsonCodec):
+    """orjson, producing JsonCodec's bytes."""
+    
+    name = 'orjson'
+    
+    def dumps(self, obj: Any) -> bytes:
+        if not _floats_spelled_like_repr(obj):
+            return super().dumps(obj)
+        try:
+            data = orjson.dumps(obj)
+        except orjson.JSONEncodeError:  # integers beyond 64 bits, lone surrogates, non-str keys
+            return super().dumps(obj)
+        if not data.isascii() or b'\x7f' in data:
+            data = _NOT_ASCII.sub(_escape, data.decode('utf-8')).encode('ascii')
+        return data
+    
+    def dumps_lines(self, objs: Iterable[Any]) -> bytes:
+        dumps = self.dumps
+        return b''.join([dumps(obj) + b'\n' for obj in objs])
+    
+    def loads(self, data: Union[bytes, memoryview, str]) -> Any:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:  # json also accepts escaped lone surrogates
+            return super().loads(data)
+    
+    def loads_many(self, lines: Sequence[Union[bytes, memoryview]]) -> List[Any]:
+        """Line by line (orjson parses the mapped bytes in place); raises at the first bad line."""
+        loads = orjson.loads
+        return [loads(line) for line in lines]
+
+
+def get_codec(name: str = JSON_CODEC) -> JsonCodec:
+    """The codec called name ('auto', 'orjson' or 'json'); by default the configured one."""
+    if name not in JSON_CODECS:
+        raise ValueError(f"Unknown JSON codec: {name} (expected one of {JSON_CODECS})")
+    if name == 'json' or orjson is None:
+        if name == 'orjson':
+            raise ValueError("JSON codec 'orjson' requested but orjson is not installed")
+        return JsonCodec()
+    return OrjsonCodec()
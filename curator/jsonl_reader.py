@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSONL Reader - memory-mapped line reader shared by the curator and compressor
+
+Session logs reach hundreds of MB. Reading them through a text-mode file
+object builds a str per line in the io layer before json ever sees it.
+JsonlReader maps the file instead, finds each newline with mmap.find
+(a memchr over the mapping, no copy) and hands out memoryview slices of
+the mapping. records() passes them to the JSON codec a batch at a time
+(see json_codec): orjson parses the mapped bytes in place, the stdlib
+decoder parses a whole batch as one array.
+
+Two modes:
+- full file (offset 0, complete_only=False): every line, including a
+  last line without a newline - the compressor's view of a finished log.
+- from a byte offset with complete_only=True: only newline-terminated
+  lines, so a line the Logger is still writing is left for the next run -
+  the curator's incremental ingest.
+
+reader.offset always points just past the last line consumed (blank
+lines included), ready to be stored and passed back in next time.
+"""
+
+import mmap
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from curator.json_codec import JsonCodec, get_codec
+
+
+WHITESPACE = b' \t\r\n'
+BATCH_BYTES = 64 * 1024  # line bytes decoded per codec call
+BATCH_LINES = 1000
+
+
+class JsonlReader:
+    """
+    Stream the lines of a JSONL file from a memory mapping.
+    
+    Yielded memoryviews point into the mapping and are released once the
+    batch they came in is done (for lines(), when the next batch is read) -
+    decode or copy them before that; a view kept longer raises ValueError
+    when used.
+    """
+    
+    def __init__(self, path: Path, offset: int = 0, complete_only: bool = False,
+                 codec: Optional[JsonCodec] = None):
+        self.path = Path(path)
+        self.offset = offset
+        self.complete_only = complete_only
+        self.codec = codec or get_codec()
+    
+    def batches(self, max_bytes: int = BATCH_BYTES,
+                max_lines: int = BATCH_LINES) -> Iterator[List[Tuple[int, memoryview]]]:
+        """
+        Non-blank lines from self.offset on, without their newline, grouped
+        into lists of (end offset, line). self.offset is left past the last
+        line scanned once the file is exhausted; consumers advance it per
+        line as they go.
+        """
+        with open(self.path, 'rb') as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return  # empty file: nothing to map
+            
+            with mm:
+                view = memoryview(mm)
+                batch: List[Tuple[int, memoryview]] = []
+                try:
+                    size = len(mm)
+                    pos = self.offset
+                    batch_bytes = 0
+                    while pos < size:
+                        newline = mm.find(b'\n', pos)
+                        if newline < 0:
+                            if self.complete_only:
+                                break
+                            newline = size
+                        line = view[pos:newline]
+                        pos = min(newline + 1, size)
+                        # JSON lines start with '{' - only whitespace-led lines need the blank check
+                        if not line or (line[0] in WHITESPACE and not bytes(line).strip()):
+                            line.release()
+                            continue
+                        
+                        batch.append((pos, line))
+                        batch_bytes += len(line)
+                        if batch_bytes >= max_bytes or len(batch) >= max_lines:
+                            yield batch
+                            self._release(batch)
+                            batch_bytes = 0
+                    
+                    if batch:
+                        yield batch
+                        self._release(batch)
+                    self.offset = max(self.offset, pos)
+                finally:
+                    self._release(batch)
+                    view.release()
+    
+    @staticmethod
+    def _release(batch: List[Tuple[int, memoryview]]):
+        for _, line in batch:
+            line.release()
+        batch.clear()
+    
+    def lines(self) -> Iterator[memoryview]:
+        """Non-blank lines from self.offset on, one at a time."""
+        for batch in self.batches():
+            for end, line in batch:
+                self.offset = end
+                yield line
+    
+    def records(self, on_error: Optional[Callable[[ValueError], None]] = None) -> Iterator[Any]:
+        """
+        Decoded records, a batch per codec call. A line that fails to decode
+        raises, or is passed to on_error and skipped.
+        """
+        for batch in self.batches():
+            try:
+                records = self.codec.loads_many([line for _, line in batch])
+            except ValueError:
+                records = None  # find the bad line(s) one at a time
+            
+            for n, (end, line) in enumerate(batch):
+                if records is not None:
+                    record = records[n]
+                else:
+                    try:
+                        record = self.codec.loads(line)
+                    except ValueError as e:  # JSONDecodeError, UnicodeDecodeError
+                        if on_error is None:
+                            raise
+                        self.offset = end
+                        on_error(e)
+                        continue
+                self.offset = end
+                yield record
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Schema Migrations - versioned, resumable changes to the curator database
+
+init_database() creates the tables a new database starts with. Everything
+that changes an existing database - added columns and their backfills,
+indexes, triggers, the FTS index - is a numbered Migration, applied in
+order at curator startup and recorded in schema_migrations:
+
+- a plain step (a function of the connection) runs in one transaction
+  together with the record of its completion, so it has either happened
+  or will run again;
+- a Batched step (backfilling a column, populating an FTS table) walks
+  its table's rowids up to the high-water mark taken when it started,
+  batch_rows ids per transaction, saving its cursor in the same
+  transaction. An interrupted migration resumes at the next chunk. The
+  write lock is only held for one chunk, with a short pause before the
+  next so other writers get a turn, and the query tools read on
+  throughout (WAL readers never wait for the writer).
+
+Each migration's status, rows touched and duration (summed over resumed
+runs) stay in schema_migrations; `claude_curator.py migrations` lists
+them. A migration whose change is already in place when first seen - a
+new database, or one curated before migrations were versioned - is
+recorded as 'in place' without running.
+
+New schema changes go at the end of MIGRATIONS with the next version;
+released migrations are never edited.
+"""
+
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence
+
+from curator.curator_writer import content_digest
+from curator.near_duplicates import BANDS, band_sql
+
+
+MIGRATION_BATCH_ROWS = 5000  # rowids per transaction in batched steps
+MIGRATION_PAUSE = 0.05       # seconds between chunks, so waiting writers get the lock
+
+MIGRATIONS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT,
+        status TEXT,             -- running, done or in place
+        step INTEGER DEFAULT 0,  -- steps completed
+        cursor INTEGER,          -- batched step: last rowid done
+        high_water INTEGER,      -- batched step: last rowid it covers
+        rows INTEGER DEFAULT 0,  -- rows touched by batched steps
+        seconds REAL DEFAULT 0,  -- time spent, summed over resumed runs
+        started_at TEXT,
+        finished_at TEXT
+    )
+'''
+STATE_COLUMNS = ('version', 'name', 'status', 'step', 'cursor', 'high_water', 'rows', 'seconds',
+                 'started_at', 'finished_at')
+
+
+class Batched:
+    """
+    A step run in rowid chunks: sql takes the chunk's (low, high] bounds as
+    its two parameters and touches only rows of table with low < key <= high.
+    """
+    
+    def __init__(self, table: str, sql: str, key: str = 'id'):
+        self.table = table
+        self.sql = sql
+        self.key = key
+
+
+class Migration:
+    """
+    One schema version: its steps, run in order, and optionally
+    applies(conn) - whether the change still has to be made when the
+    migration is first seen (None: always run; steps must then be
+    harmless on a database that already has the change).
+    """
+    
+    def __init__(self, version: int, name: str, steps: Sequence,
+                 applies: Optional[Callable[[sqlite3.Connection], bool]] = None):
+        self.version = version
+        self.name = name
+        self.steps = list(steps)
+        self.applies = applies
+
+
+def columns(conn: sqlite3.Connection, table: str) -> set:
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def statements(*sql: str) -> Callable[[sqlite3.Connection], None]:
+    """A plain step running each statement in turn."""
+    def step(conn: sqlite3.Connection):
+        for statement in sql:
+            conn.execute(statement)
+    return step
+
+
+def fts_over_blob_text(conn: sqlite3.Connection) -> bool:
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'blobs_fts'").fetchone()
+    return row is not None and "content='blob_text'" in row[0]
+
+
+MIGRATIONS = [
+    # Ledgers written before segmentation don't remember the last snapshot
+    Migration(1, 'ingest ledger snapshot', [
+        statements('ALTER TABLE ingest_ledger ADD COLUMN last_snapshot TEXT'),
+    ], applies=lambda conn: 'last_snapshot' not in columns(conn, 'ingest_ledger')),
+    
+    # Databases curated before the blob store kept bodies in messages.content.
+    # The old per-message FTS index and its triggers reference the column;
+    # blobs_fts is built from the blobs by migration 9.
+    Migration(2, 'blob store', [
+        statements('DROP TRIGGER IF EXISTS messages_fts_insert',
+                   'DROP TRIGGER IF EXISTS messages_fts_delete',
+                   'DROP TRIGGER IF EXISTS messages_fts_update',
+                   'DROP TABLE IF EXISTS messages_fts',
+                   'DROP INDEX IF EXISTS idx_content',
+                   'ALTER TABLE messages ADD COLUMN blob_id INTEGER REFERENCES blobs(id)'),
+        Batched('messages', '''
+            INSERT INTO blobs (hash, content, size, refcount)
+            SELECT sha256(content), content, length(content), COUNT(*)
+            FROM messages
+            WHERE id > ? AND id <= ? AND content IS NOT NULL
+            GROUP BY sha256(content)
+            ON CONFLICT(hash) DO UPDATE SET refcount = refcount + excluded.refcount
+        '''),
+        Batched('messages', '''
+            UPDATE messages SET blob_id = (SELECT id FROM blobs WHERE hash = sha256(messages.content))
+            WHERE id > ? AND id <= ? AND content IS NOT NULL
+        '''),
+        statements('ALTER TABLE messages DROP COLUMN content'),
+    ], applies=lambda conn: 'content' in columns(conn, 'messages')),
+    
+    # ...and before near-duplicate detection had no fingerprints
+    Migration(3, 'message simhash', [
+        statements('ALTER TABLE messages ADD COLUMN simhash INTEGER'),
+    ], applies=lambda conn: 'simhash' not in columns(conn, 'messages')),
+    
+    # ...and before integer timestamps: add and backfill them (local time, see epoch_ms)
+    Migration(4, 'message timestamp_ms', [
+        statements('ALTER TABLE messages ADD COLUMN timestamp_ms INTEGER'),
+        Batched('messages', '''
+            UPDATE messages SET timestamp_ms = epoch_ms(timestamp)
+            WHERE id > ? AND id <= ? AND timestamp IS NOT NULL
+        '''),
+    ], applies=lambda conn: 'timestamp_ms' not in columns(conn, 'messages')),
+    
+    Migration(5, 'conversation start_ms / end_ms', [
+        statements('ALTER TABLE conversations ADD COLUMN start_ms INTEGER',
+                   'ALTER TABLE conversations ADD COLUMN end_ms INTEGER'),
+        Batched('conversations', '''
+            UPDATE conversations SET start_ms = epoch_ms(start_time), end_ms = epoch_ms(end_time)
+            WHERE id > ? AND id <= ?
+        '''),
+    ], applies=lambda conn: 'start_ms' not in columns(conn, 'conversations')),
+    
+    # Covering indexes for the hot reads, so they never touch the table:
+    # a conversation in order, the most recent messages, conversations by date
+    Migration(6, 'covering indexes', [
+        statements('DROP INDEX IF EXISTS idx_timestamp', 'DROP INDEX IF EXISTS idx_conversation'),
+        statements('''
+            CREATE INDEX IF NOT EXISTS idx_conversation_order
+            ON messages(conversation_id, message_number, role, blob_id, timestamp)
+        '''),
+        statements('''
+            CREATE INDEX IF NOT EXISTS idx_recent_messages
+            ON messages(timestamp_ms, conversation_id, role, blob_id, timestamp)
+        '''),
+        statements('''
+            CREATE INDEX IF NOT EXISTS idx_conversations_by_start
+            ON conversations(start_ms, session_id, message_count, start_time, end_time)
+        '''),
+        statements('CREATE INDEX IF NOT EXISTS idx_conversation_hash ON messages(conversation_id, content_hash)'),
+        statements('CREATE INDEX IF NOT EXISTS idx_blob ON messages(blob_id)'),
+    ]),
+    
+    # One expression index per SimHash band for near-duplicate candidate lookup
+    Migration(7, 'simhash band indexes', [
+        statements(f'''
+            CREATE INDEX IF NOT EXISTS idx_simhash_band{band}
+            ON messages({band_sql('simhash', band)}) WHERE simhash IS NOT NULL
+        ''') for band in range(BANDS)
+    ]),
+    
+    # Blob reference counts follow the messages that point at them
+    Migration(8, 'blob refcount triggers', [
+        statements('''
+            CREATE TRIGGER IF NOT EXISTS messages_blob_ref AFTER INSERT ON messages BEGIN
+                UPDATE blobs SET refcount = refcount + 1 WHERE id = new.blob_id;
+            END
+        ''', '''
+            CREATE TRIGGER IF NOT EXISTS messages_blob_unref AFTER DELETE ON messages BEGIN
+                UPDATE blobs SET refcount = refcount - 1 WHERE id = old.blob_id;
+            END
+        ''', '''
+            CREATE TRIGGER IF NOT EXISTS messages_blob_move AFTER UPDATE OF blob_id ON messages BEGIN
+                UPDATE blobs SET refcount = refcount - 1 WHERE id = old.blob_id;
+                UPDATE blobs SET refcount = refcount + 1 WHERE id = new.blob_id;
+            END
+        '''),
+    ]),
+    
+    # Full-text index over distinct bodies (external content: text is read
+    # through blob_text, so compressed bodies are indexed and snippeted too).
+    # Replaces one indexed straight from blobs before bodies could be compressed.
+    # Blobs are immutable, so only inserts and deletes need syncing; the
+    # triggers exist before the backfill, which covers the blobs up to then.
+    Migration(9, 'blob full-text index', [
+        statements('DROP TRIGGER IF EXISTS blobs_fts_insert',
+                   'DROP TRIGGER IF EXISTS blobs_fts_delete',
+                   'DROP TABLE IF EXISTS blobs_fts',
+                   '''
+            CREATE VIRTUAL TABLE blobs_fts USING fts5(
+                content,
+                content='blob_text',
+                content_rowid='id'
+            )
+        ''', '''
+            CREATE TRIGGER blobs_fts_insert AFTER INSERT ON blobs BEGIN
+                INSERT INTO blobs_fts(rowid, content) VALUES (new.id, body_text(new.content));
+            END
+        ''', '''
+            CREATE TRIGGER blobs_fts_delete AFTER DELETE ON blobs BEGIN
+                INSERT INTO blobs_fts(blobs_fts, rowid, content) VALUES ('delete', old.id, body_text(old.content));
+            END
+        '''),
+        Batched('blobs', '''
+            INSERT INTO blobs_fts(rowid, content)
+            SELECT id, body_text(content) FROM blobs WHERE id > ? AND id <= ?
+        '''),
+    ], applies=lambda conn: not fts_over_blob_text(conn)),
+]
+
+
+class Migrator:
+    """
+    Apply pending migrations to a curator database.
+    
+    conn is the CuratorWriter's connection: migrations use the SQL
+    functions it registers (body_text, epoch_ms).
+    """
+    
+    def __init__(self, conn: sqlite3.Connection, migrations: Sequence[Migration] = MIGRATIONS,
+                 batch_rows: int = MIGRATION_BATCH_ROWS, pause: float = MIGRATION_PAUSE, verbose: bool = True):
+        self.conn = conn
+        self.migrations = sorted(migrations, key=lambda migration: migration.version)
+        self.batch_rows = batch_rows
+        self.pause = pause
+        self.verbose = verbose
+        self._clock = 0.0
+        
+        conn.create_function('sha256', 1, content_digest, deterministic=True)
+    
+    def history(self) -> List[Dict]:
+        """Every recorded migration, by version."""
+        self.conn.execute(MIGRATIONS_SCHEMA)
+        rows = self.conn.execute(f'SELECT {", ".join(STATE_COLUMNS)} FROM schema_migrations ORDER BY version')
+        return [dict(zip(STATE_COLUMNS, row)) for row in rows]
+    
+    def migrate(self) -> List[Dict]:
+        """Run (or resume) every migration not yet done; returns their final records."""
+        self.conn.commit()
+        recorded = {state['version']: state for state in self.history()}
+        applied = []
+        
+        for migration in self.migrations:
+            state = recorded.get(migration.version)
+            if state is not None and state['status'] != 'running':
+                continue
+            
+            if state is None:
+                now = datetime.now().isoformat()
+                status = 'running'
+                if migration.applies is not None and not migration.applies(self.conn):
+                    status = 'in place'
+                self.conn.execute('''
+                    INSERT INTO schema_migrations (version, name, status, started_at, finished_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (migration.version, migration.name, status, now, None if status == 'running' else now))
+                self.conn.commit()
+                if status != 'running':
+                    continue
+                state = {column: None for column in STATE_COLUMNS}
+                state.update(version=migration.version, name=migration.name, status=status,
+                             step=0, rows=0, seconds=0.0)
+            
+            self.run(migration, state)
+            applied.append(state)
+        
+        return applied
+    
+    def run(self, migration: Migration, state: Dict):
+        """Run a migration's remaining steps from its recorded state."""
+        resumed = state['step'] > 0 or state['cursor'] is not None
+        if self.verbose:
+            print(f" {'Resuming' if resumed else 'Running'} schema migration "
+                  f"{migration.version} ({migration.name})...")
+        
+        self._clock = time.perf_counter()
+        for index in range(state['step'], len(migration.steps)):
+            step = migration.steps[index]
+            if isinstance(step, Batched):
+                self.run_batched(step, state)
+                with self.transaction():
+                    self.save(state, step=index + 1, cursor=None, high_water=None)
+            else:
+                with self.transaction():
+                    step(self.conn)
+                    self.save(state, step=index + 1)
+        
+        with self.transaction():
+            self.save(state, status='done', finished_at=datetime.now().isoformat())
+        if self.verbose:
+            print(f" Schema migration {migration.version} done: {state['rows']:,} rows "
+                  f"in {state['seconds']:.1f}s")
+    
+    def run_batched(self, step: Batched, state: Dict):
+        """Walk the step's rowid range a chunk per transaction, from the saved cursor."""
+        if state['cursor'] is None:
+            high_water = self.conn.execute(f'SELECT MAX({step.key}) FROM {step.table}').fetchone()[0]
+            with self.transaction():
+                self.save(state, cursor=0, high_water=high_water or 0)
+        
+        while state['cursor'] < state['high_water']:
+            high = min(state['cursor'] + self.batch_rows, state['high_water'])
+            with self.transaction():
+                touched = self.conn.execute(step.sql, (state['cursor'], high)).rowcount
+                self.save(state, cursor=high, rows=state['rows'] + max(touched, 0))
+            if state['cursor'] < state['high_water']:
+                # SQLite's busy handler polls with growing sleeps: without a
+                # gap it keeps missing the moment between two chunks
+                time.sleep(self.pause)
+    
+    def save(self, state: Dict, **changes):
+        """Record progress (and the time spent since the last save) in the open transaction."""
+        now = time.perf_counter()
+        changes['seconds'] = state['seconds'] + (now - self._clock)
+        self._clock = now
+        state.update(changes)
+        assignments = ', '.join(f'{name} = ?' for name in changes)
+        self.conn.execute(f'UPDATE schema_migrations SET {assignments} WHERE version = ?',
+                          (*changes.values(), state['version']))
+    
+    @contextmanager
+    def transaction(self):
+        """One explicit transaction (so DDL is rolled back with the rest on failure)."""
+        self.conn.execute('BEGIN')
+        try:
+            yield
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Near-Duplicate Detection - SimHash fingerprints for capture snapshots
+
+A capture that differs from the previous one only by a blinking cursor,
+a relative timestamp or a nudge of the scroll position has a different
+text_hash, so exact dedupe lets it through. Each (noise-filtered)
+snapshot gets a 64-bit SimHash over its shingled lines - windows of
+SHINGLE_LINES consecutive lines - and snapshots whose fingerprints are
+within max_distance bits of each other count as near-duplicates.
+
+Lookups across sessions are banded: the fingerprint is cut into BANDS
+bands of BAND_BITS bits, each backed by an expression index, and only
+fingerprints sharing at least one band are compared. With four 16-bit
+bands every fingerprint within 3 bits is found (pigeonhole); larger
+distances are found on a best-effort basis.
+
+Shingles are weighted by their length, so a short line that flickers
+(a cursor, "2 minutes ago") moves the fingerprint less than a paragraph
+of new text. SimHash itself is computed without a per-bit loop: each
+shingle's hash is spread into one counter field per bit of a single big
+integer (cached per shingle, and shingles repeat from snapshot to
+snapshot), so a snapshot's weighted bit counts are a plain sum of
+integers.
+"""
+
+import hashlib
+from functools import lru_cache
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+
+FINGERPRINT_BITS = 64
+BANDS = 4
+BAND_BITS = FINGERPRINT_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+SHINGLE_LINES = 2             # consecutive lines per shingle
+FEATURE_CACHE_SIZE = 65536    # distinct shingles remembered
+
+_FIELD_BITS = 32              # counter width per fingerprint bit
+_FIELD_MASK = (1 << _FIELD_BITS) - 1
+_SIGN_BIT = 1 << (FINGERPRINT_BITS - 1)
+
+# byte value -> its 8 bits spread one per counter field
+_SPREAD_BYTE = [
+    sum(((value >> bit) & 1) << (_FIELD_BITS * bit) for bit in range(8))
+    for value in range(256)
+]
+
+
+def max_distance_for(threshold: Optional[float]) -> Optional[int]:
+    """
+    Convert a similarity threshold (fraction of matching fingerprint bits)
+    into a Hamming distance. None, <= 0 or > 1 disables detection.
+    """
+    if threshold is None or threshold <= 0 or threshold > 1:
+        return None
+    return int((1 - threshold) * FINGERPRINT_BITS + 1e-9)
+
+
+def shingles(lines: Sequence[str], size: int = SHINGLE_LINES) -> List[str]:
+    """Windows of `size` consecutive lines (the whole text if it is shorter)."""
+    if len(lines) <= size:
+        return ['\n'.join(lines)] if lines else []
+    return ['\n'.join(lines[i:i + size]) for i in range(len(lines) - size + 1)]
+
+
+@lru_cache(maxsize=FEATURE_CACHE_SIZE)
+def feature_vector(feature: str) -> int:
+    """A feature's 64-bit hash with every bit in its own counter field."""
+    digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+    vector = 0
+    for index, value in enumerate(digest):
+        vector |= _SPREAD_BYTE[value] << (_FIELD_BITS * 8 * index)
+    return vector
+
+
+def simhash(features: Iterable[str]) -> int:
+    """
+    64-bit SimHash: bit i is set if the features whose hashes have bit i
+    set outweigh those that don't (each feature weighs its length).
+    """
+    total = 0
+    weight = 0
+    for feature in features:
+        total += feature_vector(feature) * len(feature)
+        weight += len(feature)
+    
+    fingerprint = 0
+    half = weight // 2
+    for bit in range(FINGERPRINT_BITS):
+        if (total >> (_FIELD_BITS * bit)) & _FIELD_MASK > half:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def snapshot_fingerprint(lines: Sequence[str]) -> int:
+    """SimHash of a filtered snapshot's shingled lines."""
+    return simhash(shingles(lines))
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def to_signed(fingerprint: int) -> int:
+    """Fingerprint as SQLite's signed 64-bit INTEGER."""
+    return fingerprint - (1 << FINGERPRINT_BITS) if fingerprint & _SIGN_BIT else fingerprint
+
+
+def from_signed(value: int) -> int:
+    """Inverse of to_signed()."""
+    return value & ((1 << FINGERPRINT_BITS) - 1)
+
+
+def _longest_run(lines: Sequence[str], window: Sequence[str]) -> int:
+    """Length of the longest prefix of lines found as consecutive lines of window."""
+    best = 0
+    for start, line in enumerate(window):
+        if line != lines[0]:
+            continue
+        n = 1
+        while n < len(lines) and start + n < len(window) and window[start + n] == lines[n]:
+            n += 1
+        best = max(best, n)
+        if best == len(lines):
+            break
+    return best
+
+
+def overlap_span(lines: Sequence[str], window: Sequence[str]) -> Tuple[int, int]:
+    """
+    Lengths of the head and tail of lines that a near-duplicate's window
+    already holds: the longest prefix, then the longest suffix of what is
+    left, each found as a run of consecutive window lines. Lines in between
+    are new even if they occur somewhere in the window.
+    """
+    if not lines:
+        return 0, 0
+    head = _longest_run(lines, window)
+    rest = lines[head:]
+    tail = _longest_run(rest[::-1], window[::-1]) if rest else 0
+    return head, tail
+
+
+def band_values(fingerprint: int) -> List[int]:
+    """The fingerprint's bands, lowest bits first."""
+    return [(fingerprint >> (BAND_BITS * band)) & BAND_MASK for band in range(BANDS)]
+
+
+def band_sql(column: str, band: int) -> str:
+    """SQL expression for one band of a signed fingerprint column (index-matching)."""
+    return f"(({column} >> {BAND_BITS * band}) & {BAND_MASK})"
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Noise Filter - UI chrome detection for the Curator
+
+Claude Desktop captures repeat the same sidebar, title-bar and footer
+lines in nearly every snapshot. Instead of running each noise regex
+separately on every line, the pattern list is compiled once:
+
+- patterns that are plain literal alternations, like ^(New chat|Chats),
+  become a single str.startswith() prefix tuple (anchored) or substring
+  checks (unanchored) on the lowercased line
+- anything else is folded into one combined regex alternation
+
+Decisions for recently seen lines are kept in a bounded LRU, so repeated
+chrome is rejected with a dict lookup.
+"""
+
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+
+# Built-in patterns for Claude Desktop UI elements
+DEFAULT_NOISE_PATTERNS = [
+    r'^(New chat|Chats|Projects|Artifacts|Code|Starred)',
+    r'^(Chrome Legacy Window|Minimize|Restore|Close)',
+    r'^(Sidebar|Home|Claude)',
+    r'^(How can I help you today\?)',
+    r'^(Claude can make mistakes)',
+    r'(Notifications|Project content)',
+]
+
+DEFAULT_CACHE_SIZE = 8192  # distinct lines remembered
+
+# Optional ^, then literal|literal|... either bare or wrapped in one group
+_LITERAL = r'(?:[^\\()\[\]{}.*+?^$|]|\\[^\w|])+'
+_LITERAL_ALTERNATION = re.compile(
+    rf'^(?P<anchor>\^)?(?:\((?P<grouped>{_LITERAL}(?:\|{_LITERAL})*)\)|(?P<bare>{_LITERAL}(?:\|{_LITERAL})*))$'
+)
+
+
+def literal_alternatives(pattern: str) -> Optional[Tuple[bool, Tuple[str, ...]]]:
+    """
+    If a pattern is just an alternation of literals, return
+    (anchored, lowercased literals); otherwise None.
+    """
+    match = _LITERAL_ALTERNATION.match(pattern)
+    if not match:
+        return None
+    
+    anchored = match.group('anchor') is not None
+    body = match.group('grouped')
+    if body is None:
+        body = match.group('bare')
+        # ^a|b means "^a" or "b anywhere" - leave that to the regex engine
+        if anchored and '|' in body:
+            return None
+    
+    literals = tuple(re.sub(r'\\(.)', r'\1', alt).lower() for alt in body.split('|'))
+    return anchored, literals
+
+
+class NoiseFilter:
+    """
+    Decides whether a (stripped) capture line is UI noise.
+    
+    Matching is equivalent to trying every pattern with
+    re.search(pattern, line, re.IGNORECASE) - anchored patterns stay
+    anchored inside the combined alternation.
+    """
+    
+    def __init__(self, patterns: List[str] = None, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.patterns = list(DEFAULT_NOISE_PATTERNS if patterns is None else patterns)
+        self.cache_size = cache_size
+        
+        prefixes = []
+        substrings = []
+        regexes = []
+        for pattern in self.patterns:
+            literal = literal_alternatives(pattern)
+            if literal is None:
+                regexes.append(pattern)
+            elif literal[0]:
+                prefixes.extend(literal[1])
+            else:
+                substrings.extend(literal[1])
+        
+        self.prefixes = tuple(prefixes)
+        self.substrings = tuple(substrings)
+        if regexes:
+            combined = '|'.join(f'(?:{pattern})' for pattern in regexes)
+            self.matcher = re.compile(combined, re.IGNORECASE)
+        else:
+            self.matcher = None
+        
+        # Bounded LRU over the compiled matcher
+        self.is_noise = lru_cache(maxsize=cache_size)(self._match)
+    
+    @classmethod
+    def from_file(cls, patterns_file: str, cache_size: int = DEFAULT_CACHE_SIZE) -> 'NoiseFilter':
+        """Load the pattern set from a JSON file holding a list of regexes."""
+        with open(patterns_file, 'r', encoding='utf-8') as f:
+            patterns = json.load(f)
+        
+        if not isinstance(patterns, list) or not all(isinstance(p, str) for p in patterns):
+            raise ValueError(f"{patterns_file} must contain a JSON list of regex strings")
+        
+        return cls(patterns, cache_size)
+    
+    @classmethod
+    def from_config(cls, patterns_file: str = '') -> 'NoiseFilter':
+        """Use the configured pattern file if there is one, else the built-in set."""
+        if patterns_file and Path(patterns_file).exists():
+            return cls.from_file(patterns_file)
+        return cls()
+    
+    def _match(self, line: str) -> bool:
+        lowered = line.lower()
+        
+        if self.prefixes and lowered.startswith(self.prefixes):
+            return True
+        for substring in self.substrings:
+            if substring in lowered:
+                return True
+        
+        return self.matcher is not None and self.matcher.search(line) is not None
+    
+    def clean_line(self, line: str) -> str:
+        """One line of filter_lines(): the stripped line, or '' if blank or noise."""
+        line = line.strip()
+        if line and not self.is_noise(line):
+            return line
+        return ''
+    
+    def filter_lines(self, lines: List[str]) -> List[str]:
+        """Strip lines and drop blanks and noise."""
+        is_noise = self.is_noise
+        clean_lines = []
+        for line in lines:
+            line = line.strip()
+            if line and not is_noise(line):
+                clean_lines.append(line)
+        return clean_lines
+    
+    def cache_info(self):
+        """LRU hit/miss statistics."""
+        return self.is_noise.cache_info()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Segmenter - turns whole-window snapshots into new-text turns
+
+Every Logger capture is the full visible conversation, so capture N
+repeats nearly all of capture N-1. The segmenter aligns each (noise
+filtered) snapshot against the previous one on whole lines and keeps
+only the text that newly appeared:
+
+- common prefix / suffix: chrome and unchanged conversation above and
+  below the change are dropped
+- scroll overlap: if what is left starts with the tail of what was left
+  of the previous snapshot, the window scrolled and only the text after
+  that overlap is new
+
+Alignment is linear in the number of lines for the common cases and never
+calls a general diff.
+"""
+
+from typing import List, Sequence
+
+
+def common_prefix_length(a: Sequence[str], b: Sequence[str]) -> int:
+    """Number of leading lines a and b share."""
+    limit = min(len(a), len(b))
+    i = 0
+    while i < limit and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def common_suffix_length(a: Sequence[str], b: Sequence[str]) -> int:
+    """Number of trailing lines a and b share."""
+    limit = min(len(a), len(b))
+    i = 0
+    while i < limit and a[-1 - i] == b[-1 - i]:
+        i += 1
+    return i
+
+
+def scroll_overlap(previous: Sequence[str], current: Sequence[str]) -> int:
+    """
+    Longest k such that the last k lines of previous are the first k lines
+    of current (0 if the snapshot does not start inside previous).
+    """
+    if not current:
+        return 0
+    
+    first = current[0]
+    # Earliest start in previous = longest overlap
+    for start, line in enumerate(previous):
+        if line != first:
+            continue
+        overlap = len(previous) - start
+        if overlap <= len(current) and list(previous[start:]) == list(current[:overlap]):
+            return overlap
+    return 0
+
+
+def new_lines(previous: Sequence[str], current: Sequence[str]) -> List[str]:
+    """Lines of the current snapshot that were not visible in the previous one."""
+    if not previous:
+        return list(current)
+    
+    # Chrome above and below the conversation (sidebar, footer) stays put
+    prefix = common_prefix_length(previous, current)
+    suffix = common_suffix_length(previous[prefix:], current[prefix:])
+    prev_body = previous[prefix:len(previous) - suffix]
+    body = current[prefix:len(current) - suffix]
+    
+    # If the conversation scrolled, body starts with the tail of prev_body
+    overlap = scroll_overlap(prev_body, body)
+    if not overlap and len(prev_body) > 1:
+        # The last visible line may still be streaming in - align without it
+        overlap = scroll_overlap(prev_body[:-1], body)
+    
+    return list(body[overlap:])
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shards - monthly archive databases and the catalog that lists them
+
+conversations.db stays the live database the curator writes to. Once a
+month has been over for a while, archive_month() moves the conversations
+that started in it into a database of their own under shards/ - created
+from the live database's schema, so bodies, the FTS index, the stats
+counters and the covering indexes all come along - and records the shard
+in catalog.db with the time range it covers.
+
+Archived shards are sealed: rollback journal, FTS segments merged, file
+made read-only. Readers open them immutable (no locking, no change
+checks, so their pages stay cached), and VACUUM, backups and index
+rebuilds of the live database only touch the months still open.
+
+Readers ask the catalog which shards overlap a date range and ATTACH
+only those (ShardCatalog.shards(), attach_shards()), or fan out over all
+of them in parallel. Conversation ids stay unique across shards (rows
+keep the live database's ids).
+
+Late logs for a month already archived are archived into a second shard
+for that month; a session that resumes after its month was archived
+continues as a new conversation row in the live database.
+"""
+
+import os
+import sqlite3
+import stat
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+
+CATALOG_NAME = "catalog.db"
+SHARD_DIR_NAME = "shards"
+MAX_ATTACHED = 10  # SQLite's default SQLITE_MAX_ATTACHED
+
+CATALOG_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS shards (
+        name TEXT PRIMARY KEY,   -- file name under shards/
+        month TEXT,              -- YYYY-MM its conversations started in
+        start_ms INTEGER,        -- earliest conversation start
+        end_ms INTEGER,          -- latest conversation end
+        conversations INTEGER,
+        messages INTEGER,
+        sealed INTEGER DEFAULT 1,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def month_of(ms: int) -> str:
+    """YYYY-MM (local time) of an epoch-millisecond time."""
+    return datetime.fromtimestamp(ms / 1000).strftime('%Y-%m')
+
+
+def month_bounds(month: str) -> tuple:
+    """[start, end) of a YYYY-MM month as epoch milliseconds (local time)."""
+    start = datetime.strptime(month, '%Y-%m')
+    end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    return int(start.timestamp() * 1000), int(end.timestamp() * 1000)
+
+
+def shard_uri(path: Path, sealed: bool = True) -> str:
+    """URI opening a shard read-only - immutable once sealed."""
+    return Path(path).resolve().as_uri() + ('?immutable=1' if sealed else '?mode=ro')
+
+
+class ShardCatalog:
+    """
+    catalog.db next to the live database: one row per archived shard.
+    
+    Nothing is created until the first shard is added, so an archive that
+    was never sharded reads as having no shards.
+    """
+    
+    def __init__(self, processed_dir: Path):
+        self.processed_dir = Path(processed_dir)
+        self.path = self.processed_dir / CATALOG_NAME
+        self.shard_dir = self.processed_dir / SHARD_DIR_NAME
+    
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.execute(CATALOG_SCHEMA)
+        return conn
+    
+    def shards(self, after_ms: Optional[int] = None, before_ms: Optional[int] = None) -> List[Dict]:
+        """Shards whose conversations overlap [after_ms, before_ms] (either bound optional), oldest first."""
+        if not self.path.exists():
+            return []
+        
+        conn = self.connect()
+        rows = conn.execute('''
+            SELECT name, month, start_ms, end_ms, conversations, messages, sealed FROM shards
+            WHERE (? IS NULL OR end_ms >= ?) AND (? IS NULL OR start_ms <= ?)
+            ORDER BY start_ms
+        ''', (after_ms, after_ms, before_ms, before_ms)).fetchall()
+        conn.close()
+        
+        return [
+            {'name': name, 'path': self.shard_dir / name, 'month': month, 'start_ms': start_ms,
+             'end_ms': end_ms, 'conversations': conversations, 'messages': messages, 'sealed': bool(sealed)}
+            for name, month, start_ms, end_ms, conversations, messages, sealed in rows
+        ]
+    
+    def new_shard_path(self, month: str) -> Path:
+        """A free file name for a month's shard (a second archive of a month gets a suffix)."""
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        path = self.shard_dir / f"conversations-{month}.db"
+        n = 2
+        while path.exists():
+            path = self.shard_dir / f"conversations-{month}-{n}.db"
+            n += 1
+        return path
+    
+    def add(self, path: Path, month: str, start_ms: int, end_ms: int, conversations: int, messages: int):
+        conn = self.connect()
+        conn.execute('''
+            INSERT INTO shards (name, month, start_ms, end_ms, conversations, messages)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (Path(path).name, month, start_ms, end_ms, conversations, messages))
+        conn.commit()
+        conn.close()
+
+
+@contextmanager
+def attach_shards(conn: sqlite3.Connection, shards: List[Dict]) -> Iterator[List[str]]:
+    """
+    ATTACH shards to a connection opened with uri=True; yields their schema
+    names (shard0, shard1, ...) and detaches them afterwards.
+    """
+    names = []
+    try:
+        for n, shard in enumerate(shards):
+            name = f"shard{n}"
+            conn.execute('ATTACH DATABASE ? AS ' + name, (shard_uri(shard['path'], shard['sealed']),))
+            names.append(name)
+        yield names
+    finally:
+        for name in names:
+            conn.execute(f'DETACH DATABASE {name}')
+
+
+def copy_schema(conn: sqlite3.Connection, target: Path):
+    """
+    Create conn's schema - tables, FTS tables, indexes, views and triggers
+    - in a new database file. FTS shadow tables come with their virtual
+    table; autoindexes with their table.
+    """
+    rows = conn.execute('''
+        SELECT type, name, sql FROM sqlite_master
+        WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+    ''').fetchall()
+    virtual = [name for kind, name, sql in rows if sql.upper().startswith('CREATE VIRTUAL TABLE')]
+    order = {'table': 0, 'index': 1, 'view': 2, 'trigger': 3}
+    
+    shard = sqlite3.connect(target)
+    for kind, name, sql in sorted(rows, key=lambda row: order[row[0]]):
+        if kind == 'table' and any(name.startswith(v + '_') for v in virtual):
+            continue
+        shard.execute(sql)
+    shard.commit()
+    shard.close()
+
+
+def seal_shard(path: Path):
+    """Make a finished shard cheap to read forever: merged FTS, rollback journal, read-only file."""
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO blobs_fts(blobs_fts) VALUES ('optimize')")
+    conn.commit()
+    conn.execute('PRAGMA journal_mode = DELETE')
+    conn.execute('PRAGMA optimize')
+    conn.execute('VACUUM')
+    conn.close()
+    os.chmod(path, stat.S_IREAD | stat.S_IRGRP | stat.S_IROTH)
+
+
+def archivable_months(conn: sqlite3.Connection, before_ms: int) -> List[str]:
+    """Months whose conversations all started before the month containing before_ms."""
+    cutoff = month_bounds(month_of(before_ms))[0]
+    return [month for (month,) in conn.execute('''
+        SELECT DISTINCT strftime('%Y-%m', start_ms / 1000, 'unixepoch', 'localtime')
+        FROM conversations
+        WHERE start_ms < ?
+        ORDER BY 1
+    ''', (cutoff,))]
+
+
+def archive_month(writer, catalog: ShardCatalog, month: str) -> Optional[Dict]:
+    """
+    Move the conversations that started in `month` from the live database
+    (a CuratorWriter, whose connection has body_text() for the FTS
+    triggers) into a new sealed shard, and record it in the catalog.
+    Returns the catalog entry, or None if the month has no conversations.
+    """
+    conn = writer.conn
+    start, end = month_bounds(month)
+    in_month = 'SELECT id FROM main.conversations WHERE start_ms >= ? AND start_ms < ?'
+    
+    if conn.execute(in_month + ' LIMIT 1', (start, end)).fetchone() is None:
+        return None
+    
+    writer.commit()  # ATTACH needs no open transaction
+    path = catalog.new_shard_path(month)
+    copy_schema(conn, path)
+    
+    # Copy rows with the shard's own triggers doing the bookkeeping:
+    # blob refcounts, FTS entries and stats counters are rebuilt as rows arrive
+    conn.execute('ATTACH DATABASE ? AS shard', (str(path),))
+    try:
+        conn.execute('INSERT INTO shard.body_dictionaries SELECT * FROM main.body_dictionaries')
+        conn.execute(f'INSERT INTO shard.conversations SELECT * FROM main.conversations WHERE id IN ({in_month})',
+                     (start, end))
+        conn.execute('''
+            INSERT INTO shard.blobs (id, hash, content, size, refcount)
+            SELECT id, hash, content, size, 0 FROM main.blobs
+            WHERE id IN (SELECT blob_id FROM main.messages
+                         WHERE conversation_id IN (SELECT id FROM shard.conversations))
+        ''')
+        conn.execute('''
+            INSERT INTO shard.messages SELECT * FROM main.messages
+            WHERE conversation_id IN (SELECT id FROM shard.conversations)
+            ORDER BY id
+        ''')
+        entry = conn.execute('''
+            SELECT MIN(start_ms), MAX(end_ms), COUNT(*),
+                   (SELECT COUNT(*) FROM shard.messages)
+            FROM shard.conversations
+        ''').fetchone()
+        writer.commit()
+    finally:
+        conn.execute('DETACH DATABASE shard')
+    
+    seal_shard(path)
+    catalog.add(path, month, *entry)
+    
+    # Only now that the shard is complete and listed, drop the rows here
+    conn.execute(f'DELETE FROM messages WHERE conversation_id IN ({in_month})', (start, end))
+    conn.execute(f'DELETE FROM conversations WHERE id IN ({in_month})', (start, end))
+    writer.delete_unreferenced_blobs()
+    writer.commit()
+    
+    start_ms, end_ms, conversations, messages = entry
+    return {'name': path.name, 'path': path, 'month': month, 'start_ms': start_ms, 'end_ms': end_ms,
+            'conversations': conversations, 'messages': messages, 'sealed': True}
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stats Counters - archive totals kept up to date by triggers
+
+Summary and stats calls used to COUNT(*) / SUM() / GROUP BY over the
+whole archive. Instead, triggers on conversations, messages and blobs
+keep running totals in two small tables, so reading them costs the same
+however large the archive grows:
+
+- stats(name, value): conversations, total_chars, messages, blobs,
+  blob_chars and role:<role> message counts
+- daily_stats(day, messages, chars): per local day of timestamp_ms
+  ('' for messages without a timestamp)
+
+recompute_stats() rebuilds both from scratch, for databases that predate
+the counters and to verify them.
+"""
+
+import sqlite3
+from typing import Dict, List
+
+
+DAY_SQL = "COALESCE(date({row}.timestamp_ms / 1000, 'unixepoch', 'localtime'), '')"
+MESSAGE_CHARS_SQL = "COALESCE((SELECT size FROM blobs WHERE id = {row}.blob_id), 0)"
+
+
+def _message_delta(row: str, sign: str) -> str:
+    """Trigger statements adding (sign '+') or removing (sign '-') one message."""
+    return f'''
+        INSERT INTO stats (name, value) VALUES ('messages', {sign}1), ('role:' || COALESCE({row}.role, ''), {sign}1)
+        ON CONFLICT(name) DO UPDATE SET value = value + excluded.value;
+        INSERT INTO daily_stats (day, messages, chars)
+        VALUES ({DAY_SQL.format(row=row)}, {sign}1, {sign}{MESSAGE_CHARS_SQL.format(row=row)})
+        ON CONFLICT(day) DO UPDATE SET messages = messages + excluded.messages, chars = chars + excluded.chars;
+    '''
+
+
+STATS_SCHEMA = f'''
+    CREATE TABLE IF NOT EXISTS stats (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    );
+    
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        day TEXT PRIMARY KEY,  -- YYYY-MM-DD (local time)
+        messages INTEGER NOT NULL DEFAULT 0,
+        chars INTEGER NOT NULL DEFAULT 0
+    );
+    
+    CREATE TRIGGER IF NOT EXISTS stats_conversation_insert AFTER INSERT ON conversations BEGIN
+        INSERT INTO stats (name, value) VALUES ('conversations', 1), ('total_chars', COALESCE(new.total_chars, 0))
+        ON CONFLICT(name) DO UPDATE SET value = value + excluded.value;
+    END;
+    
+    CREATE TRIGGER IF NOT EXISTS stats_conversation_delete AFTER DELETE ON conversations BEGIN
+        INSERT INTO stats (name, value) VALUES ('conversations', -1), ('total_chars', -COALESCE(old.total_chars, 0))
+        ON CONFLICT(name) DO UPDATE SET value = value + excluded.value;
+    END;
+    
+    CREATE TRIGGER IF NOT EXISTS stats_conversation_chars AFTER UPDATE OF total_chars ON conversations BEGIN
+        INSERT INTO stats (name, value)
+        VALUES ('total_chars', COALESCE(new.total_chars, 0) - COALESCE(old.total_chars, 0))
+        ON CONFLICT(name) DO UPDATE SET value = value + excluded.value;
+    END;
+    
+    CREATE TRIGGER IF NOT EXISTS stats_message_insert AFTER INSERT ON messages BEGIN
+        {_message_delta('new', '+')}
+    END;
+    
+    CREATE TRIGGER IF NOT EXISTS stats_message_delete AFTER DELETE ON messages BEGIN
+        {_message_delta('old', '-')}
+    END;
+    
+    CREATE TRIGGER IF NOT EXISTS stats_message_update AFTER UPDATE OF role, blob_id, timestamp_ms ON messages BEGIN
+        {_message_delta('old', '-')}
+        {_message_delta('new', '+')}
+    END;
+    
+    CREATE TRIGGER IF NOT EXISTS stats_blob_insert AFTER INSERT ON blobs BEGIN
+        INSERT INTO stats (name, value) VALUES ('blobs', 1), ('blob_chars', COALESCE(new.size, 0))
+        ON CONFLICT(name) DO UPDATE SET value = value + excluded.value;
+    END;
+    
+    CREATE TRIGGER IF NOT EXISTS stats_blob_delete AFTER DELETE ON blobs BEGIN
+        INSERT INTO stats (name, value) VALUES ('blobs', -1), ('blob_chars', -COALESCE(old.size, 0))
+        ON CONFLICT(name) DO UPDATE SET value = value + excluded.value;
+    END;
+'''
+
+
+def create_stats(conn: sqlite3.Connection):
+    """Create the counter tables and triggers; counts existing rows the first time."""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats'").fetchone()
+    conn.executescript(STATS_SCHEMA)
+    if not exists:
+        recompute_stats(conn)
+
+
+def recompute_stats(conn: sqlite3.Connection):
+    """Rebuild stats and daily_stats from the tables they summarize."""
+    conn.execute('DELETE FROM stats')
+    conn.execute('DELETE FROM daily_stats')
+    conn.execute('''
+        INSERT INTO stats (name, value)
+        SELECT 'conversations', COUNT(*) FROM conversations
+        UNION ALL SELECT 'total_chars', COALESCE(SUM(total_chars), 0) FROM conversations
+        UNION ALL SELECT 'messages', COUNT(*) FROM messages
+        UNION ALL SELECT 'blobs', COUNT(*) FROM blobs
+        UNION ALL SELECT 'blob_chars', COALESCE(SUM(size), 0) FROM blobs
+        UNION ALL SELECT 'role:' || COALESCE(role, ''), COUNT(*) FROM messages GROUP BY COALESCE(role, '')
+    ''')
+    conn.execute(f'''
+        INSERT INTO daily_stats (day, messages, chars)
+        SELECT {DAY_SQL.format(row='m')}, COUNT(*), COALESCE(SUM(b.size), 0)
+        FROM messages m LEFT JOIN blobs b ON b.id = m.blob_id
+        GROUP BY 1
+    ''')
+
+
+def read_stats(conn: sqlite3.Connection) -> Dict:
+    """
+    The counters as a dict: conversations, total_chars, messages, blobs,
+    blob_chars and by_role (roles with at least one message).
+    """
+    values = dict(conn.execute('SELECT name, value FROM stats'))
+    totals = {name: values.get(name, 0)
+              for name in ('conversations', 'total_chars', 'messages', 'blobs', 'blob_chars')}
+    totals['by_role'] = {name[len('role:'):]: value for name, value in values.items()
+                         if name.startswith('role:') and value}
+    return totals
+
+
+def read_daily_stats(conn: sqlite3.Connection, days: int = 7) -> List[Dict]:
+    """Message and character counts for the most recent days with messages."""
+    return [
+        {'day': day, 'messages': messages, 'chars': chars}
+        for day, messages, chars in conn.execute('''
+            SELECT day, messages, chars FROM daily_stats
+            WHERE messages > 0
+            ORDER BY day DESC
+            LIMIT ?
+        ''', (days,))
+    ]
@@ -0,0 +1,1167 @@
+#!/usr/bin/env python3
+"""
+Curator Tests
+Run with: python -m pytest curator/test_curator.py
+"""
+
+import hashlib
+import json
+import queue
+import re
+import sqlite3
+import stat
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from compressor.container import (BLOCK_RECORDS, convert_to_container, iter_blocks, read_block, read_compressed,
+                                  read_container, read_header, write_container)
+from compressor.delta_compressor import DeltaCompressor
+from compressor.delta_compressor_parallel import compress_single_file
+from compressor.line_diff import get_diff_engine, myers_opcodes
+from compressor.line_dictionary import LineDictionary
+from compressor.seek_index import SeekIndex, get_at_time, get_capture, index_path
+from curator.body_codec import BodyCodec
+from curator.bulk_export import iter_export
+from curator.claude_curator import (BATCHES_AHEAD_PER_FILE, CapturePipeline, ClaudeCurator, capture_time,
+                                    extract_single_file, init_extract_worker)
+from curator.curator_writer import epoch_ms
+from curator.json_codec import JsonCodec, OrjsonCodec, get_codec
+from curator.jsonl_reader import JsonlReader
+from curator.migrations import MIGRATIONS, Batched, Migration, Migrator, statements
+from curator.near_duplicates import (BANDS, band_sql, band_values, from_signed, hamming, max_distance_for,
+                                     snapshot_fingerprint, to_signed)
+from curator.noise_filter import NoiseFilter
+from curator.segmenter import new_lines
+from curator.shards import archivable_months, month_bounds, shard_uri
+from curator.stats_counters import read_daily_stats, read_stats, recompute_stats
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def write_raw_log(log_file: Path, session_id: str, texts, start_number: int = 0, day: str = "2025-11-01"):
+    """Append logger-shaped captures to a raw JSONL file."""
+    with open(log_file, 'a', encoding='utf-8') as f:
+        for idx, text in enumerate(texts, start_number):
+            entry = {
+                'session_id': session_id,
+                'timestamp': f"{day}T10:{idx // 60:02d}:{idx % 60:02d}",
+                'message_number': idx,
+                'raw_text': text,
+                'text_hash': hashlib.md5(text.encode()).hexdigest(),
+                'capture_method': 'bulletproof_ui_automation'
+            }
+            f.write(json.dumps(entry, ensure_ascii=True) + '\n')
+
+
+def make_curator(tmp_path: Path, **options) -> ClaudeCurator:
+    raw_logs = tmp_path / "raw_logs"
+    raw_logs.mkdir(parents=True, exist_ok=True)
+    return ClaudeCurator(str(raw_logs), str(tmp_path / "processed"), **options)
+
+
+def test_search_uses_fts_index(tmp_path, capsys):
+    curator = make_curator(tmp_path)
+    write_raw_log(curator.raw_logs_dir / "s1.jsonl", "s1", [
+        "New chat\nHow do I configure the authentication middleware for the API server?",
+        "New chat\nThe authentication middleware is configured in settings.py under MIDDLEWARE.",
+    ])
+    curator.process_all_logs()
+    capsys.readouterr()
+    
+    curator.search_conversations("authentication middle")
+    out = capsys.readouterr().out
+    assert "Found 2 results" in out
+    
+    curator.search_conversations("kubernetes")
+    assert "No results found" in capsys.readouterr().out
+
+
+def test_legacy_bodies_move_to_indexed_blobs(tmp_path):
+    # A database curated before the FTS index and the blob store existed
+    processed = tmp_path / "processed"
+    processed.mkdir()
+    conn = sqlite3.connect(processed / "conversations.db")
+    conn.executescript('''
+        CREATE TABLE conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT UNIQUE,
+            start_time TEXT, end_time TEXT, message_count INTEGER,
+            total_chars INTEGER, created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, conversation_id INTEGER,
+            message_number INTEGER, role TEXT, content TEXT, timestamp TEXT,
+            content_hash TEXT, tokens_estimate INTEGER
+        );
+        CREATE INDEX idx_content ON messages(content);
+        INSERT INTO conversations (session_id) VALUES ('old');
+        INSERT INTO messages (conversation_id, message_number, role, content)
+        VALUES (1, 0, 'user', 'legacy message about sqlite vacuum'),
+               (1, 1, 'assistant', 'a different legacy reply'),
+               (1, 2, 'user', 'legacy message about sqlite vacuum');
+    ''')
+    conn.commit()
+    conn.close()
+    
+    curator = make_curator(tmp_path)
+    
+    conn = sqlite3.connect(curator.db_path)
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(messages)')}
+    hits = conn.execute('''
+        SELECT m.message_number FROM blobs_fts
+        JOIN messages m ON m.blob_id = blobs_fts.rowid
+        WHERE blobs_fts MATCH 'vacuum' ORDER BY m.message_number
+    ''').fetchall()
+    blobs = conn.execute('SELECT content, refcount FROM blobs ORDER BY id').fetchall()
+    conn.close()
+    
+    assert 'idx_content' not in indexes
+    assert 'messages_fts' not in tables
+    assert 'content' not in columns
+    assert hits == [(0,), (2,)]
+    assert sorted(blobs) == [('a different legacy reply', 1), ('legacy message about sqlite vacuum', 2)]
+
+
+def test_incremental_ingest_appends_new_captures(tmp_path):
+    curator = make_curator(tmp_path)
+    log_file = curator.raw_logs_dir / "claude_session_1.jsonl"
+    first = [f"Message {i}: " + "discussing the ingest ledger design in detail " * 2 for i in range(3)]
+    write_raw_log(log_file, "claude_session_1", first)
+    curator.process_all_logs()
+    
+    # Logger keeps appending; a half-written line must be left for next time
+    later = [f"Message {i}: " + "appended after the first curator run finished " * 2 for i in range(3, 5)]
+    write_raw_log(log_file, "claude_session_1", later, start_number=3)
+    with open(log_file, 'a', encoding='utf-8') as f:
+        f.write('{"session_id": "claude_session_1", "raw_te')
+    curator.process_all_logs()
+    
+    conn = sqlite3.connect(curator.db_path)
+    conv = conn.execute('SELECT id, message_count, total_chars, end_time FROM conversations').fetchall()
+    numbers = [row[0] for row in conn.execute('SELECT message_number FROM messages ORDER BY id')]
+    ledger = conn.execute('SELECT byte_offset, last_message_number FROM ingest_ledger').fetchone()
+    conn.close()
+    
+    assert len(conv) == 1
+    assert conv[0][1] == 5
+    assert conv[0][2] == sum(len(t.strip()) for t in first + later)
+    assert conv[0][3] == "2025-11-01T10:00:04"
+    assert numbers == [0, 1, 2, 3, 4]
+    assert ledger[1] == 4
+    assert ledger[0] == log_file.read_bytes().rindex(b'\n') + 1
+    
+    # Unchanged file: nothing re-parsed, nothing duplicated
+    curator.process_all_logs()
+    conn = sqlite3.connect(curator.db_path)
+    assert conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0] == 5
+    conn.close()
+
+
+def test_watch_curates_appended_captures_within_seconds(tmp_path, capsys):
+    curator = make_curator(tmp_path)
+    log_file = curator.raw_logs_dir / "claude_session_1.jsonl"
+    write_raw_log(log_file, "claude_session_1", [
+        "Message 0: " + "caught up from the backlog when the watch starts " * 2])
+    
+    def logger():
+        # The Logger appends a capture while the curator is polling
+        time.sleep(0.3)
+        text = "Message 1: " + "appended while the curator was already watching " * 2
+        entry = {'session_id': "claude_session_1", 'timestamp': datetime.now().isoformat(),
+                 'message_number': 1, 'raw_text': text, 'text_hash': hashlib.md5(text.encode()).hexdigest()}
+        with open(log_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=True) + '\n')
+    
+    appender = threading.Thread(target=logger)
+    appender.start()
+    totals = curator.watch(poll_interval=0.05, max_polls=30)
+    appender.join()
+    out = capsys.readouterr().out
+    
+    assert totals['polls'] == 30
+    assert totals['captures'] == 2
+    assert [row[1] for row in stored_messages(curator)] == [0, 1]
+    # Only the capture taken during the watch counts towards latency
+    assert totals['latency']['count'] == 1
+    assert 0 <= totals['latency']['max'] < 5
+    assert "Capture-to-searchable over 1 messages" in out
+
+
+def test_jsonl_reader_maps_whole_files_and_resumes_from_offsets(tmp_path):
+    log_file = tmp_path / "session.jsonl"
+    log_file.write_bytes(b'{"n": 0, "text": "caf\xc3\xa9"}\r\n\n   \n{"n": 1}\nnot json\n{"n": 2, "te')
+    
+    # Full file: every line, the unterminated last one included
+    with pytest.raises(ValueError):
+        list(JsonlReader(log_file).records())
+    errors = []
+    assert list(JsonlReader(log_file).records(on_error=errors.append))[0] == {'n': 0, 'text': "café"}
+    assert len(errors) == 2
+    
+    # Incremental: complete lines only, offset past the last newline, resumable
+    reader = JsonlReader(log_file, complete_only=True)
+    assert [r['n'] for r in reader.records(on_error=errors.append)] == [0, 1]
+    assert reader.offset == log_file.read_bytes().rindex(b'\n') + 1
+    with open(log_file, 'ab') as f:
+        f.write(b'xt": "done"}\n\n')
+    resumed = JsonlReader(log_file, reader.offset, complete_only=True)
+    assert list(resumed.records()) == [{'n': 2, 'text': "done"}]
+    assert resumed.offset == log_file.stat().st_size
+    
+    # Views are released once the next line is requested; empty files map to nothing
+    kept = list(JsonlReader(log_file).lines())
+    with pytest.raises(ValueError):
+        bytes(kept[0])
+    (tmp_path / "empty.jsonl").touch()
+    assert list(JsonlReader(tmp_path / "empty.jsonl").records()) == []
+
+
+def test_json_codecs_write_identical_lines(tmp_path):
+    pytest.importorskip("orjson")
+    codecs = [JsonCodec(), OrjsonCodec()]
+    records = [
+        {'session_id': "s1", 'message_number': 3, 'raw_text': "Caf\u00e9 \u2022 \U0001F600 tab\t nul\x00 del\x7f",
+         'diff': {'type': 'delta', 'size': 12, 'compression_ratio': 0.9921875, 'changes': []}},
+        {'compression_ratio': 5e-05, 'big': 1e16, 'huge_int': 2 ** 70, 'lone': "\ud800", 'none': None},
+        {'text': "hash 9e1f, see [1e-3] in the notes", 'n': -0.0},
+    ]
+    assert len({codec.dumps_lines(records) for codec in codecs}) == 1
+    assert codecs[0].dumps(records[0]).isascii()
+    
+    log_file = tmp_path / "mixed.jsonl"
+    log_file.write_bytes(codecs[1].dumps_lines(records) + b'{"legacy": "spaced separators"}\n')
+    for codec in codecs:
+        decoded = list(JsonlReader(log_file, codec=codec).records())
+        assert decoded[:3] == records and decoded[3] == {'legacy': "spaced separators"}
+        # A bad line in a bulk-decoded batch is isolated, not the batch dropped
+        errors = []
+        (tmp_path / "bad.jsonl").write_bytes(b'{"n": 1}\n{"n": \n{"n": 3}\n')
+        assert [r['n'] for r in JsonlReader(tmp_path / "bad.jsonl", codec=codec).records(errors.append)] == [1, 3]
+        assert len(errors) == 1
+    
+    # Compressor output does not depend on which codec wrote it
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    write_raw_log(raw / "claude_session_1.jsonl", "claude_session_1",
+                  ["Caf\u00e9 notes \u2014 first draft", "Caf\u00e9 notes \u2014 second draft \U0001F600"])
+    outputs = []
+    for codec in codecs:
+        compressor = DeltaCompressor(str(raw), str(tmp_path / codec.name))
+        compressor.codec = codec
+        outputs.append(compressor.compress_log_file(raw / "claude_session_1.jsonl").read_bytes())
+    assert outputs[0] == outputs[1]
+    
+    with pytest.raises(ValueError):
+        get_codec("simdjson")
+
+
+def write_compressed_log(log_file: Path, session_id: str, texts):
+    """Write captures in the compressor's delta format (full record, then line deltas)."""
+    with open(log_file, 'w', encoding='utf-8') as f:
+        previous = ''
+        for idx, text in enumerate(texts):
+            if not previous:
+                diff = {'type': 'full', 'content': text, 'size': len(text)}
+            elif previous == text:
+                diff = {'type': 'identical', 'size': 0}
+            else:
+                old_lines = previous.splitlines(keepends=True)
+                new_lines = text.splitlines(keepends=True)
+                diff = {'type': 'delta', 'size': len(text), 'changes': [{
+                    'op': 'replace', 'old_start': 0, 'old_end': len(old_lines), 'new_lines': new_lines
+                }]}
+            record = {
+                'session_id': session_id,
+                'timestamp': f"2025-11-01T10:00:{idx:02d}",
+                'message_number': idx,
+                'text_hash': hashlib.md5(text.encode()).hexdigest(),
+                'capture_method': 'bulletproof_ui_automation',
+                'diff': diff
+            }
+            f.write(json.dumps(record, ensure_ascii=True) + '\n')
+            previous = text
+
+
+def stored_messages(curator: ClaudeCurator):
+    conn = sqlite3.connect(curator.db_path)
+    bodies = BodyCodec(conn)
+    rows = [(session_id, number, role, bodies.decode(content), timestamp)
+            for session_id, number, role, content, timestamp in conn.execute('''
+                SELECT c.session_id, m.message_number, m.role, b.content, m.timestamp
+                FROM messages m JOIN conversations c ON m.conversation_id = c.id
+                JOIN blobs b ON b.id = m.blob_id
+                ORDER BY c.session_id, m.message_number
+            ''')]
+    conn.close()
+    return rows
+
+
+def test_streaming_pipeline_reads_raw_and_compressed(tmp_path):
+    texts = [
+        "Chats\nProjects\nuser: what does the streaming pipeline keep in memory at once?",
+        "Chats\nProjects\nuser: what does the streaming pipeline keep in memory at once?\n"
+        "assistant: only a single batch of extracted messages at a time",
+        "Chats\nProjects\nuser: what does the streaming pipeline keep in memory at once?\n"
+        "assistant: only a single batch of extracted messages at a time",
+        "Chats\nuser: and how is throughput reported back to the orchestrator run?",
+    ]
+    
+    raw = make_curator(tmp_path / "raw")
+    write_raw_log(raw.raw_logs_dir / "s1.jsonl", "s1", texts)
+    stats = raw.process_log_file(raw.raw_logs_dir / "s1.jsonl")
+    
+    compressed = ClaudeCurator(str(tmp_path / "compressed"), str(tmp_path / "compressed_db"), batch_size=1)
+    (tmp_path / "compressed").mkdir(exist_ok=True)
+    write_compressed_log(tmp_path / "compressed" / "compressed_s1.jsonl", "s1", texts)
+    compressed.process_all_logs()
+    
+    assert stats['captures'] == 4
+    assert stats['messages'] == 3
+    assert stats['captures_per_sec'] > 0
+    assert [row[3] for row in stored_messages(raw)] == [row[3] for row in stored_messages(compressed)]
+
+
+def test_compressed_dir_is_curated_in_place_of_its_raw_logs(tmp_path):
+    texts = [
+        "Chats\nuser: where does the orchestrator leave compressed logs for the curator?",
+        "Chats\nuser: where does the orchestrator leave compressed logs for the curator?\n"
+        "assistant: in compressor/compressed, a directory of its own",
+    ]
+    compressed_dir = tmp_path / "compressed"
+    compressed_dir.mkdir()
+    curator = make_curator(tmp_path, compressed_dir=str(compressed_dir))
+    write_raw_log(curator.raw_logs_dir / "s1.jsonl", "s1", texts)
+    write_raw_log(curator.raw_logs_dir / "s2.jsonl", "s2", texts)
+    write_compressed_log(compressed_dir / "compressed_s1.jsonl", "s1", texts)
+    
+    # s1 is read from its compressed copy; s2, not compressed yet, raw
+    assert curator.list_log_files() == [compressed_dir / "compressed_s1.jsonl", curator.raw_logs_dir / "s2.jsonl"]
+    curator.process_all_logs()
+    assert [row[:2] for row in stored_messages(curator)] == [('s1', 0), ('s1', 1), ('s2', 0), ('s2', 1)]
+    assert curator.writer.get_ledger_entry("s1.jsonl") is None
+
+
+def test_noise_filter_matches_per_pattern_search(tmp_path):
+    patterns = [
+        r'^(New chat|Chats)', r'(Notifications|Project content)', r'^How can I help\?',
+        r'^a|zzz', r'\d{3}-\d{4}', 'Starred',
+    ]
+    lines = [
+        "New chat", "chats and more", "You have Notifications", "How can I help?",
+        "How can I help", "a line", "xx zzz", "call 555-1234", "starred items",
+        "plain conversation text", "", "NEW CHAT",
+    ]
+    noise_filter = NoiseFilter(patterns)
+    for line in lines:
+        expected = any(re.search(p, line, re.IGNORECASE) for p in patterns)
+        assert noise_filter.is_noise(line) == expected, line
+    
+    # Pattern set loadable from a JSON file
+    patterns_file = tmp_path / "noise.json"
+    patterns_file.write_text(json.dumps([r'^Sidebar']), encoding='utf-8')
+    curator = ClaudeCurator(str(tmp_path), str(tmp_path / "processed"),
+                            noise_filter=NoiseFilter.from_file(str(patterns_file)))
+    assert curator.extract_conversation_content("Sidebar\nNew chat") == "New chat"
+
+
+def test_writer_batches_into_one_tuned_connection(tmp_path):
+    curator = ClaudeCurator(str(tmp_path), str(tmp_path / "processed"), commit_size=3)
+    writer = curator.writer
+    assert writer.conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert writer.conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+    
+    rows = [{'content': f"bulk message {i} about executemany batching", 'timestamp': f"2025-11-01T10:00:0{i}",
+             'content_hash': f"h{i}", 'role': 'user', 'tokens_estimate': 10} for i in range(4)]
+    assert writer.append_messages("s1", rows[:2]) == 2
+    writer.commit_if_due()
+    assert writer.pending == 2  # below commit_size - transaction still open
+    assert writer.append_messages("s1", rows) == 2  # h0/h1 already stored
+    writer.commit_if_due()
+    assert writer.pending == 0
+    
+    conn = sqlite3.connect(curator.db_path)
+    assert conn.execute('SELECT message_count FROM conversations').fetchone()[0] == 4
+    assert conn.execute("SELECT COUNT(*) FROM blobs_fts WHERE blobs_fts MATCH 'executemany'").fetchone()[0] == 4
+    conn.close()
+
+
+def dump_tables(curator: ClaudeCurator):
+    conn = sqlite3.connect(curator.db_path)
+    tables = {
+        # created_at is wall-clock time, not curated data
+        'conversations': conn.execute('''
+            SELECT id, session_id, start_time, end_time, message_count, total_chars, start_ms, end_ms
+            FROM conversations ORDER BY id
+        ''').fetchall(),
+        'messages': conn.execute('SELECT * FROM messages ORDER BY id').fetchall(),
+        'ledger': conn.execute('''
+            SELECT file_name, session_id, byte_offset, last_message_number, size, last_text_hash
+            FROM ingest_ledger ORDER BY file_name
+        ''').fetchall(),
+        'fts': conn.execute("SELECT rowid FROM blobs_fts WHERE blobs_fts MATCH 'turn' ORDER BY rowid").fetchall()
+    }
+    conn.close()
+    return tables
+
+
+def test_parallel_curation_matches_sequential(tmp_path):
+    raw_logs = tmp_path / "raw_logs"
+    raw_logs.mkdir()
+    for n in range(6):
+        texts = [f"New chat\nSession {n} turn {i}: " + "details about the rollout plan " * 3
+                 for i in range(40)]
+        texts[10] = texts[9]  # repeated capture
+        write_raw_log(raw_logs / f"s{n}.jsonl", f"s{n}", texts)
+    
+    sequential = ClaudeCurator(str(raw_logs), str(tmp_path / "sequential"), batch_size=7)
+    parallel = ClaudeCurator(str(raw_logs), str(tmp_path / "parallel"), batch_size=7)
+    
+    sequential.process_all_logs()
+    parallel.process_all_logs(workers=3)
+    assert dump_tables(parallel) == dump_tables(sequential)
+    assert len(dump_tables(parallel)['messages']) == 6 * 39
+    
+    # Incremental runs stay in step too
+    write_raw_log(raw_logs / "s2.jsonl", "s2", ["New chat\nSession 2 turn 40: a late follow-up question about the rollout plan"], 40)
+    sequential.process_all_logs()
+    parallel.process_all_logs(workers=3)
+    assert dump_tables(parallel) == dump_tables(sequential)
+    assert len(dump_tables(parallel)['messages']) == 6 * 39 + 1
+
+
+def test_extraction_workers_stream_batches_through_a_bounded_queue(tmp_path):
+    curator = make_curator(tmp_path, batch_size=5)
+    texts = [f"New chat\nTurn {i}: " + "details about the rollout plan " * 3 for i in range(23)]
+    write_raw_log(curator.raw_logs_dir / "s1.jsonl", "s1", texts)
+    init_extract_worker(curator.noise_filter.patterns, 5, None)
+    
+    batches = queue.Queue(maxsize=BATCHES_AHEAD_PER_FILE)
+    worker = threading.Thread(target=lambda: results.append(extract_single_file(
+        str(curator.raw_logs_dir / "s1.jsonl"), CapturePipeline.new_progress(), None, batches)))
+    results = []
+    worker.start()
+    time.sleep(0.2)
+    # The worker waits on the writer instead of holding the whole file
+    assert worker.is_alive() and batches.full()
+    
+    streamed = list(iter(batches.get, None))
+    worker.join()
+    assert [len(batch) for batch, _ in streamed] == [5, 5, 5, 5, 3]
+    assert [progress['captures'] for _, progress in streamed][-1] == 23
+    assert results[0]['success'] and 'batches' not in results[0]
+
+
+def test_bodies_are_shared_across_sessions_and_refcounted(tmp_path):
+    curator = make_curator(tmp_path, near_duplicate_threshold=0)  # s2 would be a near-duplicate
+    shared = "New chat\nShared boilerplate answer that shows up in more than one conversation"
+    write_raw_log(curator.raw_logs_dir / "s1.jsonl", "s1", [shared, shared + "\nfirst session follow-up text"])
+    write_raw_log(curator.raw_logs_dir / "s2.jsonl", "s2", [shared + "\n"])  # new text_hash, same body
+    curator.process_all_logs()
+    
+    conn = curator.writer.conn
+    assert conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0] == 3
+    assert conn.execute('SELECT COUNT(*), SUM(refcount) FROM blobs').fetchone() == (2, 3)
+    hits = conn.execute('''
+        SELECT c.session_id FROM blobs_fts
+        JOIN messages m ON m.blob_id = blobs_fts.rowid
+        JOIN conversations c ON c.id = m.conversation_id
+        WHERE blobs_fts MATCH 'boilerplate' ORDER BY c.session_id
+    ''').fetchall()
+    assert hits == [('s1',), ('s2',)]  # the follow-up turn holds only its own text
+    
+    # Cleanup only removes bodies nothing points at
+    conn.execute("DELETE FROM messages WHERE conversation_id = (SELECT id FROM conversations WHERE session_id = 's1')")
+    assert curator.writer.delete_unreferenced_blobs() == 1
+    curator.writer.commit()
+    assert conn.execute('SELECT refcount FROM blobs').fetchall() == [(1,)]
+    assert conn.execute("SELECT COUNT(*) FROM blobs_fts WHERE blobs_fts MATCH 'follow'").fetchone()[0] == 0
+
+
+def test_segmenter_aligns_growth_scroll_and_streaming():
+    chrome, footer = ["Recents"], ["Reply to Claude..."]
+    a, b, c, d = "You: first question", "First answer", "You: second question", "Second answer"
+    
+    assert new_lines([], chrome + [a] + footer) == chrome + [a] + footer
+    assert new_lines(chrome + [a] + footer, chrome + [a, b] + footer) == [b]                # grew
+    assert new_lines(chrome + [a, b, c] + footer, chrome + [b, c, d] + footer) == [d]       # scrolled
+    assert new_lines(chrome + [a, b] + footer, chrome + [a, b + " more"] + footer) == [b + " more"]
+    assert new_lines(chrome + [a, b] + footer, chrome + [b + " more", c] + footer) == [b + " more", c]
+    assert new_lines(chrome + [a, b] + footer, chrome + [a, b] + footer) == []              # re-render
+
+
+def test_replayed_session_is_segmented_into_turns(tmp_path):
+    # Fixture: a synthetic session replayed through the Logger's format -
+    # whole-window snapshots that grow, scroll and re-render
+    expected = json.loads((FIXTURES / "replayed_session_turns.json").read_text(encoding='utf-8'))
+    lines = (FIXTURES / "replayed_session.jsonl").read_text(encoding='utf-8').splitlines(keepends=True)
+    
+    curator = make_curator(tmp_path / "whole", near_duplicate_threshold=0)
+    (curator.raw_logs_dir / "replayed_session.jsonl").write_text(''.join(lines), encoding='utf-8')
+    curator.process_all_logs()
+    assert [row[3] for row in stored_messages(curator)] == expected
+    
+    # Curated in two runs, the second resumes from the ledger's last snapshot
+    curator = make_curator(tmp_path / "split", near_duplicate_threshold=0)
+    log_file = curator.raw_logs_dir / "replayed_session.jsonl"
+    log_file.write_text(''.join(lines[:12]), encoding='utf-8')
+    curator.process_all_logs()
+    with open(log_file, 'a', encoding='utf-8') as f:
+        f.write(''.join(lines[12:]))
+    curator.process_all_logs()
+    assert [row[3] for row in stored_messages(curator)] == expected
+
+
+def test_compressor_output_curates_like_the_raw_log(tmp_path):
+    expected = json.loads((FIXTURES / "replayed_session_turns.json").read_text(encoding='utf-8'))
+    curator = make_curator(tmp_path, near_duplicate_threshold=0)
+    
+    compressor = DeltaCompressor(str(FIXTURES), str(curator.raw_logs_dir))
+    compressed_file = compressor.compress_log_file(FIXTURES / "replayed_session.jsonl")
+    diff_types = {json.loads(line)['diff']['type'] for line in compressed_file.open(encoding='utf-8')}
+    assert {'full', 'delta', 'identical'} <= diff_types
+    
+    # Reconstruction (raw_text) matches the Logger's captures byte for byte
+    raw = [json.loads(line) for line in (FIXTURES / "replayed_session.jsonl").open(encoding='utf-8')]
+    assert [c['raw_text'] for c in curator.parse_raw_log(compressed_file)] == [r['raw_text'] for r in raw]
+    
+    # Delta-aware extraction (noise filter on touched lines only) gives the same turns
+    curator.process_all_logs()
+    assert [row[3] for row in stored_messages(curator)] == expected
+
+
+def test_compressed_and_raw_logs_split_lines_alike(tmp_path):
+    # Line breaks other than '\n' inside captures: bare CR, CRLF, U+2028, vertical tab
+    turns = [f"Turn {i}: the answer\rcontinues here\u2028and here\r\nthen\x0bends {'x' * 20}\n" for i in range(12)]
+    texts = ["New chat\n" + ''.join(turns[max(0, n - 4):n + 1]) + "Reply to Claude..." for n in range(12)]
+    texts.insert(6, texts[5].replace("Turn 5", "Turn five"))
+    
+    raw_curator = make_curator(tmp_path / "raw", near_duplicate_threshold=0)
+    write_raw_log(raw_curator.raw_logs_dir / "breaks.jsonl", "breaks", texts)
+    raw_curator.process_all_logs()
+    expected = stored_messages(raw_curator)
+    assert any('\u2028' in turn or '\r' in turn for turn in texts) and expected
+    
+    for fmt in (1, 2):
+        curator = make_curator(tmp_path / f"v{fmt}", near_duplicate_threshold=0)
+        compressor = DeltaCompressor(str(raw_curator.raw_logs_dir), str(curator.raw_logs_dir), compressed_format=fmt)
+        compressor.compress_log_file(raw_curator.raw_logs_dir / "breaks.jsonl")
+        curator.process_all_logs()
+        assert stored_messages(curator) == expected
+
+
+def test_line_dictionary_format_reads_like_literal_lines(tmp_path):
+    raw = [json.loads(line) for line in (FIXTURES / "replayed_session.jsonl").open(encoding='utf-8')]
+    expected = json.loads((FIXTURES / "replayed_session_turns.json").read_text(encoding='utf-8'))
+    
+    outputs = {}
+    for fmt in (1, 2):
+        curator = make_curator(tmp_path / f"v{fmt}", near_duplicate_threshold=0)
+        compressor = DeltaCompressor(str(FIXTURES), str(curator.raw_logs_dir), compressed_format=fmt)
+        compressed_file = compressor.compress_log_file(FIXTURES / "replayed_session.jsonl")
+        outputs[fmt] = records = [json.loads(line) for line in compressed_file.open(encoding='utf-8')]
+        
+        # Both formats decompress, and curate, to the Logger's captures
+        restored = compressor.decompress_log_file(compressed_file)
+        assert [json.loads(line)['raw_text'] for line in restored.open(encoding='utf-8')] == [r['raw_text'] for r in raw]
+        assert [c['raw_text'] for c in curator.parse_raw_log(compressed_file)] == [r['raw_text'] for r in raw]
+        restored.unlink()
+        curator.process_all_logs()
+        assert [row[3] for row in stored_messages(curator)] == expected
+        
+        # Capture by capture, with the file's dictionary threaded through
+        dictionary, previous = LineDictionary(), ''
+        for record, capture in zip(records, raw):
+            previous = compressor.decompress_capture(record, previous, dictionary)
+            assert previous == capture['raw_text']
+    
+    assert all('format' not in r['diff'] for r in outputs[1])
+    assert {r['diff'].get('format') for r in outputs[2] if r['diff']['type'] != 'identical'} == {2}
+    
+    # Lines scrolled out of the window and back are written once
+    paragraphs = [f"Paragraph {i}: the line dictionary stores each distinct line only once\n" for i in range(60)]
+    write_raw_log(tmp_path / "scrolling.jsonl", "scrolling",
+                  [''.join(paragraphs[top:top + 20]) for top in (0, 30, 0, 30, 10, 40, 0, 30, 10)])
+    sizes = {}
+    for fmt in (1, 2):
+        compressor = DeltaCompressor(str(tmp_path), str(tmp_path / f"scrolling_v{fmt}"), compressed_format=fmt)
+        sizes[fmt] = compressor.compress_log_file(tmp_path / "scrolling.jsonl").stat().st_size
+    assert sizes[2] < sizes[1] / 2
+    
+    with pytest.raises(ValueError):
+        DeltaCompressor(str(FIXTURES), str(tmp_path), compressed_format=3)
+
+
+def test_delta_container_holds_the_jsonl_records(tmp_path):
+    raw = [json.loads(line) for line in (FIXTURES / "replayed_session.jsonl").open(encoding='utf-8')]
+    expected = json.loads((FIXTURES / "replayed_session_turns.json").read_text(encoding='utf-8'))
+    stats = ('size', 'original_size', 'compression_ratio')
+    
+    for fmt in (1, 2):
+        jsonl = DeltaCompressor(str(FIXTURES), str(tmp_path / f"jsonl_v{fmt}"), compressed_format=fmt)
+        jsonl_file = jsonl.compress_log_file(FIXTURES / "replayed_session.jsonl")
+        curator = make_curator(tmp_path / f"binary_v{fmt}", near_duplicate_threshold=0)
+        binary = DeltaCompressor(str(FIXTURES), str(curator.raw_logs_dir), compressed_format=fmt, container='binary')
+        binary_file = binary.compress_log_file(FIXTURES / "replayed_session.jsonl")
+        assert binary_file.name == "compressed_replayed_session.aldc"
+        assert binary_file.stat().st_size < jsonl_file.stat().st_size * 0.75
+        
+        # Same records (less the per-diff statistics), blocks of any size
+        records = list(JsonlReader(jsonl_file).records())
+        for record in records:
+            record['diff'] = {key: value for key, value in record['diff'].items() if key not in stats}
+        for block_records in (1, 7, BLOCK_RECORDS):
+            write_container(tmp_path / "blocks.aldc", records, block_records)
+            assert list(read_container(tmp_path / "blocks.aldc")) == records
+        assert list(read_container(convert_to_container(jsonl_file))) == records
+        
+        # Either container decompresses, and curates, like the JSONL file
+        restored = binary.decompress_log_file(binary_file)
+        assert [json.loads(line)['raw_text'] for line in restored.open(encoding='utf-8')] == [r['raw_text'] for r in raw]
+        restored.unlink()
+        curator.process_all_logs()
+        assert [row[3] for row in stored_messages(curator)] == expected
+    
+    # Non-ASCII and lone surrogates, odd hashes, several sessions and capture methods
+    odd = [{'session_id': f"s{n % 2}", 'timestamp': f"2025-11-0{n + 1}T10:00:00", 'message_number': 10 - 3 * n,
+            'text_hash': ["abc", "0" * 32, "F" * 32][n], 'capture_method': ["ui", "ocr"][n % 2],
+            'diff': diff} for n, diff in enumerate([
+                {'type': 'full', 'content': "héllo ✓ \ud800 wörld\n"},
+                {'type': 'identical'},
+                {'type': 'delta', 'changes': [{'op': 'insert', 'position': 1, 'new_lines': ["日本語\n", ""]},
+                                              {'op': 'delete', 'old_start': 0, 'old_end': 1}]},
+            ])]
+    write_container(tmp_path / "odd.aldc", odd)
+    assert list(read_container(tmp_path / "odd.aldc")) == odd
+    assert list(read_compressed(tmp_path / "odd.aldc")) == odd
+
+
+def test_entropy_coded_blocks_decode_on_their_own(tmp_path):
+    raw = [json.loads(line) for line in (FIXTURES / "replayed_session.jsonl").open(encoding='utf-8')]
+    records = list(read_container(DeltaCompressor(str(FIXTURES), str(tmp_path), container='binary')
+                                  .compress_log_file(FIXTURES / "replayed_session.jsonl")))
+    stored = write_container(tmp_path / "stored.aldc", records, 7)
+    
+    for entropy in ("zlib", "lzma", "bz2"):
+        written = [write_container(tmp_path / f"{entropy}_{workers}.aldc", records, 7, entropy, workers=workers)
+                   for workers in (1, 3)]
+        output_file = tmp_path / f"{entropy}_3.aldc"
+        assert written[0] == written[1] < stored
+        assert (tmp_path / f"{entropy}_1.aldc").read_bytes() == output_file.read_bytes()
+        assert list(read_container(output_file)) == records
+        
+        # Any block decodes from its offset, without the blocks before it
+        blocks = list(iter_blocks(output_file))
+        assert len(blocks) == -(-len(records) // 7)
+        with open(output_file, 'rb') as f:
+            metadata, count = read_header(f)
+            assert count == len(records)
+            for offset, block in reversed(blocks):
+                f.seek(offset)
+                assert read_block(f, metadata) == block
+    
+    # Through the compressor, at a chosen level
+    compressor = DeltaCompressor(str(FIXTURES), str(tmp_path / "lzma"), container='binary',
+                                 entropy='lzma', entropy_level=1, block_records=16)
+    restored = compressor.decompress_log_file(compressor.compress_log_file(FIXTURES / "replayed_session.jsonl"))
+    assert [json.loads(line)['raw_text'] for line in restored.open(encoding='utf-8')] == [r['raw_text'] for r in raw]
+    
+    with pytest.raises(ValueError):
+        DeltaCompressor(str(FIXTURES), str(tmp_path), entropy='zlib')  # JSONL has no blocks
+    with pytest.raises(ValueError):
+        DeltaCompressor(str(FIXTURES), str(tmp_path), container='binary', entropy='zstd')
+
+
+def test_keyframes_bound_random_access(tmp_path):
+    # A scrolling conversation, an idle capture, a window swapped for another chat and back
+    turns = [f"Turn {i}: keyframes let a reader start replaying mid-file\n" for i in range(250)]
+    texts = [''.join(turns[max(0, n - 30):n + 1]) for n in range(200)]
+    texts[50] = texts[49]
+    texts[120] = ''.join(f"Another chat, line {i}\n" for i in range(10))
+    write_raw_log(tmp_path / "long.jsonl", "long", texts)
+    curator = make_curator(tmp_path / "curator")
+    
+    for fmt in (1, 2):
+        for container in ("jsonl", "binary"):
+            compressor = DeltaCompressor(str(tmp_path), str(tmp_path / f"{container}_v{fmt}"), compressed_format=fmt,
+                                         container=container, block_records=16, keyframe_interval=25,
+                                         keyframe_ratio=0.9)
+            compressed_file = compressor.compress_log_file(tmp_path / "long.jsonl")
+            records = list(read_compressed(compressed_file))
+            keyframes = [n for n, record in enumerate(records) if record['diff'].get('keyframe')]
+            
+            # Every 25 deltas, and wherever the window was replaced outright
+            assert keyframes[0] == 0 and {120, 121} <= set(keyframes)
+            for start, end in zip(keyframes, keyframes[1:] + [len(records)]):
+                assert sum(record['diff']['type'] == 'delta' for record in records[start:end]) <= 25
+            
+            # Any capture, by number or time, replayed from the keyframe before it
+            index = SeekIndex.load(compressed_file)
+            assert index_path(compressed_file).exists() and index.keyframes == keyframes
+            assert index.keyframe_for(137) == max(k for k in keyframes if k <= 137)
+            for n in (0, 49, 50, 119, 120, 121, 137, 199):
+                capture = get_capture(compressed_file, n, index)
+                assert (capture['message_number'], capture['raw_text']) == (n, texts[n])
+            assert get_at_time(compressed_file, "2025-11-01T10:01:01.5", index)['raw_text'] == texts[61]
+            assert get_at_time(compressed_file, "2025-10-31T23:59:59") is None
+            assert get_capture(compressed_file, 999) is None
+            
+            # Without the sidecar the file is scanned instead
+            index_path(compressed_file).unlink()
+            assert get_capture(compressed_file, 160)['raw_text'] == texts[160]
+            
+            # Sequential readers replay straight through the keyframes
+            assert [c['raw_text'] for c in curator.parse_raw_log(compressed_file)] == texts
+            dictionary, previous = LineDictionary(), ''
+            for record, text in zip(records, texts):
+                previous = compressor.decompress_capture(record, previous, dictionary)
+                assert previous == text
+    
+    # Files without keyframes past the first still read at random, from the start
+    compressor = DeltaCompressor(str(tmp_path), str(tmp_path / "no_keyframes"), keyframe_interval=0)
+    compressed_file = compressor.compress_log_file(tmp_path / "long.jsonl")
+    assert SeekIndex.load(compressed_file).keyframes == [0]
+    assert get_capture(compressed_file, 150)['raw_text'] == texts[150]
+
+
+def test_parallel_worker_writes_what_the_compressor_writes(tmp_path):
+    for fmt in (1, 2):
+        for engine in ("difflib", "myers"):
+            expected = DeltaCompressor(str(FIXTURES), str(tmp_path / f"seq_{fmt}_{engine}"), diff_engine=engine,
+                                       compressed_format=fmt, keyframe_interval=3)
+            expected_file = expected.compress_log_file(FIXTURES / "replayed_session.jsonl")
+            result = compress_single_file(str(FIXTURES / "replayed_session.jsonl"), str(expected.output_dir.parent),
+                                          diff_engine=engine, compressed_format=fmt, keyframe_interval=3)
+            assert result['success'], result
+            assert Path(result['output_file']).read_bytes() == expected_file.read_bytes()
+    
+    assert not compress_single_file(str(FIXTURES / "replayed_session.jsonl"), str(tmp_path), entropy='zlib')['success']
+
+
+def test_diff_engines_emit_the_same_op_format(tmp_path):
+    # Windows of several hundred lines, mostly blank and chrome, scrolling as turns arrive
+    chrome = ["New chat\n", "Chats\n", "\n", "\n", "Reply to Claude...\n"]
+    turns = [f"Turn {i}: the delta compressor stores only changed lines\n" for i in range(400)]
+    windows = []
+    for end in (120, 121, 135, 135, 300, 40):
+        body = [line for turn in turns[max(0, end - 100):end] for line in (turn, "\n", "\n")]
+        windows.append(''.join(chrome + body + chrome))
+    windows.append(windows[-1].replace("Turn 3", "Turn three"))
+    
+    deltas = {}
+    for engine in ("difflib", "myers"):
+        compressor = DeltaCompressor(str(tmp_path), str(tmp_path / engine), diff_engine=engine)
+        previous = ''
+        deltas[engine] = []
+        for window in windows:
+            diff = compressor.compute_diff(previous, window)
+            # Either engine's ops rebuild the window through the one decoder
+            assert DeltaCompressor(str(tmp_path), str(tmp_path)).decompress_capture({'diff': diff}, previous) == window
+            deltas[engine].append(diff['size'])
+            previous = window
+    
+    # Minimal edit scripts: never more changed text than SequenceMatcher
+    assert all(m <= d for m, d in zip(deltas['myers'], deltas['difflib']))
+    assert sum(deltas['myers']) < sum(deltas['difflib'])
+    
+    # Past the edit budget the middle becomes one replace, still exact
+    old, new = [f"{i}\n" for i in range(50)], [f"{i}\n" for i in range(50, 100)]
+    assert myers_opcodes(old, new, max_cost=10) == [('replace', 0, 50, 0, 50)]
+    with pytest.raises(ValueError):
+        get_diff_engine('patience')
+
+
+def test_simhash_bands_find_near_duplicate_snapshots(tmp_path):
+    body = [f"Line {i}: the curator stores each conversation turn once and indexes it" for i in range(30)]
+    base = snapshot_fingerprint(body + ["Edited 2 minutes ago"])
+    assert hamming(base, snapshot_fingerprint(body + ["Edited 3 minutes ago"])) <= max_distance_for(0.9)
+    assert hamming(base, snapshot_fingerprint(body[:10] + ["Another conversation entirely"])) > max_distance_for(0.9)
+    assert max_distance_for(0) is None and max_distance_for(1.0) == 0
+    
+    # Negative fingerprints round-trip through SQLite and the band indexes
+    curator = make_curator(tmp_path)
+    conn = curator.writer.conn
+    fingerprint = (1 << 63) | 0xABCD
+    assert from_signed(to_signed(fingerprint)) == fingerprint
+    bands = conn.execute(f"SELECT {', '.join(band_sql('?1', b) for b in range(BANDS))}",
+                         (to_signed(fingerprint),)).fetchone()
+    assert list(bands) == band_values(fingerprint)
+    
+    plan = ' '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + curator.writer.near_duplicate_sql,
+                                                   (1, *band_values(fingerprint))))
+    assert all(f"idx_simhash_band{band}" in plan for band in range(BANDS))
+
+
+def test_near_duplicate_captures_collapse_within_a_session(tmp_path):
+    body = [f"Line {i}: the curator stores each conversation turn once and indexes it" for i in range(30)]
+    other = [f"Row {i}: a different window after switching to another chat in the app" for i in range(30)]
+    curator = make_curator(tmp_path, near_duplicate_threshold=0.9)
+    log_file = curator.raw_logs_dir / "s1.jsonl"
+    write_raw_log(log_file, "s1", ['\n'.join(body + [f"Edited {n} minutes ago"]) for n in (2, 3, 4)]
+                  + ['\n'.join(other)])
+    
+    stats = curator.process_log_file(log_file)
+    # "3 minutes ago" was superseded by "4 minutes ago", which the new window superseded
+    assert (stats['messages'], stats['near_duplicate_rows']) == (2, 2)
+    assert stats['near_duplicate_bytes'] == len("Edited 3 minutes ago") + len("Edited 4 minutes ago")
+    assert [row[3] for row in stored_messages(curator)] == ['\n'.join(body + ["Edited 2 minutes ago"]),
+                                                            '\n'.join(other)]
+    
+    # A near-duplicate at the end of the stream has nothing to supersede it
+    write_raw_log(log_file, "s1", ['\n'.join(other + ["Edited just now"])], 4)
+    stats = curator.process_log_file(log_file)
+    assert (stats['messages'], stats['near_duplicate_rows']) == (1, 0)
+    assert stored_messages(curator)[-1][3] == "Edited just now"
+    
+    # The replayed fixture loses no text, it just streams into fewer rows
+    expected = json.loads((FIXTURES / "replayed_session_turns.json").read_text(encoding='utf-8'))
+    curator = make_curator(tmp_path / "replayed", near_duplicate_threshold=0.9)
+    (curator.raw_logs_dir / "replayed_session.jsonl").write_bytes((FIXTURES / "replayed_session.jsonl").read_bytes())
+    curator.process_all_logs()
+    turns = [row[3] for row in stored_messages(curator)]
+    assert len(turns) < len(expected)
+    assert {line for turn in turns for line in turn.split('\n')} == \
+        {line for turn in expected for line in turn.split('\n')}
+
+
+def test_ledger_resumes_before_a_held_near_duplicate(tmp_path):
+    body = [f"Line {i}: the curator stores each conversation turn once and indexes it" for i in range(30)]
+    curator = make_curator(tmp_path, near_duplicate_threshold=0.9)
+    log_file = curator.raw_logs_dir / "s1.jsonl"
+    write_raw_log(log_file, "s1", ['\n'.join(body + [f"Edited {n} minutes ago"]) for n in (2, 3)])
+    
+    progress = curator.plan_log_file(log_file)['progress']
+    stored = []
+    
+    def interrupted():
+        yield from curator.iter_captures(log_file, progress, raw_text=False)
+        # Committed while the last capture is still held, then the run dies
+        curator.writer.append_messages("s1", stored)
+        curator.writer.update_ledger_entry(log_file.name, progress, log_file.stat())
+        curator.writer.commit()
+        raise KeyboardInterrupt
+    
+    with pytest.raises(KeyboardInterrupt):
+        stored.extend(curator.iter_extracted_messages(interrupted(), progress))
+    assert curator.writer.get_ledger_entry(log_file.name)['byte_offset'] == log_file.read_bytes().index(b'\n') + 1
+    
+    # The next run reads the held capture again instead of starting past it
+    curator.process_log_file(log_file)
+    assert [row[3] for row in stored_messages(curator)] == ['\n'.join(body + ["Edited 2 minutes ago"]),
+                                                            "Edited 3 minutes ago"]
+
+
+def test_near_duplicates_across_sessions_are_merged(tmp_path):
+    body = [f"Line {i}: the curator stores each conversation turn once and indexes it" for i in range(30)]
+    curator = make_curator(tmp_path, near_duplicate_threshold=0.9)
+    write_raw_log(curator.raw_logs_dir / "s1.jsonl", "s1", ['\n'.join(body)])
+    # The Logger restarted: the new session opens on the same window, then it grows
+    write_raw_log(curator.raw_logs_dir / "s2.jsonl", "s2", [
+        '\n'.join(body + ["Edited 1 minute ago"]),
+        '\n'.join(body[10:] + ["Edited 1 minute ago"] + [f"Reply {i}: a fresh answer paragraph arriving after the restart"
+                                                        for i in range(20)]),
+    ])
+    curator.process_all_logs()
+    
+    rows = stored_messages(curator)
+    assert [(row[0], row[3].count('\n') + 1) for row in rows] == [('s1', 30), ('s2', 1), ('s2', 20)]
+    assert rows[1][3] == "Edited 1 minute ago"
+    assert curator.writer.near_duplicate_rows == 0
+    assert curator.writer.near_duplicate_bytes == len('\n'.join(body)) + 1
+
+
+def test_near_duplicate_merge_keeps_lines_outside_the_overlap(tmp_path):
+    body = [f"Line {i}: the curator stores each conversation turn once and indexes it" for i in range(30)]
+    curator = make_curator(tmp_path, near_duplicate_threshold=0.9)
+    write_raw_log(curator.raw_logs_dir / "s1.jsonl", "s1", ['\n'.join(body)])
+    # The reply quotes a line the old session holds; only the replayed window goes
+    reply = ["Quoting the earlier turn:", body[4], "which still holds after the restart"]
+    write_raw_log(curator.raw_logs_dir / "s2.jsonl", "s2", ['\n'.join(body + reply)])
+    curator.process_all_logs()
+    
+    rows = stored_messages(curator)
+    assert [row[0] for row in rows] == ['s1', 's2']
+    assert rows[1][3] == '\n'.join(reply)
+    assert curator.writer.near_duplicate_bytes == len('\n'.join(body)) + 1
+
+
+def test_compressed_bodies_are_indexed_exported_and_cleaned_up(tmp_path):
+    turns = [f"Turn {n}: the compressor keeps only the lines that changed between two window snapshots, "
+             f"so the curator can store each conversation turn once" for n in range(6)]
+    curator = make_curator(tmp_path, body_compression='zlib', near_duplicate_threshold=0)
+    write_raw_log(curator.raw_logs_dir / "s1.jsonl", "s1",
+                  ['\n'.join(turns[:n]) for n in range(1, len(turns) + 1)])
+    curator.process_all_logs()
+    
+    conn = curator.writer.conn
+    assert conn.execute("SELECT COUNT(*) FROM blobs WHERE typeof(content) = 'blob'").fetchone()[0] == 6
+    assert conn.execute('SELECT SUM(size) FROM blobs').fetchone()[0] == sum(len(t) for t in turns)
+    assert conn.execute("SELECT COUNT(*) FROM blobs_fts WHERE blobs_fts MATCH 'snapshots'").fetchone()[0] == 6
+    
+    export_file = tmp_path / "s1.json"
+    curator.export_conversation_to_json("s1", export_file)
+    assert [m['content'] for m in json.loads(export_file.read_text())['messages']] == turns
+    
+    # A plain-text database opened in compressed mode keeps both kinds readable
+    curator.close()
+    plain = make_curator(tmp_path, near_duplicate_threshold=0)
+    write_raw_log(plain.raw_logs_dir / "s1.jsonl", "s1", ['\n'.join(turns + ["A plain follow-up turn"])], 6)
+    plain.process_all_logs()
+    assert [row[3] for row in stored_messages(plain)][-2:] == [turns[-1], "A plain follow-up turn"]
+    
+    # Deleting compressed bodies removes their index entries (the trigger decodes them)
+    conn = plain.writer.conn
+    conn.execute('DELETE FROM messages')
+    assert plain.writer.delete_unreferenced_blobs() == 7
+    plain.writer.commit()
+    assert conn.execute("SELECT COUNT(*) FROM blobs_fts WHERE blobs_fts MATCH 'snapshots'").fetchone()[0] == 0
+    conn.execute("INSERT INTO blobs_fts(blobs_fts) VALUES ('integrity-check')")
+
+
+def test_fts_indexed_from_blobs_moves_to_blob_text(tmp_path):
+    curator = make_curator(tmp_path)
+    write_raw_log(curator.raw_logs_dir / "s1.jsonl", "s1", [
+        "New chat\nHow do I configure the authentication middleware for the API server?",
+    ])
+    curator.process_all_logs()
+    curator.writer.conn.executescript('''
+        DROP TRIGGER blobs_fts_insert;
+        DROP TRIGGER blobs_fts_delete;
+        DROP TABLE blobs_fts;
+        CREATE VIRTUAL TABLE blobs_fts USING fts5(content, content='blobs', content_rowid='id');
+        INSERT INTO blobs_fts(blobs_fts) VALUES ('rebuild');
+        DROP TABLE schema_migrations;
+    ''')
+    curator.close()
+    
+    curator = make_curator(tmp_path, body_compression='zlib')
+    sql = curator.writer.conn.execute("SELECT sql FROM sqlite_master WHERE name = 'blobs_fts'").fetchone()[0]
+    assert "content='blob_text'" in sql
+    assert curator.writer.conn.execute(
+        "SELECT COUNT(*) FROM blobs_fts WHERE blobs_fts MATCH 'middleware'").fetchone()[0] == 1
+
+
+def test_naive_timestamps_are_read_as_local_time(tmp_path, monkeypatch):
+    # Ten in the morning at UTC+14 is still the day before in UTC
+    monkeypatch.setenv('TZ', 'XST-14')
+    time.tzset()
+    try:
+        local_ms = int(datetime(2025, 11, 1, 10).timestamp() * 1000)
+        assert epoch_ms("2025-11-01T10:00:00") == local_ms == epoch_ms("2025-10-31T20:00:00+00:00")
+        assert capture_time("2025-11-01T10:00:00") * 1000 == local_ms
+        
+        curator = make_curator(tmp_path, near_duplicate_threshold=0)
+        write_raw_log(curator.raw_logs_dir / "s1.jsonl", "s1", [
+            "New chat\nA morning question about the stats counters and their days",
+            "New chat\nA morning question about the stats counters and their days\nAnd the answer"])
+        curator.process_all_logs()
+        conn = curator.writer.conn
+        assert [day['day'] for day in read_daily_stats(conn)] == ['2025-11-01']
+        assert conn.execute('SELECT start_ms FROM conversations').fetchone()[0] == local_ms
+        assert month_bounds('2025-11')[0] == epoch_ms("2025-11-01T00:00:00")
+        assert archivable_months(conn, epoch_ms("2025-12-01T00:00:00")) == ['2025-11']
+        curator.close()
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+
+def test_interrupted_migration_resumes_from_its_cursor(tmp_path, capsys):
+    curator = make_curator(tmp_path, near_duplicate_threshold=0)
+    write_raw_log(curator.raw_logs_dir / "s1.jsonl", "s1", [
+        f"Message {i}: " + "a backfill walks the messages a chunk at a time " * 2 for i in range(7)])
+    curator.process_all_logs()
+    conn = curator.writer.conn
+    history = Migrator(conn).history()
+    assert [state['version'] for state in history] == [migration.version for migration in MIGRATIONS]
+    assert {state['status'] for state in history} <= {'done', 'in place'}
+    
+    interrupt_at = [5]
+    
+    def doubled(message_id, tokens):
+        if message_id == interrupt_at[0]:
+            raise RuntimeError("interrupted")
+        return tokens * 2
+    
+    conn.create_function('doubled', 2, doubled)
+    backfill = Migration(100, 'tokens backfill', [
+        statements('ALTER TABLE messages ADD COLUMN tokens_doubled INTEGER'),
+        Batched('messages', 'UPDATE messages SET tokens_doubled = doubled(id, tokens_estimate) '
+                            'WHERE id > ? AND id <= ?'),
+    ])
+    with pytest.raises(sqlite3.OperationalError):
+        Migrator(conn, [backfill], batch_rows=2).migrate()
+    
+    # The failed chunk rolled back; the ones before it stay done
+    state = Migrator(conn).history()[-1]
+    assert (state['status'], state['step'], state['cursor'], state['high_water'], state['rows']) == \
+        ('running', 1, 4, 7, 4)
+    assert [row[0] for row in conn.execute('SELECT tokens_doubled IS NOT NULL FROM messages ORDER BY id')] == \
+        [1, 1, 1, 1, 0, 0, 0]
+    
+    interrupt_at[0] = None
+    capsys.readouterr()
+    Migrator(conn, [backfill], batch_rows=2).migrate()
+    assert "Resuming schema migration 100 (tokens backfill)" in capsys.readouterr().out
+    state = Migrator(conn).history()[-1]
+    assert (state['status'], state['step'], state['rows']) == ('done', 2, 7)
+    assert state['seconds'] > 0 and state['finished_at']
+    assert conn.execute('SELECT COUNT(*) FROM messages WHERE tokens_doubled = tokens_estimate * 2').fetchone()[0] == 7
+    
+    # Done migrations are not run again
+    Migrator(conn, [backfill], batch_rows=2).migrate()
+    assert capsys.readouterr().out == ""
+
+
+def test_stats_counters_follow_inserts_and_deletes(tmp_path, capsys):
+    curator = make_curator(tmp_path, near_duplicate_threshold=0)
+    question = "New chat\nHow do I rotate the API keys used by the deployment workers?"
+    write_raw_log(curator.raw_logs_dir / "s1.jsonl", "s1", [
+        question, question + "\nRun the rotate command, then restart the workers one at a time.",
+    ])
+    backup = "New chat\nWhat does the nightly backup job copy to the archive server?"
+    write_raw_log(curator.raw_logs_dir / "s2.jsonl", "s2", [backup])
+    curator.process_all_logs()
+    conn = curator.writer.conn
+    
+    def counted():
+        return read_stats(conn), read_daily_stats(conn)
+    
+    def recomputed():
+        recompute_stats(conn)
+        return counted()
+    
+    totals, daily = counted()
+    assert totals['conversations'] == 2
+    assert totals['messages'] == conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0]
+    assert totals['total_chars'] == conn.execute('SELECT SUM(total_chars) FROM conversations').fetchone()[0]
+    assert totals['by_role'] == dict(conn.execute('SELECT role, COUNT(*) FROM messages GROUP BY role'))
+    assert daily == [{'day': '2025-11-01', 'messages': totals['messages'],
+                      'chars': conn.execute('SELECT SUM(size) FROM blobs').fetchone()[0]}]
+    assert (totals, daily) == recomputed()
+    
+    # Incremental ingest, deletes and blob cleanup keep the counters exact
+    write_raw_log(curator.raw_logs_dir / "s2.jsonl", "s2",
+                  [backup + "\nIt copies the conversation database and the raw capture logs."], 1)
+    curator.process_all_logs()
+    conn.execute("DELETE FROM messages WHERE conversation_id = (SELECT id FROM conversations WHERE session_id = 's1')")
+    conn.execute("DELETE FROM conversations WHERE session_id = 's1'")
+    curator.writer.delete_unreferenced_blobs()
+    curator.writer.commit()
+    totals, daily = counted()
+    assert totals['conversations'] == 1 and totals['blobs'] == 2
+    assert (totals, daily) == recomputed()
+    
+    capsys.readouterr()
+    curator.show_summary()
+    assert f"Messages: {totals['messages']}" in capsys.readouterr().out
+    
+    # A database curated before the counters existed is counted when reopened
+    conn.executescript('DROP TABLE stats; DROP TABLE daily_stats;')
+    curator.close()
+    curator = make_curator(tmp_path)
+    assert read_stats(curator.writer.conn) == totals
+
+
+def days_since(day: str) -> int:
+    """Days from a date to now - archiving with this cutoff closes every month before day's."""
+    return int((time.time() * 1000 - epoch_ms(day)) // 86400000)
+
+
+def test_closed_months_move_into_sealed_shards(tmp_path, capsys):
+    curator = make_curator(tmp_path, near_duplicate_threshold=0)
+    question = "New chat\nHow should the archive rotate the monthly shard databases?"
+    write_raw_log(curator.raw_logs_dir / "oct.jsonl", "oct", [
+        question, question + "\nArchive each month into its own sealed shard once it is over."], day="2025-10-20")
+    write_raw_log(curator.raw_logs_dir / "nov.jsonl", "nov", [
+        "New chat\nWhich month is still open in the live shard database?"], day="2025-11-02")
+    curator.process_all_logs()
+    live = curator.writer.conn
+    before = read_stats(live)
+    
+    archived = curator.archive_shards(days_since("2025-11-15"))
+    assert [entry['month'] for entry in archived] == ['2025-10']
+    shard = curator.catalog.shards()[0]
+    assert shard['name'] == "conversations-2025-10.db"
+    assert (shard['start_ms'], shard['conversations'], shard['messages']) == (epoch_ms("2025-10-20T10:00:00"), 1, 2)
+    assert not shard['path'].stat().st_mode & stat.S_IWUSR
+    
+    # The live database keeps only the open month, its counters following the move
+    assert live.execute('SELECT session_id FROM conversations').fetchall() == [('nov',)]
+    assert live.execute('SELECT COUNT(*) FROM blobs').fetchone()[0] == 1
+    after = read_stats(live)
+    assert after['messages'] == before['messages'] - 2
+    recompute_stats(live)
+    assert read_stats(live) == after
+    
+    # The shard is complete: its bodies, FTS index and counters came along
+    conn = sqlite3.connect(shard_uri(shard['path']), uri=True)
+    BodyCodec(conn).register()
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+    assert conn.execute("SELECT COUNT(*) FROM blobs_fts WHERE blobs_fts MATCH 'sealed'").fetchone()[0] == 1
+    assert conn.execute('SELECT refcount FROM blobs ORDER BY id').fetchall() == [(1,), (1,)]
+    assert read_stats(conn)['messages'] == 2 and read_daily_stats(conn)[0]['day'] == '2025-10-20'
+    conn.close()
+    
+    # Reads cover the shards; late logs for an archived month get a second shard
+    capsys.readouterr()
+    curator.search_conversations("shard")
+    out = capsys.readouterr().out
+    assert "Found 3 results" in out
+    assert out.index("2025-11-02") < out.index("2025-10-20T10:00:01") < out.index("2025-10-20T10:00:00")
+    curator.export_conversation_to_json("oct", tmp_path / "oct.json")
+    assert len(json.loads((tmp_path / "oct.json").read_text())['messages']) == 2
+    
+    write_raw_log(curator.raw_logs_dir / "late.jsonl", "late", [
+        "New chat\nA late October log curated after the month was archived"], day="2025-10-30")
+    curator.process_all_logs()
+    curator.archive_shards(days_since("2025-11-15"))
+    assert [s['name'] for s in curator.catalog.shards()] == ["conversations-2025-10.db", "conversations-2025-10-2.db"]
+    assert live.execute('SELECT COUNT(*) FROM conversations').fetchone()[0] == 1
+
+
+def test_bulk_export_round_trips_every_format(tmp_path, capsys):
+    curator = make_curator(tmp_path / "source", body_compression='zlib', near_duplicate_threshold=0)
+    for month in ("2025-09", "2025-10", "2025-11"):
+        write_raw_log(curator.raw_logs_dir / f"{month}.jsonl", month, [
+            f"Which conversations went into the {month} export of the archive?",
+            f"Every {month} record is streamed from the cursors, ünicode included.",
+        ], day=f"{month}-05")
+    curator.process_all_logs()
+    expected = stored_messages(curator)
+    
+    outputs = {}
+    for fmt, compress in (('ndjson', False), ('binary', False), ('binary', True)):
+        output = tmp_path / f"export-{fmt}-{compress}"
+        totals = curator.bulk_export(output, fmt, compress)
+        assert (totals['conversations'], totals['messages'], totals['bytes']) == (3, 6, output.stat().st_size)
+        outputs[fmt, compress] = output.read_bytes()
+        
+        target = make_curator(tmp_path / f"import-{fmt}-{compress}")
+        assert target.bulk_import(output)['stored'] == 6
+        assert stored_messages(target) == expected
+        assert target.bulk_import(output)['stored'] == 0  # content hashes make it idempotent
+    assert len(outputs['binary', True]) < len(outputs['binary', False]) < len(outputs['ndjson', False])
+    
+    # Shards export the same records; parallel units the same bytes as one worker
+    curator.archive_shards(days_since("2025-11-15"))
+    for fmt, compress in outputs:
+        curator.bulk_export(tmp_path / "sequential", fmt, compress)
+        curator.bulk_export(tmp_path / "parallel", fmt, compress, workers=2)
+        assert (tmp_path / "parallel").read_bytes() == (tmp_path / "sequential").read_bytes()
+        assert list(iter_export(tmp_path / "parallel")) == list(iter_export(tmp_path / f"export-{fmt}-{compress}"))
+    
+    curator.bulk_export(tmp_path / "october", after_date="2025-10-01", before_date="2025-10-31")
+    records = [json.loads(line) for line in (tmp_path / "october").read_text().splitlines()]
+    assert {r['session_id'] for r in records} == {'2025-10'}
+    
+    capsys.readouterr()
+    assert curator.bulk_export(tmp_path / "bad", 'ndjson', compress=True) is None
+    assert curator.bulk_export(tmp_path / "bad", after_date="last tuesday") is None
+    assert "Invalid date" in capsys.readouterr().out
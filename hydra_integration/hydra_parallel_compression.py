@@ -1,19 +1,29 @@
-import json
-import sys
-import time
-from compressor.delta_compressor import DeltaCompressor
-            import os
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
 Hydra Parallel Compression - TRUE SIMULTANEOUS EXECUTION
 Uses ProcessPoolExecutor for actual multi-core parallel processing
+
+Files are written in the configured container - compressed JSONL by
+default, or a binary delta container (see compressor/container) whose
+blocks can be entropy coded with zlib / lzma / bz2. With fewer files than
+cores, each worker also spreads its file's container blocks over the
+spare ones.
 """
 
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List
 
 # Add parent to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
-
+from compressor.container import CONTAINER_SUFFIX
+from compressor.delta_compressor import DeltaCompressor
+from config import COMPRESSED_BLOCK_RECORDS, COMPRESSED_CONTAINER, COMPRESSED_ENTROPY, COMPRESSED_ENTROPY_LEVEL
 
 
 def compress_single_file(task_data: Dict) -> Dict:
@@ -31,7 +41,12 @@ def compress_single_file(task_data: Dict) -> Dict:
         # Create compressor instance for this worker
         compressor = DeltaCompressor(
             str(input_file.parent),
-            str(output_dir)
+            str(output_dir),
+            container=task_data.get('container', COMPRESSED_CONTAINER),
+            entropy=task_data.get('entropy', COMPRESSED_ENTROPY),
+            entropy_level=task_data.get('entropy_level', COMPRESSED_ENTROPY_LEVEL),
+            block_records=task_data.get('block_records', COMPRESSED_BLOCK_RECORDS),
+            block_workers=task_data.get('workers', 1)
         )
         
         # Compress the file
@@ -79,11 +94,19 @@ class HydraParallelCompressor:
     Uses ProcessPoolExecutor for simultaneous multi-core execution.
     """
     
-    def __init__(self, raw_logs_dir: str, compressed_dir: str, max_workers: int = None):
+    def __init__(self, raw_logs_dir: str, compressed_dir: str, max_workers: int = None,
+                 container: str = COMPRESSED_CONTAINER, entropy: str = COMPRESSED_ENTROPY,
+                 entropy_level: int = COMPRESSED_ENTROPY_LEVEL, block_records: int = COMPRESSED_BLOCK_RECORDS):
         self.raw_logs_dir = Path(raw_logs_dir)
         self.compressed_dir = Path(compressed_dir)
         self.compressed_dir.mkdir(exist_ok=True)
         
+        # Output file (jsonl or binary) and, for binary, its blocks: entropy codec and level, records per block
+        self.container = container
+        self.entropy = entropy
+        self.entropy_level = entropy_level
+        self.block_records = block_records
+        
         # Determine number of workers (cores to use)
         if max_workers is None:
             # Use all available cores, cap at 20
@@ -98,8 +121,8 @@ class HydraParallelCompressor:
         
         uncompressed = []
         for log_file in self.raw_logs_dir.glob("*.jsonl"):
-            compressed_name = f"compressed_{log_file.name}"
-            if not (self.compressed_dir / compressed_name).exists():
+            compressed_names = (f"compressed_{log_file.name}", f"compressed_{log_file.stem}{CONTAINER_SUFFIX}")
+            if not any((self.compressed_dir / name).exists() for name in compressed_names):
                 uncompressed.append(log_file)
         
         return uncompressed
@@ -127,12 +150,16 @@ class HydraParallelCompressor:
                 'duration': 0
             }
         
+        # Fewer files than cores: spread each file's container blocks over the spare ones
+        block_workers = max(1, self.max_workers // len(files))
+        
         print()
         print("=" * 70)
         print("HYDRA PARALLEL COMPRESSION - TRUE SIMULTANEOUS EXECUTION")
         print("=" * 70)
         print(f"[HYDRA] Files to compress: {len(files)}")
-        print(f"[HYDRA] Worker cores: {self.max_workers}")
+        print(f"[HYDRA] Worker cores: {self.max_workers} ({block_workers} per file for container blocks)")
+        print(f"[HYDRA] Container: {self.container} (entropy stage: {self.entropy})")
         print(f"[HYDRA] Mode: PARALLEL (all cores running SIMULTANEOUSLY)")
         print("=" * 70)
         print()
@@ -143,7 +170,12 @@ class HydraParallelCompressor:
             task = {
                 'task_id': f"compress_{idx}",
                 'input_file': str(file_path),
-                'output_dir': str(self.compressed_dir)
+                'output_dir': str(self.compressed_dir),
+                'container': self.container,
+                'entropy': self.entropy,
+                'entropy_level': self.entropy_level,
+                'block_records': self.block_records,
+                'workers': block_workers
             }
             tasks.append(task)
         
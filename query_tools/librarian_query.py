@@ -1,9 +1,3 @@
-import sys
-import sqlite3
-import json
-from datetime import datetime
-    import codecs
-    import sys
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
@@ -14,47 +8,210 @@ These tools allow Claude to query the local database directly instead of
 using expensive cloud-based memory/search tools.
 """
 
+import json
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Shared curator helpers (FTS query building and body decoding live with the schema)
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from curator.body_codec import BodyCodec
+from curator.curator_writer import epoch_ms
+from curator.fts import fts_query
+from curator.shards import MAX_ATTACHED, ShardCatalog, attach_shards, shard_uri
+from curator.stats_counters import read_daily_stats, read_stats
+
 
 # Fix Windows console encoding
 if sys.platform == 'win32':
+    import codecs
     sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
     sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
 
 
+# Search tuning
+DEFAULT_RECENCY_WEIGHT = 0.05  # bm25 points lost per day of age in relevance mode
+CHARS_PER_TOKEN = 5            # rough snippet sizing for FTS5 snippet()
+HIGHLIGHT_OPEN = '**'
+HIGHLIGHT_CLOSE = '**'
+MS_PER_DAY = 86400000
+FAN_OUT_WORKERS = 8            # threads querying shards at once (SQLite releases the GIL)
+
+# Hot reads, each answered from a covering index (see ClaudeCurator.init_database)
+RECENT_MESSAGES_SQL = '''
+    SELECT m.conversation_id, m.role, m.blob_id, m.timestamp, m.timestamp_ms
+    FROM messages m
+    ORDER BY m.timestamp_ms DESC
+    LIMIT ?
+'''
+CONVERSATION_MESSAGES_SQL = '''
+    SELECT m.message_number, m.role, m.blob_id, m.timestamp
+    FROM messages m
+    WHERE m.conversation_id = ?
+    ORDER BY m.message_number
+    LIMIT ?
+'''
+CONVERSATIONS_BY_DATE_SQL = '''
+    SELECT session_id, start_time, end_time, message_count, start_ms
+    FROM {schema}.conversations
+    WHERE start_ms BETWEEN ? AND ?
+    ORDER BY start_ms DESC
+    LIMIT ?
+'''
+RECENT_CONVERSATIONS_SQL = '''
+    SELECT session_id, start_time, message_count, start_ms
+    FROM conversations
+    ORDER BY start_ms DESC
+    LIMIT ?
+'''
+
+
 class LibrarianQuery:
-    """Query the AI Librarian database efficiently."""
+    """
+    Query the AI Librarian database efficiently.
+    
+    Months the curator has archived into shards (see curator.shards) are
+    queried too: date-filtered queries ATTACH only the shards the catalog
+    says overlap the range, the rest fan out over every shard in parallel.
+    """
     
-    def __init__(self):
+    def __init__(self, db_path: str = None):
         self.project_root = Path(__file__).parent.parent
-        self.db_path = self.project_root / "curator" / "processed" / "conversations.db"
+        if db_path:
+            self.db_path = Path(db_path)
+        else:
+            self.db_path = self.project_root / "curator" / "processed" / "conversations.db"
         
         if not self.db_path.exists():
             raise FileNotFoundError(f"Database not found: {self.db_path}")
+        
+        self.catalog = ShardCatalog(self.db_path.parent)
+    
+    def connect(self, shard: dict = None):
+        """
+        Open a connection to the live database (or a shard, read-only) that
+        can read compressed bodies: body_text() for SQL (FTS snippets go
+        through it) and a codec for lazy decoding. URI filenames are on so
+        shards can be attached.
+        """
+        if shard is None:
+            conn = sqlite3.connect(self.db_path.resolve().as_uri(), uri=True)
+        else:
+            conn = sqlite3.connect(shard_uri(shard['path'], shard['sealed']), uri=True)
+        bodies = BodyCodec(conn)
+        bodies.register()
+        return conn, bodies
     
-    def search(self, query: str, limit: int = 5, context_chars: int = 300):
+    def fan_out(self, query, shards: list = None) -> list:
+        """
+        Run query(conn, bodies) against the live database and every shard
+        (or the given ones), in parallel threads when there are shards;
+        returns the results in that order, live database first.
+        """
+        targets = [None] + (self.catalog.shards() if shards is None else shards)
+        if len(targets) == 1:
+            return [self.run_on(query, None)]
+        with ThreadPoolExecutor(max_workers=min(len(targets), FAN_OUT_WORKERS)) as executor:
+            return list(executor.map(lambda shard: self.run_on(query, shard), targets))
+    
+    def run_on(self, query, shard: dict = None):
+        """query(conn, bodies) on one database (the live one for None)."""
+        conn, bodies = self.connect(shard)
+        try:
+            return query(conn, bodies)
+        finally:
+            conn.close()
+    
+    def search(self, query: str, limit: int = 5, context_chars: int = 300,
+               rank: str = 'recent', recency_weight: float = DEFAULT_RECENCY_WEIGHT):
         """
         Search conversations for a query string.
         Returns compact results optimized for token efficiency.
         
+        Snippets are cut and highlighted inside SQLite (FTS5 snippet()), so
+        only snippet-sized strings are handed back - never whole messages.
+        
         Args:
             query: Search term
             limit: Max results (default: 5)
             context_chars: Characters of context around match (default: 300)
+            rank: 'recent' (newest first) or 'relevance' (BM25 score)
+            recency_weight: For 'relevance' ranking, score penalty per day of
+                age - 0 is pure BM25, larger values favour newer messages
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT c.session_id, c.start_time, m.role, m.content, m.timestamp
-            FROM messages m
-            JOIN conversations c ON m.conversation_id = c.id
-            WHERE m.content LIKE ?
-            ORDER BY m.timestamp DESC
-            LIMIT ?
-        ''', (f'%{query}%', limit))
+        # FTS5 snippets are sized in tokens (max 64), not characters
+        snippet_tokens = max(1, min(64, context_chars // CHARS_PER_TOKEN))
+        now_ms = time.time() * 1000
         
-        results = cursor.fetchall()
-        conn.close()
+        def search_database(conn, bodies):
+            """Up to `limit` results from one database, each led by its merge key."""
+            cursor = conn.cursor()
+            
+            if not query.strip():
+                # Empty query - just the most recent messages (index-only), then
+                # their sessions and bodies - so only returned bodies are decompressed
+                results = []
+                for conversation_id, role, blob_id, timestamp, timestamp_ms in \
+                        cursor.execute(RECENT_MESSAGES_SQL, (limit,)).fetchall():
+                    session_id = conn.execute('SELECT session_id FROM conversations WHERE id = ?',
+                                              (conversation_id,)).fetchone()[0]
+                    content, size = conn.execute('SELECT content, size FROM blobs WHERE id = ?',
+                                                 (blob_id,)).fetchone() or ('', 0)
+                    results.append((-(timestamp_ms or 0), session_id, role, bodies.decode(content)[:context_chars],
+                                    timestamp, size > context_chars, None))
+                return results
+            
+            if rank == 'relevance' and recency_weight:
+                # bm25() is negative (lower = better); age adds a penalty
+                sort_key = '''bm25(blobs_fts)
+                    + ? * COALESCE((? - m.timestamp_ms) / ?, 0)'''
+                sort_params = (recency_weight, now_ms, float(MS_PER_DAY))
+                order_by = 'sort_key'
+            elif rank == 'relevance':
+                sort_key = 'bm25(blobs_fts)'
+                sort_params = ()
+                order_by = 'blobs_fts.rank'
+            else:
+                sort_key = '-m.timestamp_ms'
+                sort_params = ()
+                order_by = 'm.timestamp_ms DESC'
+            # Scored only when ranking by it - bm25() per match costs more than the search
+            score = 'bm25(blobs_fts)' if rank == 'relevance' else 'NULL'
+            
+            # Full-text index lookup instead of a LIKE scan over every message
+            cursor.execute(f'''
+                SELECT {sort_key} AS sort_key, c.session_id, m.role, blobs_fts.rowid, m.timestamp,
+                       0, {score}
+                FROM blobs_fts
+                JOIN messages m ON m.blob_id = blobs_fts.rowid
+                JOIN conversations c ON m.conversation_id = c.id
+                WHERE blobs_fts MATCH ?
+                ORDER BY {order_by}
+                LIMIT ?
+            ''', (*sort_params, fts_query(query), limit))
+            matches = cursor.fetchall()
+            
+            # Snippets read (and decode) the body, so only cut them for the rows returned
+            rowids = sorted({row[3] for row in matches})
+            cursor.execute(f'''
+                SELECT rowid, snippet(blobs_fts, 0, ?, ?, '...', ?)
+                FROM blobs_fts
+                WHERE blobs_fts MATCH ? AND rowid IN ({','.join('?' * len(rowids))})
+            ''', (HIGHLIGHT_OPEN, HIGHLIGHT_CLOSE, snippet_tokens, fts_query(query), *rowids))
+            snippets = dict(cursor.fetchall())
+            return [(key, session_id, role, snippets[rowid], timestamp, truncated, score)
+                    for key, session_id, role, rowid, timestamp, truncated, score in matches]
+        
+        def merge_key(row):
+            return row[0] if row[0] is not None else float('inf')
+        
+        # Every database's best `limit`, queried in parallel and merged on the
+        # key each was ordered by (bm25() uses each database's own term
+        # statistics, so scores across shards are close, not exact)
+        results = sorted((row for rows in self.fan_out(search_database) for row in rows), key=merge_key)
+        results = [row[1:] for row in results[:limit]]
         
         if not results:
             return {
@@ -65,30 +222,20 @@ class LibrarianQuery:
         
         # Format results compactly
         formatted_results = []
-        for session_id, start_time, role, content, timestamp in results:
-            # Find query position for context
-            query_pos = content.lower().find(query.lower())
-            if query_pos != -1:
-                # Extract context around the match
-                start = max(0, query_pos - context_chars // 2)
-                end = min(len(content), query_pos + len(query) + context_chars // 2)
-                snippet = content[start:end]
-                
-                # Add ellipsis if truncated
-                if start > 0:
-                    snippet = "..." + snippet
-                if end < len(content):
-                    snippet = snippet + "..."
-            else:
-                # Fallback to start of content
-                snippet = content[:context_chars] + "..."
+        for session_id, role, snippet, timestamp, truncated, score in results:
+            if truncated:
+                snippet = snippet + "..."
             
-            formatted_results.append({
+            result = {
                 'session_id': session_id,
                 'timestamp': timestamp,
                 'role': role,
                 'snippet': snippet
-            })
+            }
+            if rank == 'relevance' and score is not None:
+                result['score'] = round(-score, 3)
+            
+            formatted_results.append(result)
         
         return {
             'found': len(results),
@@ -100,32 +247,34 @@ class LibrarianQuery:
         """
         Retrieve a specific conversation by session ID.
         Returns compact message list.
-        """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
         
-        # Get conversation info
-        cursor.execute('SELECT * FROM conversations WHERE session_id = ?', (session_id,))
-        conv = cursor.fetchone()
+        Looks in the live database, then the shards newest first.
+        """
+        for shard in [None] + self.catalog.shards()[::-1]:
+            conn, bodies = self.connect(shard)
+            cursor = conn.cursor()
+            
+            # Get conversation info
+            cursor.execute('SELECT * FROM conversations WHERE session_id = ?', (session_id,))
+            conv = cursor.fetchone()
+            if conv:
+                break
+            conn.close()
         
         if not conv:
-            conn.close()
             return {
                 'found': False,
                 'session_id': session_id
             }
         
-        # Get messages (limited)
-        cursor.execute('''
-            SELECT message_number, role, content, timestamp
-            FROM messages
-            WHERE conversation_id = ?
-            ORDER BY message_number
-            LIMIT ?
-        ''', (conv[0], max_messages))
+        # Get messages (limited) from the covering index, then only the bodies shown
+        cursor.execute(CONVERSATION_MESSAGES_SQL, (conv[0], max_messages))
         
         messages = []
-        for msg_num, role, content, timestamp in cursor.fetchall():
+        for msg_num, role, blob_id, timestamp in cursor.fetchall():
+            row = conn.execute('SELECT content FROM blobs WHERE id = ?', (blob_id,)).fetchone()
+            content = bodies.decode(row[0]) if row and row[0] is not None else ''
+            
             # Truncate very long messages
             if len(content) > 500:
                 content = content[:500] + f"... [{len(content)-500} more chars]"
@@ -150,41 +299,48 @@ class LibrarianQuery:
         }
     
     def get_stats(self):
-        """Get database statistics."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Total conversations
-        cursor.execute('SELECT COUNT(*) FROM conversations')
-        total_convs = cursor.fetchone()[0]
-        
-        # Total messages
-        cursor.execute('SELECT COUNT(*) FROM messages')
-        total_msgs = cursor.fetchone()[0]
+        """
+        Get database statistics.
         
-        # Messages by role
-        cursor.execute('SELECT role, COUNT(*) FROM messages GROUP BY role')
-        by_role = dict(cursor.fetchall())
+        Totals come from the counter tables the curator keeps (constant
+        time per database, summed over the live database and its shards).
+        The query tools only read: `claude_curator.py stats --recompute`
+        rebuilds the counters.
+        """
+        def database_stats(conn, bodies):
+            return (read_stats(conn), conn.execute(RECENT_CONVERSATIONS_SQL, (10,)).fetchall(),
+                    read_daily_stats(conn))
+        
+        per_database = self.fan_out(database_stats)
+        
+        totals = {'conversations': 0, 'messages': 0}
+        by_role = {}
+        daily = {}
+        for counts, _, days in per_database:
+            for name in totals:
+                totals[name] += counts[name]
+            for role, count in counts['by_role'].items():
+                by_role[role] = by_role.get(role, 0) + count
+            for day in days:
+                merged = daily.setdefault(day['day'], {'day': day['day'], 'messages': 0, 'chars': 0})
+                merged['messages'] += day['messages']
+                merged['chars'] += day['chars']
         
         # Recent conversations (last 10)
-        cursor.execute('''
-            SELECT session_id, start_time, message_count
-            FROM conversations
-            ORDER BY start_time DESC
-            LIMIT 10
-        ''')
+        recent_rows = sorted((row for _, rows, _ in per_database for row in rows),
+                             key=lambda row: row[3] or 0, reverse=True)[:10]
         recent = [
             {'session': row[0], 'time': row[1], 'messages': row[2]}
-            for row in cursor.fetchall()
+            for row in recent_rows
         ]
         
-        conn.close()
-        
         return {
-            'total_conversations': total_convs,
-            'total_messages': total_msgs,
+            'total_conversations': totals['conversations'],
+            'total_messages': totals['messages'],
             'by_role': by_role,
-            'recent_conversations': recent
+            'recent_conversations': recent,
+            # Message volume for the last few active days
+            'daily': sorted(daily.values(), key=lambda day: day['day'], reverse=True)[:7]
         }
     
     def search_by_date(self, after_date: str = None, before_date: str = None, limit: int = 10):
@@ -196,24 +352,30 @@ class LibrarianQuery:
             before_date: ISO format datetime
             limit: Max conversations to return
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        query = 'SELECT session_id, start_time, end_time, message_count FROM conversations WHERE 1=1'
-        params = []
-        
-        if after_date:
-            query += ' AND start_time >= ?'
-            params.append(after_date)
-        
-        if before_date:
-            query += ' AND start_time <= ?'
-            params.append(before_date)
-        
-        query += ' ORDER BY start_time DESC LIMIT ?'
-        params.append(limit)
-        
-        cursor.execute(query, params)
+        # Integer range on the covering index; a missing bound is open-ended
+        bounds = []
+        for date, open_end in ((after_date, -(1 << 63)), (before_date, (1 << 63) - 1)):
+            if not date:
+                bounds.append(open_end)
+                continue
+            ms = epoch_ms(date)
+            if ms is None:
+                raise ValueError(f"Invalid date: {date} (expected ISO format, e.g. 2025-11-01)")
+            bounds.append(ms)
+        
+        # Only the shards the catalog says overlap the range are attached
+        shards = self.catalog.shards(*bounds)
+        conn, _ = self.connect()
+        rows = []
+        for start in range(0, max(len(shards), 1), MAX_ATTACHED):
+            with attach_shards(conn, shards[start:start + MAX_ATTACHED]) as schemas:
+                if start == 0:
+                    schemas = ['main'] + schemas
+                sql = ' UNION ALL '.join(
+                    f'SELECT * FROM ({CONVERSATIONS_BY_DATE_SQL.format(schema=schema)})' for schema in schemas)
+                rows += conn.execute(f'{sql} ORDER BY start_ms DESC LIMIT ?',
+                                     (*[value for _ in schemas for value in (*bounds, limit)], limit)).fetchall()
+        conn.close()
         
         results = [
             {
@@ -222,11 +384,9 @@ class LibrarianQuery:
                 'end_time': row[2],
                 'message_count': row[3]
             }
-            for row in cursor.fetchall()
+            for row in sorted(rows, key=lambda row: row[4], reverse=True)[:limit]
         ]
         
-        conn.close()
-        
         return {
             'found': len(results),
             'after_date': after_date,
@@ -240,7 +400,7 @@ def main():
     
     if len(sys.argv) < 2:
         print("Usage:")
-        print("  python query_tools.py search <query> [limit]")
+        print("  python query_tools.py search <query> [limit] [--ranked] [--recency WEIGHT]")
         print("  python query_tools.py get <session_id>")
         print("  python query_tools.py stats")
         print("  python query_tools.py date [--after YYYY-MM-DD] [--before YYYY-MM-DD]")
@@ -251,9 +411,23 @@ def main():
         command = sys.argv[1]
         
         if command == "search":
-            query = sys.argv[2] if len(sys.argv) > 2 else ""
-            limit = int(sys.argv[3]) if len(sys.argv) > 3 else 5
-            result = librarian.search(query, limit)
+            rank = 'recent'
+            recency_weight = DEFAULT_RECENCY_WEIGHT
+            positional = []
+            
+            args = iter(sys.argv[2:])
+            for arg in args:
+                if arg == "--ranked":
+                    rank = 'relevance'
+                elif arg == "--recency":
+                    rank = 'relevance'
+                    recency_weight = float(next(args, DEFAULT_RECENCY_WEIGHT))
+                else:
+                    positional.append(arg)
+            
+            query = positional[0] if positional else ""
+            limit = int(positional[1]) if len(positional) > 1 else 5
+            result = librarian.search(query, limit, rank=rank, recency_weight=recency_weight)
             print(json.dumps(result, indent=2, ensure_ascii=True))
         
         elif command == "get":
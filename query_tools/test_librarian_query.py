@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Librarian Query Tests
+Run with: python -m pytest query_tools/test_librarian_query.py
+"""
+
+import sqlite3
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from curator.curator_writer import epoch_ms
+from curator.test_curator import days_since, make_curator, write_raw_log
+from query_tools.librarian_query import (CONVERSATION_MESSAGES_SQL, CONVERSATIONS_BY_DATE_SQL,
+                                         RECENT_CONVERSATIONS_SQL, RECENT_MESSAGES_SQL, LibrarianQuery)
+
+
+def build_librarian(tmp_path: Path, **options) -> LibrarianQuery:
+    curator = make_curator(tmp_path, **options)
+    write_raw_log(curator.raw_logs_dir / "s1.jsonl", "s1", [
+        "How do I rotate the orchestrator log file once it grows past ten megabytes?",
+        "The orchestrator renames orchestrator.log to orchestrator.log.1 when it exceeds 10MB.",
+    ])
+    write_raw_log(curator.raw_logs_dir / "s2.jsonl", "s2", [
+        "Delta compression stores only the lines that changed between two captures.",
+    ])
+    curator.process_all_logs()
+    return LibrarianQuery(str(curator.db_path))
+
+
+def test_search_matches_words(tmp_path):
+    librarian = build_librarian(tmp_path)
+    
+    result = librarian.search("orchestrator log")
+    assert result['found'] == 2
+    assert {r['session_id'] for r in result['results']} == {'s1'}
+    
+    assert librarian.search("megabyte")['found'] == 1  # prefix match
+    assert librarian.search("nonexistent")['found'] == 0
+
+
+def test_empty_search_returns_recent(tmp_path):
+    librarian = build_librarian(tmp_path)
+    result = librarian.search("", limit=2)
+    assert result['found'] == 2
+
+
+def test_snippets_are_highlighted_and_windowed(tmp_path):
+    librarian = build_librarian(tmp_path)
+    result = librarian.search("renames", context_chars=40)
+    
+    snippet = result['results'][0]['snippet']
+    assert '**renames**' in snippet
+    assert len(snippet) < len("The orchestrator renames orchestrator.log to orchestrator.log.1 when it exceeds 10MB.")
+
+
+def test_relevance_ranking(tmp_path):
+    librarian = build_librarian(tmp_path)
+    
+    # The message mentioning "orchestrator" three times outranks the one with it once
+    result = librarian.search("orchestrator", rank='relevance', recency_weight=0)
+    assert result['results'][0]['snippet'].count('**orchestrator**') > 1
+    assert result['results'][0]['score'] >= result['results'][1]['score']
+    
+    # Recency weighting still returns every match
+    assert librarian.search("orchestrator", rank='relevance', recency_weight=1.0)['found'] == 2
+
+
+def test_compressed_bodies_search_and_read_back(tmp_path):
+    for compression in ('zlib', 'lzma'):
+        librarian = build_librarian(tmp_path / compression, body_compression=compression)
+        
+        result = librarian.search("renames", context_chars=40)
+        assert '**renames**' in result['results'][0]['snippet']
+        assert librarian.search("", limit=5)['found'] == 3
+        
+        conversation = librarian.get_conversation("s1")
+        assert [m['content'] for m in conversation['messages']] == [
+            "How do I rotate the orchestrator log file once it grows past ten megabytes?",
+            "The orchestrator renames orchestrator.log to orchestrator.log.1 when it exceeds 10MB.",
+        ]
+
+
+def test_time_queries_are_index_only(tmp_path):
+    librarian = build_librarian(tmp_path)
+    conn = sqlite3.connect(librarian.db_path)
+    
+    def plan(sql, params):
+        return ' | '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+    
+    assert plan(RECENT_MESSAGES_SQL, (5,)) == 'SCAN m USING COVERING INDEX idx_recent_messages'
+    assert plan(CONVERSATION_MESSAGES_SQL, (1, 20)) == \
+        'SEARCH m USING COVERING INDEX idx_conversation_order (conversation_id=?)'
+    assert plan(CONVERSATIONS_BY_DATE_SQL.format(schema='main'), (0, 1, 10)) == \
+        'SEARCH main.conversations USING COVERING INDEX idx_conversations_by_start (start_ms>? AND start_ms<?)'
+    assert plan(RECENT_CONVERSATIONS_SQL, (10,)) == \
+        'SCAN conversations USING COVERING INDEX idx_conversations_by_start'
+    
+    # Integer columns were filled at ingest
+    assert conn.execute('SELECT COUNT(*) FROM messages WHERE timestamp_ms IS NULL').fetchone()[0] == 0
+    assert conn.execute('SELECT MIN(start_ms) FROM conversations').fetchone()[0] == epoch_ms("2025-11-01T10:00:00")
+    conn.close()
+
+
+def test_search_by_date_compares_epoch_milliseconds(tmp_path):
+    librarian = build_librarian(tmp_path)
+    
+    assert librarian.search_by_date(after_date="2025-11-01")['found'] == 2
+    assert librarian.search_by_date(after_date="2025-11-01T10:00:01")['found'] == 0
+    # Offsets are honoured, not compared as text (the Logger's stamps are local time)
+    first = datetime.fromisoformat("2025-11-01T10:00:00").astimezone(timezone(timedelta(hours=1)))
+    assert librarian.search_by_date(after_date=first.isoformat())['found'] == 2
+    assert librarian.search_by_date(before_date="2025-10-31")['found'] == 0
+    
+    with pytest.raises(ValueError):
+        librarian.search_by_date(after_date="last tuesday")
+
+
+def test_epoch_columns_are_backfilled(tmp_path):
+    librarian = build_librarian(tmp_path)
+    conn = sqlite3.connect(librarian.db_path)
+    # Stats counters came later too (their triggers read timestamp_ms)
+    for (trigger,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'stats_%'").fetchall():
+        conn.execute(f'DROP TRIGGER {trigger}')
+    conn.executescript('''
+        DROP TABLE stats;
+        DROP TABLE daily_stats;
+        DROP INDEX idx_recent_messages;
+        ALTER TABLE messages DROP COLUMN timestamp_ms;
+        DROP INDEX idx_conversations_by_start;
+        ALTER TABLE conversations DROP COLUMN start_ms;
+        ALTER TABLE conversations DROP COLUMN end_ms;
+        DROP TABLE schema_migrations;
+    ''')
+    conn.close()
+    
+    curator = make_curator(tmp_path)
+    conn = curator.writer.conn
+    assert conn.execute('''
+        SELECT COUNT(*) FROM messages WHERE timestamp_ms = CAST(strftime('%s', timestamp, 'utc') AS INTEGER) * 1000
+    ''').fetchone()[0] == 3
+    assert conn.execute('SELECT COUNT(*) FROM conversations WHERE start_ms IS NOT NULL').fetchone()[0] == 2
+    assert {c['session'] for c in librarian.get_stats()['recent_conversations']} == {'s1', 's2'}
+
+
+def test_shards_are_fanned_out_and_attached_by_date(tmp_path):
+    curator = make_curator(tmp_path, near_duplicate_threshold=0)
+    for month in ("2025-08", "2025-09", "2025-10"):
+        write_raw_log(curator.raw_logs_dir / f"{month}.jsonl", month, [
+            f"Rotation notes for {month}: the orchestrator log rotates at ten megabytes."], day=f"{month}-10")
+    # One shard holds two more, stronger matches
+    rotation = "Rotation notes for 2025-08: the orchestrator log rotates at ten megabytes."
+    write_raw_log(curator.raw_logs_dir / "2025-08.jsonl", "2025-08", [
+        rotation + "\nMegabytes again: ten megabytes, not ten megabytes per day.",
+        rotation + "\nMegabytes again: ten megabytes, not ten megabytes per day.\nMegabytes, megabytes, megabytes."
+    ], start_number=1, day="2025-08-10")
+    write_raw_log(curator.raw_logs_dir / "live.jsonl", "live", [
+        "Still open: the orchestrator log rotation moved to the live database."], day="2025-11-03")
+    curator.process_all_logs()
+    librarian = LibrarianQuery(str(curator.db_path))
+    before = librarian.get_stats()
+    
+    assert len(curator.archive_shards(days_since("2025-11-15"))) == 3
+    assert len(librarian.catalog.shards()) == 3
+    
+    # Unfiltered reads fan out over every shard and merge in one order
+    result = librarian.search("orchestrator")
+    assert [r['session_id'] for r in result['results']] == ['live', '2025-10', '2025-09', '2025-08']
+    assert librarian.search("", limit=2)['results'][1]['session_id'] == '2025-10'
+    # Relevance merges on the score: a shard's strong second hit beats another's weak first
+    result = librarian.search("megabytes", rank='relevance', recency_weight=0)
+    assert [r['session_id'] for r in result['results'][:2]] == ['2025-08', '2025-08']
+    assert result['found'] == 5
+    assert librarian.get_conversation("2025-09")['messages'][0]['content'].startswith("Rotation notes for 2025-09")
+    
+    stats = librarian.get_stats()
+    assert (stats['total_conversations'], stats['total_messages'], stats['by_role']) == \
+        (before['total_conversations'], before['total_messages'], before['by_role'])
+    assert [c['session'] for c in stats['recent_conversations']] == ['live', '2025-10', '2025-09', '2025-08']
+    
+    # Date filters only attach the shards the catalog says overlap
+    assert [s['month'] for s in librarian.catalog.shards(epoch_ms("2025-09-01"), epoch_ms("2025-09-30"))] == ['2025-09']
+    result = librarian.search_by_date(after_date="2025-09-01", before_date="2025-10-31")
+    assert [c['session_id'] for c in result['conversations']] == ['2025-10', '2025-09']
+    assert librarian.search_by_date(after_date="2025-11-01")['conversations'][0]['session_id'] == 'live'
+    assert librarian.search_by_date(limit=2)['found'] == 2